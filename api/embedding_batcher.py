@@ -0,0 +1,79 @@
+import asyncio
+from typing import Callable, List, Sequence
+
+
+class EmbeddingBatcher:
+    """
+    Collects texts from concurrent requests and embeds them in one model call.
+
+    A batch is sent when it reaches `max_batch_size` or when `max_wait_ms`
+    has passed since its first text arrived, whichever comes first.
+    `embed_batch_fn` is a blocking function mapping a list of texts to a list
+    of vectors; it runs on `executor` so the event loop stays free.
+    """
+
+    def __init__(self, embed_batch_fn: Callable[[List[str]], Sequence], executor, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embed_batch_fn = embed_batch_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending = []  # (text, future)
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+        self.max_fill = 0
+
+    async def embed(self, text: str):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Drop requests that gave up (e.g. timed out) before their batch left
+        batch = [(text, fut) for text, fut in self._pending if not fut.done()]
+        self._pending = []
+        if not batch:
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        self.max_fill = max(self.max_fill, len(batch))
+        if len(batch) >= self.max_batch_size:
+            self.full_batches += 1
+        asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch):
+        texts = [text for text, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            vectors = await loop.run_in_executor(self.executor, self.embed_batch_fn, texts)
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), vector in zip(batch, vectors):
+            if not fut.done():
+                fut.set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "items": self.items,
+            "full_batches": self.full_batches,
+            "max_fill": self.max_fill,
+            "pending": len(self._pending),
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "mean_fill_ratio": self.items / (self.batches * self.max_batch_size) if self.batches else 0.0,
+        }
@@ -0,0 +1,209 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from api.metrics import registry
+
+flush_size = registry.histogram(
+    "resurch_interaction_flush_size", "Interactions written per buffered flush.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+flush_lag = registry.histogram(
+    "resurch_interaction_flush_lag_seconds", "Age of the oldest interaction in a flush when it was written."
+)
+dropped_total = registry.counter(
+    "resurch_interactions_dropped_total", "Interactions dropped after failing every write attempt on their own."
+)
+
+# Longest wait between retries while writes keep failing
+MAX_RETRY_DELAY_MS = 30_000
+
+WriteFn = Callable[[List[dict], List[dict]], Awaitable[None]]
+
+
+class InteractionBuffer:
+    """
+    Queues user interactions in memory and writes them to the database in bulk.
+
+    Duplicates coalesce while queued: a click/ignore is written once per
+    (user, paper, type), and star/unstar events for the same user and paper
+    collapse to the last one. A flush runs when `max_batch_size` distinct
+    interactions are queued or `max_wait_ms` after the first one arrived,
+    whichever comes first; `close()` flushes whatever is left.
+
+    `write_fn(stars, events)` does the writing: `stars` are
+    {"user_id", "paper_id", "starred"} dicts in arrival order, `events` are
+    user_interactions rows. If it raises, the batch is split in halves and
+    retried until the rows that fail on their own are found, so one row the
+    database rejects cannot hold back the rest. Failed rows are queued again
+    (newer events for the same key win) and retried with a growing delay; a
+    row that failed `max_attempts` times is dropped and counted.
+    """
+
+    def __init__(self, write_fn: WriteFn, max_batch_size: int = 200, max_wait_ms: float = 1000.0, max_pending: int = 10000,
+                 max_attempts: int = 5):
+        self.write_fn = write_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._attempts: Dict[tuple, int] = {}  # key -> failed writes so far
+        self._failed_flushes = 0
+        self._stars: Dict[Tuple[str, str], Tuple[bool, float]] = {}  # (user, paper) -> (starred, queued at)
+        self._events: Dict[Tuple[str, str, str], float] = {}  # (user, paper, type) -> queued at
+        self._timer = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._tasks = set()
+        self.received = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.written = 0
+        self.errors = 0
+        self.dropped = 0
+        self.max_flush_size = 0
+        self.last_flush_lag_ms = 0.0
+
+    def __len__(self) -> int:
+        return len(self._stars) + len(self._events)
+
+    def add(self, user_id: str, paper_id: str, interaction_type: str) -> bool:
+        """Queues one interaction. Returns False if the buffer is full (writes are failing)."""
+        now = time.monotonic()
+        if interaction_type in ("star", "unstar"):
+            key = (user_id, paper_id)
+            previous = self._stars.pop(key, None)
+            if previous is None and len(self) >= self.max_pending:
+                self.rejected += 1
+                return False
+            # Re-inserting moves the key to the end, so stars keep their arrival order
+            self._stars[key] = (interaction_type == "star", previous[1] if previous else now)
+        else:
+            key = (user_id, paper_id, interaction_type)
+            previous = self._events.get(key)
+            if previous is None and len(self) >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._events[key] = previous or now
+        self.received += 1
+        if previous is not None:
+            self.coalesced += 1
+
+        loop = asyncio.get_running_loop()
+        if len(self) >= self.max_batch_size:
+            self._spawn(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._spawn, loop)
+        return True
+
+    def has_pending_star(self, user_id: str) -> bool:
+        return any(user == user_id for user, _ in self._stars)
+
+    def _spawn(self, loop):
+        self._timer = None
+        task = loop.create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # One flush at a time, so a star and a later unstar reach the database in order
+        async with self._lock:
+            if not len(self):
+                return
+            stars, events = self._stars, self._events
+            self._stars, self._events = {}, {}
+            items = [((u, p), {"user_id": u, "paper_id": p, "starred": starred}) for (u, p), (starred, _) in stars.items()]
+            items += [(key, {"user_id": key[0], "paper_id": key[1], "interaction_type": key[2]}) for key in events]
+            failed = dict(await self._write(items))
+            for key, _ in items:
+                if key not in failed:
+                    self._attempts.pop(key, None)
+
+            written = [key for key, _ in items if key not in failed]
+            if written:
+                oldest = min(stars[key][1] if len(key) == 2 else events[key] for key in written)
+                lag = time.monotonic() - oldest
+                flush_size.observe(len(written))
+                flush_lag.observe(lag)
+                self.flushes += 1
+                self.written += len(written)
+                self.max_flush_size = max(self.max_flush_size, len(written))
+                self.last_flush_lag_ms = lag * 1000
+
+            if not failed:
+                self._failed_flushes = 0
+                return
+            self.errors += 1
+            self._failed_flushes += 1
+            retry_stars, retry_events = {}, {}
+            for key, error in failed.items():
+                attempts = self._attempts.get(key, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(key, None)
+                    self.dropped += 1
+                    dropped_total.inc()
+                    print(f"Dropping interaction {key} after {attempts} failed writes: {error}")
+                    continue
+                self._attempts[key] = attempts
+                if len(key) == 2:
+                    retry_stars[key] = stars[key]
+                else:
+                    retry_events[key] = events[key]
+            print(f"Interaction flush: {len(written)} written, {len(failed)} failed: {next(iter(failed.values()))}")
+            self._requeue(retry_stars, retry_events)
+            if len(self) and self._timer is None:
+                delay = min(self.max_wait_ms * 2 ** (self._failed_flushes - 1), MAX_RETRY_DELAY_MS)
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(delay / 1000.0, self._spawn, loop)
+
+    async def _write(self, items) -> list:
+        """
+        Writes (key, row) items in one call, halving the batch on failure.
+        Returns [(key, error)] for the rows that failed on their own.
+        """
+        try:
+            await self.write_fn([row for key, row in items if len(key) == 2], [row for key, row in items if len(key) == 3])
+            return []
+        except Exception as e:
+            if len(items) == 1:
+                return [(items[0][0], e)]
+            middle = len(items) // 2
+            return await self._write(items[:middle]) + await self._write(items[middle:])
+
+    def _requeue(self, stars, events):
+        # Anything queued during the failed write is newer and takes precedence
+        newer_stars, self._stars = self._stars, {}
+        for key, value in stars.items():
+            if key not in newer_stars:
+                self._stars[key] = value
+        self._stars.update(newer_stars)
+        for key, queued in events.items():
+            self._events[key] = min(queued, self._events.get(key, queued))
+
+    async def close(self):
+        """Flushes everything still queued; call on shutdown."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "pending": len(self),
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "written": self.written,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "max_flush_size": self.max_flush_size,
+            "mean_flush_size": self.written / self.flushes if self.flushes else 0.0,
+            "last_flush_lag_ms": self.last_flush_lag_ms,
+        }
@@ -1,14 +1,70 @@
+import time
+
+# Taken before the other imports, so the logged startup time includes them
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Body
+from datetime import datetime, timezone
+from fastapi import FastAPI, HTTPException, Body, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from supabase import create_client, Client
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+from typing import TYPE_CHECKING, List, Literal, Optional
+
+from api.embedding_batcher import EmbeddingBatcher
+from api.interactions import InteractionBuffer
+from api.metrics import TimingMiddleware, registry, span
+from api.model_loader import MODEL_NAME, ModelLoader, ModelNotReady
+from api.pagination import CandidateCache, ExpiredCursor, InvalidCursor
+from api.profiles import ProfileCache, UserProfile
+from api.query_cache import QueryEmbeddingCache
+from api.responses import PAPER_FIELDS, FastJSONResponse, conditional_json, parse_fields, project, project_rows
+from api.retrieval import LocalBackend, PgvectorBackend, filter_params, recent_after
+from src.lexical_index import parse_lookup
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
 
 load_dotenv()
 
-app = FastAPI()
+# Supabase Client (async, created on startup so it shares the server's event loop)
+url: str = os.environ.get("SUPABASE_URL")
+key: str = os.environ.get("SUPABASE_SERVICE_KEY")
+supabase: Optional["AsyncClient"] = None
+
+# Per-call timeouts, so one slow RPC fails fast instead of stalling the worker
+DB_TIMEOUT = float(os.environ.get("DB_TIMEOUT_SECONDS", 10))
+EMBED_TIMEOUT = float(os.environ.get("EMBED_TIMEOUT_SECONDS", 10))
+
+# Embedding is CPU-bound: run it on a dedicated pool sized to the machine
+# instead of the default threadpool shared with everything else
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", os.cpu_count() or 1))
+embed_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+
+# The model loads in the background after the port is bound; /readyz reports when it is usable
+model_loader = ModelLoader(MODEL_NAME)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global supabase
+    model_loader.start(embed_executor)
+    if supabase is None:
+        from supabase import acreate_client
+        supabase = await acreate_client(url, key)
+    await retrieval.start()
+    print(f"Startup took {time.perf_counter() - IMPORT_STARTED:.2f}s (model and search data loading in background)")
+    yield
+    # Write out interactions acknowledged but not yet flushed
+    await interaction_buffer.close()
+    await retrieval.close()
+    embed_executor.shutdown(wait=False)
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS configuration
 app.add_middleware(
@@ -17,18 +73,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Supabase Client
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_SERVICE_KEY")
-supabase: Client = create_client(url, key)
+# Brotli when available (falls back to gzip for clients that do not accept it)
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=500)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=500)
+
+# Request counts/latency per route; REQUEST_TIMING_LOG=1 also logs per-request stage timings
+app.add_middleware(TimingMiddleware, log_requests=os.environ.get("REQUEST_TIMING_LOG") == "1")
 
 # --- Models ---
 class Paper(BaseModel):
+    # Everything but id may be left out by a `fields` projection
     id: str
-    title: str
-    abstract: str
+    title: Optional[str] = None
+    abstract: Optional[str] = None
     url: Optional[str] = None
     similarity: Optional[float] = None
 
@@ -37,104 +100,529 @@ class UserInteraction(BaseModel):
     paper_id: str
     interaction_type: str
 
+class BatchQuery(BaseModel):
+    q: str
+    limit: int = Field(10, ge=1, le=100)
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchQuery]
+    categories: Optional[List[str]] = None
+    published_after: Optional[datetime] = None
+    published_before: Optional[datetime] = None
+    days: Optional[int] = Field(None, ge=1)
+    exclude: Optional[List[str]] = None
+    fields: Optional[List[str]] = None
+    abstract_chars: Optional[int] = Field(None, ge=1)
+
+# --- Helpers ---
+
+async def run_query(query):
+    """Executes a Supabase query/RPC builder with the DB timeout applied."""
+    return await asyncio.wait_for(query.execute(), timeout=DB_TIMEOUT)
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    # FastEmbed returns a generator; embed the whole micro-batch in one pass
+    return [vector.tolist() for vector in model_loader.get().embed(texts, batch_size=len(texts))]
+
+async def embed_query(q: str) -> List[float]:
+    if not model_loader.ready:
+        # Fail fast instead of queueing behind a model that is still loading
+        raise ModelNotReady(model_loader.error or "Model is still loading")
+    return await asyncio.wait_for(embedding_batcher.embed(q), timeout=EMBED_TIMEOUT)
+
+async def embed_queries(texts: List[str]) -> List[List[float]]:
+    """Embeds a whole list in one model call (batch search), bypassing the micro-batcher."""
+    if not model_loader.ready:
+        raise ModelNotReady(model_loader.error or "Model is still loading")
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(embed_executor, embed_texts, texts), timeout=EMBED_TIMEOUT)
+
+async def starred_ids(user_id: str) -> List[str]:
+    response = await run_query(
+        supabase.table("user_interactions").select("paper_id").eq("user_id", user_id).eq("interaction_type", "star")
+    )
+    return [row["paper_id"] for row in response.data]
+
+# Vector search backend: the match_papers RPC ("pgvector"), or "local" to
+# score in-process against the snapshot src/export_snapshot.py publishes
+RETRIEVAL_BACKEND = os.environ.get("RETRIEVAL_BACKEND", "pgvector")
+if RETRIEVAL_BACKEND == "local":
+    retrieval = LocalBackend(
+        os.environ.get("SNAPSHOT_DIR", os.path.join("data", "snapshots")),
+        starred_fn=starred_ids,
+        poll_seconds=float(os.environ.get("SNAPSHOT_POLL_SECONDS", 30)),
+        hot_months=int(os.environ.get("SNAPSHOT_HOT_MONTHS", 3)),
+    )
+else:
+    retrieval = PgvectorBackend(lambda: supabase, run_query)
+
+async def lookup_papers(lookup, limit: int, fields=None, exclude_ids=None, categories=None,
+                        published_after=None, published_before=None, abstract_chars=None) -> list:
+    """Answers arXiv id and `author:` queries without embedding anything, with the search filters applied."""
+    kind, value = lookup
+    if kind == "author":
+        params = {"query_text": value, "match_count": limit, "authors_only": True,
+                  **filter_params(exclude_ids=exclude_ids, categories=categories, published_after=published_after,
+                                  published_before=published_before, abstract_chars=abstract_chars)}
+        return (await run_query(project(supabase.rpc("search_papers_lexical", params), fields))).data
+
+    # Ids are stored as entry URLs; without a version, match any version
+    base_id, version = value
+    columns = ",".join(name for name in (fields or PAPER_FIELDS) if name != "similarity")
+    query = supabase.table("papers").select(columns)
+    if version:
+        query = query.eq("id", f"http://arxiv.org/abs/{base_id}{version}")
+    else:
+        query = query.like("id", f"http://arxiv.org/abs/{base_id}v%")
+    # Same semantics as the search RPCs: any category, published in [after, before)
+    if exclude_ids:
+        query = query.not_.in_("id", exclude_ids)
+    if categories:
+        query = query.ov("categories", categories)
+    if published_after:
+        query = query.gte("published", published_after.isoformat())
+    if published_before:
+        query = query.lt("published", published_before.isoformat())
+    rows = (await run_query(query.order("id", desc=True).limit(limit))).data
+    if abstract_chars:
+        for row in rows:
+            if row.get("abstract"):
+                row["abstract"] = row["abstract"][:abstract_chars]
+    return rows
+
 # --- Endpoints ---
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Resurch API is running"}
 
-# Load model globally for better performance and to avoid file access issues
-from fastembed import TextEmbedding
-# model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-print("Loading FastEmbed model...")
-model = TextEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving, whether or not the model has loaded."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the model is loaded and warmed up, the database answers and a snapshot is loaded (local retrieval)."""
+    db_ready = False
+    if supabase is not None:
+        try:
+            await asyncio.wait_for(supabase.table("papers").select("id").limit(1).execute(), timeout=2)
+            db_ready = True
+        except Exception as e:
+            print(f"Readiness DB check failed: {e}")
+    ready = model_loader.ready and db_ready and retrieval.ready
+    body = {"ready": ready, "db": db_ready, **model_loader.status(), "retrieval": retrieval.status()}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+# Queries arriving within a few milliseconds of each other share one model call
+embedding_batcher = EmbeddingBatcher(
+    embed_texts,
+    embed_executor,
+    max_batch_size=int(os.environ.get("EMBED_MAX_BATCH_SIZE", 32)),
+    max_wait_ms=float(os.environ.get("EMBED_MAX_WAIT_MS", 5)),
+)
+
+# The calibration page repeats the same few queries, so cache their vectors
+query_cache = QueryEmbeddingCache(
+    embed_query,
+    MODEL_NAME,
+    max_size=int(os.environ.get("QUERY_CACHE_SIZE", 1024)),
+    ttl_seconds=float(os.environ.get("QUERY_CACHE_TTL", 3600)),
+    embed_many_fn=embed_queries,
+)
+
+# Upper bound on queries per batch search request
+MAX_BATCH_QUERIES = int(os.environ.get("SEARCH_BATCH_MAX_QUERIES", 100))
+
+# Paginated searches rank this many candidates once; later pages are slices
+PAGE_DEPTH = int(os.environ.get("PAGE_DEPTH", 100))
+candidate_cache = CandidateCache(
+    max_size=int(os.environ.get("PAGE_CACHE_SIZE", 256)),
+    ttl_seconds=float(os.environ.get("PAGE_CACHE_TTL", 600)),
+)
+
+def cursor_page(cursor: str, limit: int, owner: Optional[str] = None):
+    """The page behind a cursor and its X-Next-Cursor header; 400 if malformed, 410 once expired."""
+    try:
+        rows, next_cursor = candidate_cache.page(cursor, limit, owner)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExpiredCursor as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    return rows, {"X-Next-Cursor": next_cursor} if next_cursor else None
+
+def first_page(rows: list, limit: int, paginate: bool, owner: Optional[str] = None):
+    """The first `limit` rows; with `paginate`, the rest are cached behind an X-Next-Cursor."""
+    if not paginate:
+        return rows, None
+    rows, next_cursor = candidate_cache.start(rows, limit, owner)
+    return rows, {"X-Next-Cursor": next_cursor} if next_cursor else None
 
 @app.get("/api/v1/search", response_model=List[Paper])
-def search_papers(q: str, limit: int = 10):
+async def search_papers(
+    q: str,
+    limit: int = 10,
+    categories: Optional[List[str]] = Query(None),
+    published_after: Optional[datetime] = None,
+    published_before: Optional[datetime] = None,
+    days: Optional[int] = Query(None, ge=1),
+    exclude: Optional[List[str]] = Query(None),
+    fields: Optional[List[str]] = Query(None),
+    abstract_chars: Optional[int] = Query(None, ge=1),
+    mode: Literal["semantic", "lexical", "hybrid"] = "semantic",
+    paginate: bool = False,
+    cursor: Optional[str] = None,
+):
     """
-    Semantic search using Supabase pgvector RPC function `match_papers`.
+    Search papers by embedding (the retrieval backend: `match_papers` or the
+    local snapshot), keywords (`search_papers_lexical`) or both fused
+    (`hybrid_search_papers`). Category, date and exclusion filters are applied
+    inside the search, as are the `fields` projection and `abstract_chars`
+    truncation. `days` keeps papers from the last N days; recent windows
+    only scan the matching months.
+    arXiv ids and `author:<name>` queries are looked up directly in any mode,
+    without touching the model; the filters and pagination still apply.
+
+    With `paginate=true` the search ranks PAGE_DEPTH candidates once, returns
+    the first `limit` and an `X-Next-Cursor` header; passing that `cursor`
+    returns the next page from the cached list (the other parameters are
+    then ignored) until the header is absent.
     """
+    if cursor:
+        with span("search.page"):
+            rows, headers = cursor_page(cursor, limit)
+        return FastJSONResponse(rows, headers=headers)
+
+    fields = parse_fields(fields)
+    if fields and "abstract" not in fields:
+        abstract_chars = None
+    depth = max(limit, PAGE_DEPTH) if paginate else limit
+    published_after = recent_after(days, published_after)
+    filters = dict(exclude_ids=exclude, categories=categories, published_after=published_after,
+                   published_before=published_before, abstract_chars=abstract_chars)
+    lookup = parse_lookup(q)
     try:
-        # Generate embedding
-        # FastEmbed returns a generator, so we take the first item
-        vector = list(model.embed([q]))[0].tolist()
-        
+        if lookup is not None:
+            with span("search.lookup"):
+                rows = await lookup_papers(lookup, depth, fields, **filters)
+            with span("search.serialize"):
+                rows, headers = first_page(rows, limit, paginate)
+                return FastJSONResponse(rows, headers=headers)
+
+        if mode == "lexical":
+            rpc = supabase.rpc("search_papers_lexical", {"query_text": q, "match_count": depth, **filter_params(**filters)})
+        else:
+            # Generate embedding (or reuse a cached one)
+            with span("search.embed"):
+                vector = await query_cache.get(q)
+            if mode == "semantic":
+                with span("search.retrieve"):
+                    rows = await retrieval.match(vector, depth, fields=fields, **filters)
+                with span("search.serialize"):
+                    rows, headers = first_page(rows, limit, paginate)
+                    return FastJSONResponse(rows, headers=headers)
+            rpc = supabase.rpc("hybrid_search_papers", {
+                "query_text": q, "query_embedding": vector, "match_count": depth, **filter_params(**filters)
+            })
+
         # Call RPC
-        response = supabase.rpc(
-            "match_papers",
-            {"query_embedding": vector, "match_threshold": 0.1, "match_count": limit}
-        ).execute()
-        
-        return response.data
+        with span("search.rpc"):
+            response = await run_query(project(rpc, fields))
+
+        with span("search.serialize"):
+            rows, headers = first_page(response.data, limit, paginate)
+            return FastJSONResponse(rows, headers=headers)
 
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except asyncio.TimeoutError:
+        print(f"Search timed out for query: {q}")
+        raise HTTPException(status_code=504, detail="Search timed out")
     except Exception as e:
         print(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/v1/interactions")
-def record_interaction(interaction: UserInteraction):
+@app.post("/api/v1/search/batch")
+async def search_papers_batch(request: BatchSearchRequest):
+    """
+    Semantic search for many queries at once: cache misses are embedded in one
+    model call and every query runs in a single `match_papers_batch` RPC.
+    Returns {"results": {query: [paper, ...]}}; filters apply to all queries.
+    """
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    # Repeated queries run once, with the largest limit asked for
+    limits = {}
+    for item in request.queries:
+        limits[item.q] = max(item.limit, limits.get(item.q, 0))
+    if not limits:
+        return FastJSONResponse({"results": {}})
+    queries = list(limits)
+
+    fields = parse_fields(request.fields)
+    abstract_chars = request.abstract_chars if not fields or "abstract" in fields else None
     try:
-        data = {
-            "user_id": interaction.user_id,
-            "paper_id": interaction.paper_id,
-            "interaction_type": interaction.interaction_type
+        with span("search_batch.embed"):
+            vectors = await query_cache.get_many(queries)
+
+        params = {
+            "queries": [{"embedding": vector, "match_count": limits[q]} for q, vector in zip(queries, vectors)],
+            "match_threshold": 0.1,
+            **filter_params(exclude_ids=request.exclude, categories=request.categories,
+                            published_after=recent_after(request.days, request.published_after),
+                            published_before=request.published_before,
+                            abstract_chars=abstract_chars),
         }
-        response = supabase.table("user_interactions").insert(data).execute()
-        return {"status": "success", "data": response.data}
+        with span("search_batch.rpc"):
+            response = await run_query(project(supabase.rpc("match_papers_batch", params), ["query_index"] + fields if fields else None))
+
+        with span("search_batch.serialize"):
+            results = {q: [] for q in queries}
+            for row in response.data:
+                results[queries[row.pop("query_index")]].append(row)
+            return FastJSONResponse({"results": results})
+
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except asyncio.TimeoutError:
+        print(f"Batch search timed out for {len(queries)} queries")
+        raise HTTPException(status_code=504, detail="Search timed out")
+    except Exception as e:
+        print(f"Batch search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/papers/{paper_id:path}/similar", response_model=List[Paper])
+async def similar_papers(
+    request: Request,
+    paper_id: str,
+    limit: int = Query(10, ge=1, le=100),
+    fields: Optional[List[str]] = Query(None),
+    abstract_chars: Optional[int] = Query(None, ge=1),
+):
+    """
+    Papers most similar to `paper_id`, read from the precomputed neighbour
+    graph (`similar_papers` over `paper_neighbors`, see src/neighbor_graph.py)
+    instead of running a vector search. `paper_id` may be the stored entry
+    URL or an arXiv id; without a version, the latest stored version is used.
+    """
+    fields = parse_fields(fields)
+    if fields and "abstract" not in fields:
+        abstract_chars = None
+    try:
+        lookup = parse_lookup(paper_id)
+        if lookup is not None and lookup[0] == "id":
+            base_id, version = lookup[1]
+            if version:
+                paper_id = f"http://arxiv.org/abs/{base_id}{version}"
+            else:
+                with span("similar.resolve"):
+                    rows = await lookup_papers(lookup, 1, ["id"])
+                if not rows:
+                    raise HTTPException(status_code=404, detail=f"Unknown paper: {paper_id}")
+                paper_id = rows[0]["id"]
+
+        params = {"p_paper_id": paper_id, "match_count": limit, **filter_params(abstract_chars=abstract_chars)}
+        with span("similar.rpc"):
+            response = await run_query(project(supabase.rpc("similar_papers", params), fields))
+        if not response.data:
+            raise HTTPException(status_code=404, detail=f"No similar papers for {paper_id}")
+
+        with span("similar.serialize"):
+            return conditional_json(request, response.data)
+
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        print(f"Similar papers timed out for: {paper_id}")
+        raise HTTPException(status_code=504, detail="Similar papers timed out")
     except Exception as e:
+        print(f"Similar papers error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-import numpy as np
-import json
+@app.get("/api/v1/cache/stats")
+async def cache_stats():
+    return query_cache.stats()
+
+@app.get("/api/v1/pages/stats")
+async def pages_stats():
+    return candidate_cache.stats()
+
+# Feed profiles (sum + count of starred embeddings), refreshed on star/unstar
+profile_cache = ProfileCache(
+    max_size=int(os.environ.get("PROFILE_CACHE_SIZE", 10000)),
+    ttl_seconds=float(os.environ.get("PROFILE_CACHE_TTL", 300)),
+)
+
+@app.get("/api/v1/batcher/stats")
+async def batcher_stats():
+    return embedding_batcher.stats()
+
+registry.register_stats("resurch_query_cache", query_cache.stats)
+registry.register_stats("resurch_candidate_cache", candidate_cache.stats)
+registry.register_stats("resurch_embed_batcher", embedding_batcher.stats)
+registry.register_stats("resurch_profile_cache", profile_cache.stats)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request/stage latencies and cache stats."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+async def write_interactions(stars: List[dict], events: List[dict]):
+    """Bulk write for the interaction buffer: one RPC for all stars, one insert for the rest."""
+    if stars:
+        # Stars also update the users' materialized profiles, atomically in the DB
+        with span("interactions.record_stars"):
+            await run_query(supabase.rpc("record_stars", {"events": stars}))
+        for user_id in {star["user_id"] for star in stars}:
+            profile_cache.invalidate(user_id)
+    if events:
+        with span("interactions.insert"):
+            await run_query(supabase.table("user_interactions").insert(events, returning="minimal"))
+
+# Clicks and stars are acknowledged at once and written in bulk shortly after
+interaction_buffer = InteractionBuffer(
+    write_interactions,
+    max_batch_size=int(os.environ.get("INTERACTION_MAX_BATCH_SIZE", 200)),
+    max_wait_ms=float(os.environ.get("INTERACTION_MAX_WAIT_MS", 1000)),
+    max_pending=int(os.environ.get("INTERACTION_MAX_PENDING", 10000)),
+)
+registry.register_stats("resurch_interaction_buffer", interaction_buffer.stats)
+
+@app.post("/api/v1/interactions")
+async def record_interaction(interaction: UserInteraction):
+    """
+    Queues the interaction for the next bulk write and returns immediately.
+    Repeated events for the same user, paper and type are written once.
+    """
+    if not interaction_buffer.add(interaction.user_id, interaction.paper_id, interaction.interaction_type):
+        raise HTTPException(status_code=503, detail="Interaction queue is full", headers={"Retry-After": "5"})
+    return {"status": "success", "queued": True}
+
+@app.get("/api/v1/interactions/stats")
+async def interaction_stats():
+    return interaction_buffer.stats()
+
+async def get_profile(user_id: str) -> Optional[UserProfile]:
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        response = await run_query(supabase.table("user_profiles").select("embedding_sum,star_count").eq("user_id", user_id))
+        if not response.data:
+            return None
+        profile = UserProfile.from_row(response.data[0])
+        profile_cache.put(user_id, profile)
+    return profile
+
+# Stored feeds (user_feeds, see src/materialize_feeds.py) hold this many papers
+FEED_SIZE = int(os.environ.get("FEED_SIZE", 50))
+# Stored feeds older than this are recomputed on read, e.g. if the daily refresh failed
+FEED_MAX_AGE = float(os.environ.get("FEED_MAX_AGE_HOURS", 36)) * 3600
+
+async def get_stored_feed(user_id: str) -> Optional[list]:
+    cutoff = datetime.fromtimestamp(time.time() - FEED_MAX_AGE, tz=timezone.utc).isoformat()
+    response = await run_query(
+        supabase.table("user_feeds").select("papers").eq("user_id", user_id).eq("stale", False).gte("computed_at", cutoff)
+    )
+    return response.data[0]["papers"] if response.data else None
+
+async def store_feed(user_id: str, papers: list):
+    row = {"user_id": user_id, "papers": papers, "stale": False, "computed_at": datetime.now(timezone.utc).isoformat()}
+    try:
+        await run_query(supabase.table("user_feeds").upsert(row))
+    except Exception as e:
+        # The feed is still served; the next visit just recomputes it
+        print(f"Could not store feed for {user_id}: {e}")
 
 @app.get("/api/v1/feed", response_model=List[Paper])
-def get_feed(user_id: str):
+async def get_feed(
+    request: Request,
+    user_id: str,
+    limit: int = 10,
+    categories: Optional[List[str]] = Query(None),
+    published_after: Optional[datetime] = None,
+    published_before: Optional[datetime] = None,
+    days: Optional[int] = Query(None, ge=1),
+    fields: Optional[List[str]] = Query(None),
+    abstract_chars: Optional[int] = Query(None, ge=1),
+    paginate: bool = False,
+    cursor: Optional[str] = None,
+):
     """
     Personalized feed based on user's starred papers (centroid method).
+    Unfiltered feeds are served from the precomputed `user_feeds` row and
+    recomputed (and stored) when it is missing, stale or too old. Filtered
+    feeds go to the retrieval backend directly; starred papers are excluded
+    inside the search. Responses carry an ETag, so a client re-polling an
+    unchanged feed gets a bodiless 304.
+
+    `paginate` and `cursor` page through the feed as in search: PAGE_DEPTH
+    candidates are ranked once (the stored feed is used when it is that
+    deep) and later pages are slices of them. Cursors only work for the user
+    they were issued to.
     """
+    if cursor:
+        with span("feed.page"):
+            papers, headers = cursor_page(cursor, limit, owner=user_id)
+        return conditional_json(request, papers, headers)
+
+    fields = parse_fields(fields)
+    if fields and "abstract" not in fields:
+        abstract_chars = None
+    published_after = recent_after(days, published_after)
+    use_store = not (categories or published_after or published_before) and limit <= FEED_SIZE
     try:
-        # 1. Fetch user's starred papers
-        interactions = supabase.table("user_interactions").select("paper_id").eq("user_id", user_id).eq("interaction_type", "star").execute()
-        starred_ids = [i['paper_id'] for i in interactions.data]
-
-        if not starred_ids:
-            return []
-
-        # 2. Fetch embeddings for these papers
-        # Note: pgvector returns vectors as strings usually, we need to parse them if so.
-        # But supabase-py might parse JSON. Let's be safe.
-        response = supabase.table("papers").select("embedding").in_("id", starred_ids).execute()
-        
-        embeddings = []
-        for row in response.data:
-            emb = row['embedding']
-            if isinstance(emb, str):
-                embeddings.append(json.loads(emb))
-            else:
-                embeddings.append(emb)
-
-        if not embeddings:
-            return []
-
-        # 3. Calculate Mean Embedding (User Profile)
-        mean_embedding = np.mean(embeddings, axis=0).tolist()
-
-        # 4. Search using this mean embedding
-        response = supabase.rpc(
-            "match_papers",
-            {"query_embedding": mean_embedding, "match_threshold": 0.1, "match_count": 50}
-        ).execute()
-
-        # 5. Filter out papers already starred
-        recommendations = []
-        for paper in response.data:
-            if paper['id'] not in starred_ids:
-                recommendations.append(paper)
-                if len(recommendations) >= 10:
-                    break
-        
-        return recommendations
+        if interaction_buffer.has_pending_star(user_id):
+            # Read-your-writes: a star still in the buffer must shape this feed
+            with span("feed.flush_interactions"):
+                await interaction_buffer.flush()
+
+        if use_store and (not paginate or FEED_SIZE >= PAGE_DEPTH):
+            with span("feed.store_read"):
+                papers = await get_stored_feed(user_id)
+            if papers is not None:
+                with span("feed.serialize"):
+                    rows, headers = first_page(project_rows(papers if paginate else papers[:limit], fields, abstract_chars),
+                                               limit, paginate, owner=user_id)
+                    return conditional_json(request, rows, headers)
+
+        # 1. Load the user's materialized profile (sum and count of starred embeddings)
+        with span("feed.profile"):
+            profile = await get_profile(user_id)
+        with span("feed.centroid"):
+            centroid = profile.centroid() if profile else None
+        if centroid is None:
+            return conditional_json(request, [])
+
+        # 2. Mean Embedding (User Profile)
+        mean_embedding = centroid.tolist()
+
+        # 3. Search using this mean embedding, leaving out papers already starred
+        if use_store:
+            # Fetch a full stored feed's worth (deeper when paginating), then serve the requested slice
+            with span("feed.retrieve"):
+                depth = max(FEED_SIZE, PAGE_DEPTH) if paginate else FEED_SIZE
+                papers = await retrieval.match(mean_embedding, depth, exclude_starred_by=user_id)
+            with span("feed.store_write"):
+                await store_feed(user_id, papers[:FEED_SIZE])
+            with span("feed.serialize"):
+                rows, headers = first_page(project_rows(papers if paginate else papers[:limit], fields, abstract_chars),
+                                           limit, paginate, owner=user_id)
+                return conditional_json(request, rows, headers)
+
+        with span("feed.retrieve"):
+            papers = await retrieval.match(
+                mean_embedding, max(limit, PAGE_DEPTH) if paginate else limit, fields=fields, exclude_starred_by=user_id,
+                categories=categories, published_after=published_after, published_before=published_before,
+                abstract_chars=abstract_chars,
+            )
+
+        with span("feed.serialize"):
+            rows, headers = first_page(papers, limit, paginate, owner=user_id)
+            return conditional_json(request, rows, headers)
 
+    except asyncio.TimeoutError:
+        print(f"Feed timed out for user: {user_id}")
+        raise HTTPException(status_code=504, detail="Feed timed out")
     except Exception as e:
         print(f"Feed error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
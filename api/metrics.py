@@ -0,0 +1,203 @@
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow RPCs
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+timing_logger = logging.getLogger("resurch.timing")
+
+# Spans recorded during the current request, for the optional timing log
+_request_spans: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("request_spans", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return series[-1] if series else 0
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, series):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels + ("le",), label_values + (bound,))
+                    yield f"{self.name}_bucket{labels} {cumulative}"
+                labels = _format_labels(self.labels + ("le",), label_values + ("+Inf",))
+                yield f"{self.name}_bucket{labels} {series[-1]}"
+                base = _format_labels(self.labels, label_values)
+                yield f"{self.name}_sum{base} {series[-2]}"
+                yield f"{self.name}_count{base} {series[-1]}"
+
+
+class Registry:
+    """Holds metrics plus callbacks that report gauges (e.g. cache stats) at scrape time."""
+
+    def __init__(self):
+        self._metrics = []
+        self._gauge_callbacks = []
+
+    def counter(self, name, help_text, labels=()) -> Counter:
+        metric = Counter(name, help_text, tuple(labels))
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, tuple(labels), buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix: str, stats_fn: Callable[[], dict]):
+        """Exposes every numeric value of stats_fn() as a gauge named prefix_key."""
+        self._gauge_callbacks.append((prefix, stats_fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, stats_fn in self._gauge_callbacks:
+            for key, value in stats_fn().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "resurch_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+)
+http_duration = registry.histogram(
+    "resurch_http_request_duration_seconds", "End-to-end HTTP request latency.", ("method", "route")
+)
+stage_duration = registry.histogram(
+    "resurch_stage_duration_seconds", "Latency of named stages inside request handlers.", ("stage",)
+)
+stage_errors = registry.counter(
+    "resurch_stage_errors_total", "Stages that raised an exception.", ("stage",)
+)
+
+
+@contextmanager
+def span(stage: str):
+    """Times a named stage of a request handler."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_duration.observe(elapsed, stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware recording request counts and latency per route template
+    (e.g. /api/v1/feed, never the raw URL, to keep label cardinality bounded).
+    With `log_requests`, also emits one JSON log line per request with the
+    duration of every span recorded while handling it.
+    """
+
+    def __init__(self, app, log_requests: bool = False):
+        self.app = app
+        self.log_requests = log_requests
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+        spans = []
+        token = _request_spans.set(spans)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_spans.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            http_duration.observe(elapsed, scope["method"], route_path)
+            http_requests.inc(scope["method"], route_path, status["code"])
+            if self.log_requests:
+                timing_logger.info(json.dumps({
+                    "method": scope["method"],
+                    "route": route_path,
+                    "status": status["code"],
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "spans_ms": {name: round(seconds * 1000, 3) for name, seconds in spans},
+                }))
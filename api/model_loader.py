@@ -0,0 +1,82 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Pre-provisioned at build time (see render.yaml) so startup never downloads
+MODEL_CACHE_DIR = os.environ.get("FASTEMBED_CACHE_PATH")
+
+
+class ModelNotReady(Exception):
+    pass
+
+
+class ModelLoader:
+    """
+    Loads the embedding model off the request path.
+
+    `start()` schedules the load (plus one warmup inference, so the first real
+    query does not pay for ONNX session setup) on `executor` and returns at
+    once, letting the server bind its port while the model loads.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, cache_dir: Optional[str] = MODEL_CACHE_DIR):
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.model = None
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._task: Optional[asyncio.Future] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    def load(self):
+        # Imported here: fastembed pulls in onnxruntime and friends, which is
+        # a large share of the server's import time
+        from fastembed import TextEmbedding
+
+        start = time.perf_counter()
+        model = TextEmbedding(model_name=self.model_name, cache_dir=self.cache_dir)
+        self.load_seconds = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        list(model.embed(["warmup"], batch_size=1))
+        self.warmup_seconds = round(time.perf_counter() - start, 3)
+        self.model = model
+        print(f"Model {self.model_name} ready (load {self.load_seconds}s, warmup {self.warmup_seconds}s)")
+        return model
+
+    async def _load_in_background(self, executor):
+        try:
+            await asyncio.get_running_loop().run_in_executor(executor, self.load)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Model load failed: {e}")
+
+    def start(self, executor) -> asyncio.Future:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._load_in_background(executor))
+        return self._task
+
+    def get(self):
+        if self.model is None:
+            raise ModelNotReady(self.error or "Model is still loading")
+        return self.model
+
+    def status(self) -> dict:
+        return {
+            "model": self.model_name,
+            "ready": self.ready,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+        }
+
+
+if __name__ == "__main__":
+    # Build step: download the model into FASTEMBED_CACHE_PATH ahead of startup
+    ModelLoader().load()
@@ -0,0 +1,96 @@
+import base64
+import secrets
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed or belongs to someone else."""
+
+
+class ExpiredCursor(LookupError):
+    """The cursor's candidate list expired or was evicted; start again from the first page."""
+
+
+def encode_cursor(key: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{key}:{offset}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        key, offset = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii").split(":")
+        offset = int(offset)
+    except ValueError:
+        raise InvalidCursor("Malformed cursor")
+    if offset < 0:
+        raise InvalidCursor("Malformed cursor")
+    return key, offset
+
+
+class CandidateCache:
+    """
+    Bounded LRU + TTL cache of ranked result lists, paged through opaque cursors.
+
+    The first page of a paginated search stores the whole (deeper) ranked
+    list and returns a cursor for the rest; later pages are slices of that
+    list, with no embedding and no vector query. A cursor carries a random
+    list key and an offset; `owner` ties a list to one user (feeds), so
+    another user's cursor is rejected.
+    """
+
+    def __init__(self, max_size: int = 256, ttl_seconds: float = 600.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, owner, rows)
+        self.lists = 0
+        self.pages = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def start(self, rows: list, limit: int, owner: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """First page of `rows`, and a cursor for the next one (None if it all fit)."""
+        if len(rows) <= limit:
+            return rows, None
+        key = secrets.token_urlsafe(12)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, owner, rows)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self.lists += 1
+        return rows[:limit], encode_cursor(key, limit)
+
+    def page(self, cursor: str, limit: int, owner: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """The `limit` rows at the cursor, and the cursor after them (None at the end)."""
+        key, offset = decode_cursor(cursor)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            raise ExpiredCursor("Cursor expired; request the first page again")
+        if entry[1] != owner:
+            raise InvalidCursor("Cursor does not belong to this request")
+        self._entries.move_to_end(key)
+        self.pages += 1
+        rows = entry[2]
+        stop = offset + limit
+        return rows[offset:stop], encode_cursor(key, stop) if stop < len(rows) else None
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "lists": self.lists,
+            "pages": self.pages,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,69 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+def parse_vector(value) -> np.ndarray:
+    # pgvector columns come back from PostgREST as "[0.1,0.2,...]" strings
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+class UserProfile:
+    """Running sum of a user's starred paper embeddings."""
+
+    __slots__ = ("embedding_sum", "star_count")
+
+    def __init__(self, embedding_sum: np.ndarray, star_count: int):
+        self.embedding_sum = embedding_sum
+        self.star_count = star_count
+
+    @classmethod
+    def from_row(cls, row: dict) -> "UserProfile":
+        return cls(parse_vector(row["embedding_sum"]), int(row["star_count"]))
+
+    def centroid(self) -> Optional[np.ndarray]:
+        if self.star_count <= 0:
+            return None
+        return self.embedding_sum / self.star_count
+
+
+class ProfileCache:
+    """
+    In-process LRU cache of user profiles. Entries are dropped whenever this
+    instance records a star or un-star; the TTL bounds staleness when other
+    instances write.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # user_id -> (expires_at, UserProfile)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[UserProfile]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id: str, profile: UserProfile):
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, profile)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,148 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query: str) -> str:
+    # all-MiniLM-L6-v2 is an uncased model, so case and extra whitespace
+    # don't change the embedding and can safely share a cache entry.
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU + TTL cache of query vectors.
+
+    Keys are (model name, normalized query). Concurrent lookups of the same
+    key that miss share a single await of `embed_fn`, an async callable that
+    takes the normalized query and returns its vector. The optional
+    `embed_many_fn` takes a list of queries and lets `get_many` embed all of
+    its misses in one call.
+    """
+
+    def __init__(self, embed_fn, model_name: str, max_size: int = 1024, ttl_seconds: float = 3600.0, embed_many_fn=None):
+        self.embed_fn = embed_fn
+        self.embed_many_fn = embed_many_fn
+        self.model_name = model_name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, vector)
+        self._in_flight = {}  # key -> asyncio.Future
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, query: str):
+        # Everything up to the await runs without yielding to the event loop,
+        # so no lock is needed around the bookkeeping.
+        key = (self.model_name, normalize_query(query))
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+            self.expirations += 1
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            # Someone is already embedding this query; wait for their result
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            vector = await self.embed_fn(key[1])
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+        self._put(key, vector)
+        future.set_result(vector)
+        return vector
+
+    async def get_many(self, queries):
+        """Vectors for `queries`, in order, embedding every miss together."""
+        keys = [(self.model_name, normalize_query(q)) for q in queries]
+        resolved = {}
+        waiting = {}
+        misses = []
+        now = time.monotonic()
+        for key in dict.fromkeys(keys):
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    resolved[key] = entry[1]
+                    continue
+                del self._entries[key]
+                self.expirations += 1
+            if key in self._in_flight:
+                self.coalesced += 1
+                waiting[key] = self._in_flight[key]
+                continue
+            self.misses += 1
+            self._in_flight[key] = asyncio.get_running_loop().create_future()
+            misses.append(key)
+
+        if misses:
+            texts = [key[1] for key in misses]
+            try:
+                if self.embed_many_fn is not None:
+                    vectors = await self.embed_many_fn(texts)
+                else:
+                    vectors = await asyncio.gather(*(self.embed_fn(text) for text in texts))
+            except BaseException as e:
+                for key in misses:
+                    future = self._in_flight.pop(key)
+                    if isinstance(e, Exception):
+                        future.set_exception(e)
+                        future.exception()
+                    else:
+                        future.cancel()
+                raise
+            for key, vector in zip(misses, vectors):
+                self._put(key, vector)
+                self._in_flight.pop(key).set_result(vector)
+                resolved[key] = vector
+
+        for key, future in waiting.items():
+            resolved[key] = await asyncio.shield(future)
+        return [resolved[key] for key in keys]
+
+    def _put(self, key, vector):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "model": self.model_name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
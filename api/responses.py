@@ -0,0 +1,80 @@
+import hashlib
+import json
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is a few times slower
+    orjson = None
+
+# Columns a search/feed caller may project; id is always returned
+PAPER_FIELDS = ("id", "title", "abstract", "url", "similarity")
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response that skips pydantic validation of the payload. The RPC rows
+    are already plain dicts of the right shape.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def parse_fields(fields: Optional[List[str]]) -> Optional[List[str]]:
+    """
+    Accepts repeated (?fields=id&fields=title) or comma-separated
+    (?fields=id,title) projections. Returns None for "all fields".
+    """
+    if not fields:
+        return None
+    requested = [name.strip() for value in fields for name in value.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(PAPER_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(PAPER_FIELDS)}.")
+    return ["id"] + [name for name in dict.fromkeys(requested) if name != "id"]
+
+
+def project(rpc, fields: Optional[Iterable[str]]):
+    """Applies a column projection to a PostgREST RPC builder."""
+    return rpc.select(",".join(fields)) if fields else rpc
+
+
+def project_rows(rows, fields: Optional[Iterable[str]], abstract_chars: Optional[int] = None) -> list:
+    """The same projection and truncation as the RPC path, applied to stored rows."""
+    if not fields and not abstract_chars:
+        return rows
+    projected = []
+    for row in rows:
+        row = {name: row.get(name) for name in fields} if fields else dict(row)
+        if abstract_chars and row.get("abstract"):
+            row["abstract"] = row["abstract"][:abstract_chars]
+        projected.append(row)
+    return projected
+
+
+def etag_for(body: bytes) -> str:
+    # Weak: the same feed may go out gzip- or brotli-encoded
+    return 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def conditional_json(request: Request, data, headers: Optional[dict] = None) -> Response:
+    """Serializes `data` with an ETag, answering 304 if the client already has it."""
+    body = dumps(data)
+    etag = etag_for(body)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", **(headers or {})}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+import numpy as np
+
+from api.responses import project, project_rows
+from src.time_shards import HOT_MONTHS, TimeShards, empty_top_k, merge_top_k
+from src.vector_store import load_id_table
+
+# Snapshot layout written by src/export_snapshot.py
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_META = "snapshot.json"
+
+MATCH_THRESHOLD = 0.1
+
+
+def filter_params(exclude_ids=None, exclude_starred_by=None, categories=None,
+                  published_after=None, published_before=None, abstract_chars=None) -> dict:
+    """Optional RPC filter arguments; only the ones that are set are sent."""
+    filters = {
+        "exclude_ids": exclude_ids,
+        "exclude_starred_by": exclude_starred_by,
+        "filter_categories": categories,
+        "published_after": published_after.isoformat() if published_after else None,
+        "published_before": published_before.isoformat() if published_before else None,
+        "abstract_chars": abstract_chars,
+    }
+    return {name: value for name, value in filters.items() if value}
+
+
+def recent_after(days: Optional[int], published_after: Optional[datetime] = None) -> Optional[datetime]:
+    """Lower publication bound for "the last `days` days"; the later of it and `published_after` wins."""
+    if days is None:
+        return published_after
+    recent = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    if published_after is None or _timestamp(published_after) < _timestamp(recent):
+        return recent
+    return published_after
+
+
+def match_params(vector, match_count: int, **filters) -> dict:
+    """Arguments for the `match_papers` RPC."""
+    return {"query_embedding": vector, "match_threshold": MATCH_THRESHOLD, "match_count": match_count, **filter_params(**filters)}
+
+
+class PgvectorBackend:
+    """
+    Vector search through the `match_papers` RPC. `client_fn` returns the
+    Supabase client and `execute` runs a query builder (with its timeout).
+    """
+
+    name = "pgvector"
+    ready = True
+
+    def __init__(self, client_fn: Callable, execute: Callable[..., Awaitable]):
+        self.client_fn = client_fn
+        self.execute = execute
+
+    async def start(self, executor=None):
+        pass
+
+    async def close(self):
+        pass
+
+    async def match(self, vector, match_count: int, fields: Optional[List[str]] = None, **filters) -> list:
+        rpc = self.client_fn().rpc("match_papers", match_params(vector, match_count, **filters))
+        return (await self.execute(project(rpc, fields))).data
+
+    def status(self) -> dict:
+        return {"backend": self.name}
+
+
+def _timestamp(value: datetime) -> float:
+    # Naive datetimes are UTC, as for the `timestamp` column in Postgres
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class Snapshot:
+    """
+    One exported snapshot: unit vectors split into publication-month shards
+    (the newest `hot_months` in memory, the rest memory-mapped), filters and
+    a metadata table.
+    """
+
+    def __init__(self, path: str, hot_months: int = HOT_MONTHS):
+        self.path = path
+        with open(os.path.join(path, SNAPSHOT_META), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.version = self.meta["version"]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.ids = load_id_table(path)
+        self.published = np.load(os.path.join(path, "published.npy"))
+        self.categories = np.load(os.path.join(path, "categories.npy"), mmap_mode="r")
+        self.category_index = {name: i for i, name in enumerate(self.meta["categories"])}
+        self.row_of = {pid.decode("utf-8"): row for row, pid in enumerate(self.ids)}
+        self.shards = TimeShards(self.vectors, self.published, hot_months)
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One read-only connection per worker thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = "file:" + os.path.abspath(os.path.join(self.path, "metadata.db")) + "?mode=ro"
+            conn = self._local.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return conn
+
+    def _category_mask(self, index, categories: Iterable[str]) -> np.ndarray:
+        bits = self.categories[index]
+        mask = np.zeros(len(bits), dtype=bool)
+        for name in categories:
+            column = self.category_index.get(name)
+            if column is not None:
+                mask |= ((bits[:, column >> 3] >> (7 - (column & 7))) & 1).astype(bool)
+        return mask
+
+    def match(self, vector, match_count: int, exclude_ids=None, categories=None,
+              published_after=None, published_before=None, threshold=MATCH_THRESHOLD):
+        """
+        Top rows by cosine similarity, with the same filters as match_papers.
+        Only the month shards overlapping the date window are scored; their
+        top rows are merged. Returns [(row, similarity)].
+        """
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm == 0 or not len(self):
+            return []
+        query = query / norm
+        after = _timestamp(published_after) if published_after is not None else None
+        before = _timestamp(published_before) if published_before is not None else None
+        excluded = np.array([self.row_of[pid] for pid in exclude_ids or () if pid in self.row_of], dtype=np.int64)
+
+        best = empty_top_k()
+        for shard in self.shards.select(after, before):
+            scores = shard.vectors(self.vectors) @ query
+            keep = scores > threshold
+            mask = shard.window_mask(after, before)
+            if mask is not None:
+                keep &= mask
+            if categories:
+                keep &= self._category_mask(shard.index, categories)
+            if len(excluded):
+                keep &= ~np.isin(shard.rows, excluded)
+            candidates = np.flatnonzero(keep)
+            best = merge_top_k(best, shard.rows[candidates], scores[candidates], match_count)
+        return [(int(row), float(score)) for row, score in zip(*best)]
+
+    def rows(self, matches) -> list:
+        if not matches:
+            return []
+        placeholders = ",".join("?" * len(matches))
+        records = {row: (title, abstract, url) for row, title, abstract, url in self._conn().execute(
+            f"SELECT row, title, abstract, url FROM papers WHERE row IN ({placeholders})", [row for row, _ in matches]
+        )}
+        papers = []
+        for row, similarity in matches:
+            title, abstract, url = records.get(row, (None, None, None))
+            papers.append({"id": self.ids[row].decode("utf-8"), "title": title, "abstract": abstract, "url": url, "similarity": similarity})
+        return papers
+
+
+class LocalBackend:
+    """
+    In-process vector search over the current snapshot in `root`.
+
+    Scoring is exact (one BLAS matrix-vector product per month shard the
+    date window touches) and runs on `executor`. `watch()` polls the CURRENT pointer and
+    swaps in a new snapshot once it is fully loaded; requests already running
+    finish on the snapshot they started with. Starred papers are excluded
+    through `starred_fn(user_id)`, which returns the ids to leave out.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, starred_fn: Optional[Callable[[str], Awaitable[Iterable[str]]]] = None, poll_seconds: float = 30.0,
+                 hot_months: int = HOT_MONTHS):
+        self.root = root
+        self.hot_months = hot_months
+        self.starred_fn = starred_fn
+        self.poll_seconds = poll_seconds
+        self.snapshot: Optional[Snapshot] = None
+        self.executor = None
+        self.swaps = 0
+        self.error: Optional[str] = None
+        self._watcher = None
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def refresh(self) -> bool:
+        """Loads the snapshot CURRENT points to if it is not the one being served. Blocking."""
+        version = self.current_version()
+        if version is None or (self.snapshot is not None and self.snapshot.version == version):
+            return False
+        try:
+            snapshot = Snapshot(os.path.join(self.root, version), self.hot_months)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Could not load snapshot {version}: {self.error}")
+            return False
+        # A single reference assignment: each request sees the old or the new snapshot
+        self.snapshot = snapshot
+        self.swaps += 1
+        self.error = None
+        print(f"Serving snapshot {version} ({len(snapshot)} papers)")
+        return True
+
+    async def start(self, executor=None):
+        """Starts loading the current snapshot in the background; `ready` (and /readyz) report when it is usable."""
+        self.executor = executor
+        self._watcher = asyncio.get_running_loop().create_task(self.watch())
+
+    async def watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await loop.run_in_executor(self.executor, self.refresh)
+            await asyncio.sleep(self.poll_seconds)
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+    async def match(self, vector, match_count: int, fields: Optional[List[str]] = None, exclude_ids=None,
+                    exclude_starred_by=None, categories=None, published_after=None, published_before=None,
+                    abstract_chars=None) -> list:
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise RuntimeError(self.error or f"No snapshot in {self.root}")
+        exclude = list(exclude_ids or ())
+        if exclude_starred_by and self.starred_fn is not None:
+            exclude.extend(await self.starred_fn(exclude_starred_by))
+
+        def run():
+            matches = snapshot.match(vector, match_count, exclude, categories, published_after, published_before)
+            return snapshot.rows(matches)
+
+        rows = await asyncio.get_running_loop().run_in_executor(self.executor, run)
+        return project_rows(rows, fields, abstract_chars)
+
+    def status(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "backend": self.name,
+            "snapshot": snapshot.version if snapshot else None,
+            "papers": len(snapshot) if snapshot else 0,
+            "swaps": self.swaps,
+            "error": self.error,
+            **(snapshot.shards.status() if snapshot else {}),
+        }
@@ -1,14 +1,24 @@
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 import sys
+from datetime import datetime, timedelta, timezone
 
-# We need to mock 'supabase' before importing main because it connects on import
-with patch('api.main.create_client') as MockClient:
-    from api.main import app
+# The Supabase client is created on startup; TestClient is not used as a
+# context manager here, so tests install their own mock client instead.
+import api.main as main
+from api.main import app
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def mock_embedding():
+    # Skip the real model; every query embeds to the same small vector
+    main.query_cache.clear()
+    with patch.object(main.query_cache, "embed_fn", AsyncMock(return_value=[0.1, 0.2])) as embed:
+        yield embed
+
 def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
@@ -19,33 +29,507 @@ def test_search_endpoint(mock_supabase):
     # Mock Supabase RPC
     mock_response = MagicMock()
     mock_response.data = [{"id": "1", "title": "Test Paper", "abstract": "...", "similarity": 0.9}]
-    mock_supabase.rpc.return_value.execute.return_value = mock_response
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    response = client.get("/api/v1/search?q=test")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["title"] == "Test Paper"
+
+@patch('api.main.supabase')
+def test_search_reuses_cached_query_vector(mock_supabase, mock_embedding):
+    mock_response = MagicMock()
+    mock_response.data = []
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    client.get("/api/v1/search?q=Graph  Networks")
+    client.get("/api/v1/search?q=graph networks")
 
-    # We also need to mock SentenceTransformer which is imported INSIDE the function
-    with patch('sentence_transformers.SentenceTransformer') as MockModel:
-        mock_model_inst = MockModel.return_value
-        mock_model_inst.encode.return_value.tolist.return_value = [0.1, 0.2]
-        
+    assert mock_embedding.await_count == 1
+    assert client.get("/api/v1/cache/stats").json()["hits"] == 1
+
+@patch('api.main.supabase')
+def test_search_timeout_returns_504(mock_supabase):
+    async def slow_execute():
+        import asyncio
+        await asyncio.sleep(1)
+
+    mock_supabase.rpc.return_value.execute = slow_execute
+    with patch.object(main, "DB_TIMEOUT", 0.01):
         response = client.get("/api/v1/search?q=test")
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert len(data) == 1
-        assert data[0]["title"] == "Test Paper"
+    assert response.status_code == 504
 
 @patch('api.main.supabase')
 def test_interaction_endpoint(mock_supabase):
-    # Mock Insert
-    mock_response = MagicMock()
-    mock_response.data = [{"id": "uuid", "status": "created"}]
-    mock_supabase.table.return_value.insert.return_value.execute.return_value = mock_response
-    
+    mock_supabase.table.return_value.insert.return_value.execute = AsyncMock(return_value=MagicMock(data=[]))
+
     payload = {
         "user_id": "user_123",
         "paper_id": "paper_abc",
-        "interaction_type": "star"
+        "interaction_type": "click"
     }
     response = client.post("/api/v1/interactions", json=payload)
-    
+    client.post("/api/v1/interactions", json=payload)
+
     assert response.status_code == 200
     assert response.json()["status"] == "success"
+    # Acknowledged before anything is written; the duplicate click coalesces
+    mock_supabase.table.assert_not_called()
+    asyncio.run(main.interaction_buffer.flush())
+    mock_supabase.table.return_value.insert.assert_called_once_with(
+        [{"user_id": "user_123", "paper_id": "paper_abc", "interaction_type": "click"}], returning="minimal"
+    )
+
+@patch('api.main.supabase')
+def test_search_filters_are_pushed_into_rpc(mock_supabase):
+    mock_response = MagicMock()
+    mock_response.data = []
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    response = client.get(
+        "/api/v1/search?q=test&limit=5&categories=cs.AI&categories=cs.LG"
+        "&published_after=2024-01-01T00:00:00&exclude=p1"
+    )
+
+    assert response.status_code == 200
+    name, params = mock_supabase.rpc.call_args[0]
+    assert name == "match_papers"
+    assert params["match_count"] == 5
+    assert params["filter_categories"] == ["cs.AI", "cs.LG"]
+    assert params["published_after"] == "2024-01-01T00:00:00"
+    assert params["exclude_ids"] == ["p1"]
+    assert "published_before" not in params
+
+def make_table_mock(rows_by_table):
+    """supabase.table(name) mock whose query chain resolves to rows_by_table[name]."""
+    def table(name):
+        builder = MagicMock()
+        response = MagicMock()
+        response.data = rows_by_table[name]
+        # Every chained filter returns the same builder, so any chain works
+        for method in ("select", "eq", "in_", "insert", "limit", "like", "order", "gte", "lt", "ov", "upsert"):
+            getattr(builder, method).return_value = builder
+        builder.not_ = builder
+        builder.execute = AsyncMock(return_value=response)
+        return builder
+    return table
+
+@patch('api.main.supabase')
+def test_feed_uses_materialized_profile(mock_supabase):
+    main.profile_cache.invalidate("user_123")
+    mock_supabase.table.side_effect = make_table_mock({
+        "user_feeds": [],
+        "user_profiles": [{"embedding_sum": "[2.0,4.0]", "star_count": 2}],
+    })
+    rpc_response = MagicMock()
+    rpc_response.data = [{"id": "p2", "title": "Fresh", "abstract": "..."}]
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=rpc_response)
+
+    response = client.get("/api/v1/feed?user_id=user_123")
+
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == ["p2"]
+    # The feed queries with the profile centroid (sum / count) and lets the
+    # database drop starred papers
+    _, params = mock_supabase.rpc.call_args[0]
+    assert params["query_embedding"] == [1.0, 2.0]
+    assert params["exclude_starred_by"] == "user_123"
+    assert params["match_count"] == main.FEED_SIZE
+    # Neither starred ids nor their embeddings are fetched; the result is stored
+    assert [c.args[0] for c in mock_supabase.table.call_args_list] == ["user_feeds", "user_profiles", "user_feeds"]
+
+    # A second load is served from the in-process profile cache
+    client.get("/api/v1/feed?user_id=user_123")
+    assert [c.args[0] for c in mock_supabase.table.call_args_list].count("user_profiles") == 1
+
+@patch('api.main.supabase')
+def test_feed_without_profile_is_empty(mock_supabase):
+    main.profile_cache.invalidate("new_user")
+    mock_supabase.table.side_effect = make_table_mock({"user_feeds": [], "user_profiles": []})
+
+    response = client.get("/api/v1/feed?user_id=new_user")
+
+    assert response.status_code == 200
+    assert response.json() == []
+    mock_supabase.rpc.assert_not_called()
+
+@patch('api.main.supabase')
+def test_star_updates_profile_and_invalidates_cache(mock_supabase):
+    from api.profiles import UserProfile
+    import numpy as np
+    main.profile_cache.put("user_123", UserProfile(np.ones(2, dtype=np.float32), 1))
+
+    rpc_response = MagicMock()
+    rpc_response.data = [{"id": "uuid", "interaction_type": "unstar"}]
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=rpc_response)
+
+    for interaction_type in ("star", "unstar"):
+        payload = {"user_id": "user_123", "paper_id": "paper_abc", "interaction_type": interaction_type}
+        response = client.post("/api/v1/interactions", json=payload)
+        assert response.status_code == 200
+    asyncio.run(main.interaction_buffer.flush())
+
+    # The star and unstar collapse to the last one
+    mock_supabase.rpc.assert_called_once_with(
+        "record_stars", {"events": [{"user_id": "user_123", "paper_id": "paper_abc", "starred": False}]}
+    )
+    assert main.profile_cache.get("user_123") is None
+
+def test_healthz_does_not_wait_for_model():
+    with patch.object(main.model_loader, "model", None):
+        response = client.get("/healthz")
+    assert response.status_code == 200
+
+@patch('api.main.supabase')
+def test_readyz_reports_model_and_db(mock_supabase):
+    mock_supabase.table.side_effect = make_table_mock({"papers": [{"id": "p1"}]})
+
+    with patch.object(main.model_loader, "model", None):
+        loading = client.get("/readyz")
+    with patch.object(main.model_loader, "model", MagicMock()):
+        ready = client.get("/readyz")
+
+    assert loading.status_code == 503
+    assert loading.json()["db"] is True
+    assert ready.status_code == 200
+    assert ready.json()["ready"] is True
+
+@patch('api.main.supabase')
+def test_search_before_model_ready_returns_503(mock_supabase, mock_embedding):
+    with patch.object(main.query_cache, "embed_fn", main.embed_query), \
+         patch.object(main.model_loader, "model", None):
+        response = client.get("/api/v1/search?q=too early")
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+    mock_supabase.rpc.assert_not_called()
+
+@patch('api.main.supabase')
+def test_search_projection_is_pushed_into_rpc(mock_supabase):
+    mock_response = MagicMock()
+    mock_response.data = [{"id": "1", "title": "Test Paper"}]
+    rpc = mock_supabase.rpc.return_value
+    rpc.select.return_value.execute = AsyncMock(return_value=mock_response)
+
+    response = client.get("/api/v1/search?q=test&fields=title,url&abstract_chars=200")
+
+    assert response.status_code == 200
+    assert response.json() == [{"id": "1", "title": "Test Paper"}]
+    rpc.select.assert_called_once_with("id,title,url")
+    # No abstract requested, so there is nothing to truncate
+    _, params = mock_supabase.rpc.call_args[0]
+    assert "abstract_chars" not in params
+
+@patch('api.main.supabase')
+def test_search_truncates_abstract_in_rpc(mock_supabase):
+    mock_response = MagicMock()
+    mock_response.data = []
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    client.get("/api/v1/search?q=test&abstract_chars=120")
+
+    _, params = mock_supabase.rpc.call_args[0]
+    assert params["abstract_chars"] == 120
+    mock_supabase.rpc.return_value.select.assert_not_called()
+
+def test_search_rejects_unknown_fields():
+    response = client.get("/api/v1/search?q=test&fields=title,embedding")
+    assert response.status_code == 400
+    assert "embedding" in response.json()["detail"]
+
+@patch('api.main.supabase')
+def test_feed_returns_304_when_unchanged(mock_supabase):
+    main.profile_cache.invalidate("user_etag")
+    mock_supabase.table.side_effect = make_table_mock({
+        "user_feeds": [],
+        "user_profiles": [{"embedding_sum": "[1.0,1.0]", "star_count": 1}],
+    })
+    rpc_response = MagicMock()
+    rpc_response.data = [{"id": "p2", "title": "Fresh", "abstract": "..."}]
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=rpc_response)
+
+    first = client.get("/api/v1/feed?user_id=user_etag")
+    etag = first.headers["etag"]
+    again = client.get("/api/v1/feed?user_id=user_etag", headers={"If-None-Match": etag})
+
+    rpc_response.data = [{"id": "p3", "title": "Newer", "abstract": "..."}]
+    changed = client.get("/api/v1/feed?user_id=user_etag", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert again.status_code == 304
+    assert again.content == b""
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+@patch('api.main.supabase')
+def test_large_responses_are_compressed(mock_supabase):
+    mock_response = MagicMock()
+    mock_response.data = [{"id": str(i), "title": "Paper", "abstract": "x" * 200} for i in range(20)]
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    response = client.get("/api/v1/search?q=test", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 20
+
+@patch('api.main.supabase')
+def test_lexical_search_skips_the_model(mock_supabase, mock_embedding):
+    mock_response = MagicMock()
+    mock_response.data = [{"id": "p1", "title": "Mamba", "similarity": 0.4}]
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    response = client.get("/api/v1/search?q=state space models&mode=lexical&categories=cs.LG")
+
+    assert response.status_code == 200
+    name, params = mock_supabase.rpc.call_args[0]
+    assert name == "search_papers_lexical"
+    assert params == {"query_text": "state space models", "match_count": 10, "filter_categories": ["cs.LG"]}
+    mock_embedding.assert_not_awaited()
+
+@patch('api.main.supabase')
+def test_hybrid_search_sends_text_and_vector(mock_supabase):
+    mock_response = MagicMock()
+    mock_response.data = []
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    client.get("/api/v1/search?q=diffusion&mode=hybrid&limit=5")
+
+    name, params = mock_supabase.rpc.call_args[0]
+    assert name == "hybrid_search_papers"
+    assert params["query_text"] == "diffusion"
+    assert params["query_embedding"] == [0.1, 0.2]
+    assert params["match_count"] == 5
+
+@patch('api.main.supabase')
+def test_arxiv_id_lookup_reads_the_table(mock_supabase, mock_embedding):
+    mock_supabase.table.side_effect = make_table_mock({
+        "papers": [{"id": "http://arxiv.org/abs/2401.12345v2", "title": "Found", "abstract": "abcdef"}],
+    })
+
+    response = client.get("/api/v1/search?q=arXiv:2401.12345&mode=hybrid&abstract_chars=3")
+
+    assert response.status_code == 200
+    assert response.json() == [{"id": "http://arxiv.org/abs/2401.12345v2", "title": "Found", "abstract": "abc"}]
+    mock_supabase.rpc.assert_not_called()
+    mock_embedding.assert_not_awaited()
+
+@patch('api.main.supabase')
+def test_author_lookup_uses_lexical_rpc(mock_supabase, mock_embedding):
+    mock_response = MagicMock()
+    mock_response.data = []
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    client.get("/api/v1/search?q=author:Yann LeCun")
+
+    name, params = mock_supabase.rpc.call_args[0]
+    assert name == "search_papers_lexical"
+    assert params["query_text"] == "Yann LeCun"
+    assert params["authors_only"] is True
+    mock_embedding.assert_not_awaited()
+
+@patch('api.main.supabase')
+def test_lookups_apply_the_search_filters(mock_supabase, mock_embedding):
+    mock_response = MagicMock()
+    mock_response.data = [{"id": f"p{i}", "title": f"Paper {i}"} for i in range(15)]
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    response = client.get("/api/v1/search?q=author:Hinton&categories=cs.LG&exclude=p0"
+                          "&published_after=2024-01-01T00:00:00&limit=10&paginate=true")
+
+    params = mock_supabase.rpc.call_args[0][1]
+    assert params["filter_categories"] == ["cs.LG"] and params["exclude_ids"] == ["p0"]
+    assert params["published_after"] == "2024-01-01T00:00:00"
+    assert params["match_count"] == main.PAGE_DEPTH
+    assert len(response.json()) == 10 and "x-next-cursor" in response.headers
+
+    builders = []
+    table = make_table_mock({"papers": []})
+    mock_supabase.table.side_effect = lambda name: builders.append(table(name)) or builders[-1]
+
+    client.get("/api/v1/search?q=2401.12345&categories=cs.LG&exclude=x&published_before=2025-01-01T00:00:00")
+
+    query = builders[-1]
+    query.in_.assert_called_once_with("id", ["x"])
+    query.ov.assert_called_once_with("categories", ["cs.LG"])
+    query.lt.assert_called_once_with("published", "2025-01-01T00:00:00")
+
+@patch('api.main.supabase')
+def test_batch_search_uses_one_embed_and_one_rpc(mock_supabase):
+    mock_response = MagicMock()
+    mock_response.data = [
+        {"query_index": 0, "id": "p1", "title": "A"},
+        {"query_index": 1, "id": "p2", "title": "B"},
+        {"query_index": 1, "id": "p3", "title": "C"},
+    ]
+    mock_supabase.rpc.return_value.select.return_value.execute = AsyncMock(return_value=mock_response)
+    embed_many = AsyncMock(return_value=[[0.1, 0.2], [0.3, 0.4]])
+
+    payload = {
+        "queries": [{"q": "graphs", "limit": 1}, {"q": "diffusion"}, {"q": "graphs", "limit": 3}],
+        "categories": ["cs.LG"],
+        "fields": ["title"],
+    }
+    with patch.object(main.query_cache, "embed_many_fn", embed_many):
+        response = client.post("/api/v1/search/batch", json=payload)
+
+    assert response.status_code == 200
+    assert response.json() == {"results": {
+        "graphs": [{"id": "p1", "title": "A"}],
+        "diffusion": [{"id": "p2", "title": "B"}, {"id": "p3", "title": "C"}],
+    }}
+    embed_many.assert_awaited_once_with(["graphs", "diffusion"])
+    mock_supabase.rpc.assert_called_once()
+    name, params = mock_supabase.rpc.call_args[0]
+    assert name == "match_papers_batch"
+    assert params["queries"] == [
+        {"embedding": [0.1, 0.2], "match_count": 3},
+        {"embedding": [0.3, 0.4], "match_count": 10},
+    ]
+    assert params["filter_categories"] == ["cs.LG"]
+    mock_supabase.rpc.return_value.select.assert_called_once_with("query_index,id,title")
+
+def test_batch_search_rejects_oversized_batches():
+    payload = {"queries": [{"q": f"q{i}"} for i in range(main.MAX_BATCH_QUERIES + 1)]}
+    assert client.post("/api/v1/search/batch", json=payload).status_code == 400
+
+@patch('api.main.supabase')
+def test_feed_is_served_from_stored_feed(mock_supabase):
+    stored = [{"id": f"p{i}", "title": f"T{i}", "abstract": "long abstract", "url": None, "similarity": 0.9} for i in range(20)]
+    mock_supabase.table.side_effect = make_table_mock({"user_feeds": [{"papers": stored}]})
+
+    response = client.get("/api/v1/feed?user_id=user_123&limit=3&fields=title,abstract&abstract_chars=4")
+
+    assert response.status_code == 200
+    assert response.json() == [{"id": f"p{i}", "title": f"T{i}", "abstract": "long"} for i in range(3)]
+    mock_supabase.rpc.assert_not_called()
+    assert [c.args[0] for c in mock_supabase.table.call_args_list] == ["user_feeds"]
+
+@patch('api.main.supabase')
+def test_filtered_feed_bypasses_stored_feed(mock_supabase):
+    main.profile_cache.invalidate("user_filtered")
+    mock_supabase.table.side_effect = make_table_mock({
+        "user_profiles": [{"embedding_sum": "[1.0,1.0]", "star_count": 1}],
+    })
+    rpc_response = MagicMock()
+    rpc_response.data = []
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=rpc_response)
+
+    response = client.get("/api/v1/feed?user_id=user_filtered&categories=cs.CV")
+
+    assert response.status_code == 200
+    _, params = mock_supabase.rpc.call_args[0]
+    assert params["filter_categories"] == ["cs.CV"]
+    assert params["match_count"] == 10
+    assert [c.args[0] for c in mock_supabase.table.call_args_list] == ["user_profiles"]
+
+@patch('api.main.supabase')
+def test_feed_flushes_pending_stars_first(mock_supabase):
+    mock_supabase.table.side_effect = make_table_mock({"user_feeds": [{"papers": []}]})
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=MagicMock(data=1))
+
+    client.post("/api/v1/interactions", json={"user_id": "user_fresh", "paper_id": "p1", "interaction_type": "star"})
+    response = client.get("/api/v1/feed?user_id=user_fresh")
+
+    assert response.status_code == 200
+    mock_supabase.rpc.assert_called_once_with("record_stars", {"events": [{"user_id": "user_fresh", "paper_id": "p1", "starred": True}]})
+    assert main.interaction_buffer.stats()["pending"] == 0
+
+@patch('api.main.supabase')
+def test_semantic_search_can_use_local_backend(mock_supabase, tmp_path):
+    from api.tests.test_retrieval import make_backend
+    backend = make_backend(tmp_path)
+
+    with patch.object(main, "retrieval", backend):
+        response = client.get("/api/v1/search?q=test&limit=2&fields=title")
+
+    assert response.status_code == 200
+    # The mocked query vector [0.1, 0.2] points closest to "far"
+    assert [p["id"] for p in response.json()] == ["far", "mid"]
+    mock_supabase.rpc.assert_not_called()
+
+@patch('api.main.supabase')
+def test_similar_papers_reads_the_neighbour_graph(mock_supabase, mock_embedding):
+    rpc_response = MagicMock()
+    rpc_response.data = [{"id": "http://arxiv.org/abs/2401.00002v1", "title": "Neighbour", "similarity": 0.8}]
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=rpc_response)
+
+    response = client.get("/api/v1/papers/2401.00001v2/similar?limit=5&abstract_chars=100")
+
+    assert response.status_code == 200
+    assert response.json()[0]["title"] == "Neighbour"
+    assert "ETag" in response.headers
+    mock_supabase.rpc.assert_called_once_with(
+        "similar_papers", {"p_paper_id": "http://arxiv.org/abs/2401.00001v2", "match_count": 5, "abstract_chars": 100}
+    )
+    mock_embedding.assert_not_awaited()
+
+@patch('api.main.supabase')
+def test_similar_papers_resolves_unversioned_ids(mock_supabase):
+    mock_supabase.table.side_effect = make_table_mock({"papers": []})
+
+    response = client.get("/api/v1/papers/2401.99999/similar")
+
+    assert response.status_code == 404
+    mock_supabase.rpc.assert_not_called()
+
+@patch('api.main.supabase')
+def test_days_narrows_the_publication_window(mock_supabase, mock_embedding):
+    mock_response = MagicMock()
+    mock_response.data = []
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    client.get("/api/v1/search?q=diffusion&mode=lexical&days=7")
+    recent = datetime.fromisoformat(mock_supabase.rpc.call_args[0][1]["published_after"])
+    client.get("/api/v1/search?q=diffusion&mode=lexical&days=7&published_after=2999-01-01T00:00:00")
+    later = mock_supabase.rpc.call_args[0][1]["published_after"]
+
+    assert abs((datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=7) - recent).total_seconds()) < 60
+    assert later == "2999-01-01T00:00:00"
+
+@patch('api.main.supabase')
+def test_paginated_search_ranks_once_and_serves_pages_from_cache(mock_supabase, mock_embedding):
+    rpc_response = MagicMock()
+    rpc_response.data = [{"id": f"p{i}", "title": f"Paper {i}"} for i in range(25)]
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=rpc_response)
+
+    pages = [client.get("/api/v1/search?q=transformers&limit=10&paginate=true")]
+    while "x-next-cursor" in pages[-1].headers:
+        pages.append(client.get(f"/api/v1/search?q=transformers&limit=10&cursor={pages[-1].headers['x-next-cursor']}"))
+
+    assert [len(page.json()) for page in pages] == [10, 10, 5]
+    assert [p["id"] for page in pages for p in page.json()] == [f"p{i}" for i in range(25)]
+    mock_supabase.rpc.assert_called_once()
+    assert mock_supabase.rpc.call_args[0][1]["match_count"] == main.PAGE_DEPTH
+    assert mock_embedding.await_count == 1
+
+def test_unknown_or_malformed_cursors_are_rejected():
+    expired = main.candidate_cache.start([{"id": "a"}, {"id": "b"}], 1)[1]
+    main.candidate_cache.clear()
+
+    assert client.get(f"/api/v1/search?q=x&cursor={expired}").status_code == 410
+    assert client.get("/api/v1/search?q=x&cursor=not-a-cursor").status_code == 400
+
+@patch('api.main.supabase')
+def test_paginated_feed_scrolls_past_the_stored_feed(mock_supabase):
+    main.profile_cache.invalidate("user_pages")
+    mock_supabase.table.side_effect = make_table_mock({
+        "user_feeds": [{"papers": [{"id": "stored", "title": "T"}], "stale": False,
+                        "computed_at": datetime.now(timezone.utc).isoformat()}],
+        "user_profiles": [{"embedding_sum": "[1.0,1.0]", "star_count": 1}],
+    })
+    rpc_response = MagicMock()
+    rpc_response.data = [{"id": f"p{i}", "title": "T"} for i in range(main.PAGE_DEPTH)]
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=rpc_response)
+
+    pages = [client.get("/api/v1/feed?user_id=user_pages&paginate=true&limit=10")]
+    while "x-next-cursor" in pages[-1].headers:
+        pages.append(client.get(f"/api/v1/feed?user_id=user_pages&limit=10&cursor={pages[-1].headers['x-next-cursor']}"))
+    other = client.get(f"/api/v1/feed?user_id=someone_else&cursor={pages[0].headers['x-next-cursor']}")
+
+    assert main.PAGE_DEPTH > main.FEED_SIZE
+    assert [p["id"] for page in pages for p in page.json()] == [f"p{i}" for i in range(main.PAGE_DEPTH)]
+    mock_supabase.rpc.assert_called_once()
+    assert mock_supabase.rpc.call_args[0][1]["match_count"] == main.PAGE_DEPTH
+    assert other.status_code == 400
@@ -0,0 +1,52 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from api.embedding_batcher import EmbeddingBatcher
+
+def test_concurrent_texts_share_one_batch():
+    calls = []
+    def embed_batch(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = EmbeddingBatcher(embed_batch, executor, max_batch_size=8, max_wait_ms=20)
+            results = await asyncio.gather(*(batcher.embed("x" * n) for n in range(1, 4)))
+            return results, batcher.stats()
+
+    results, stats = asyncio.run(scenario())
+    # Each caller gets back the vector for its own text
+    assert results == [[1.0], [2.0], [3.0]]
+    assert calls == [["x", "xx", "xxx"]]
+    assert stats["batches"] == 1
+    assert stats["mean_batch_size"] == 3
+
+def test_full_batch_is_sent_without_waiting():
+    calls = []
+    def embed_batch(texts):
+        calls.append(len(texts))
+        return [[0.0]] * len(texts)
+
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # A huge wait window: only the size limit can trigger these batches
+            batcher = EmbeddingBatcher(embed_batch, executor, max_batch_size=2, max_wait_ms=60_000)
+            await asyncio.wait_for(asyncio.gather(*(batcher.embed(str(i)) for i in range(4))), timeout=5)
+            return batcher.stats()
+
+    stats = asyncio.run(scenario())
+    assert calls == [2, 2]
+    assert stats["full_batches"] == 2
+    assert stats["mean_fill_ratio"] == 1.0
+
+def test_batch_errors_reach_every_caller():
+    def broken(texts):
+        raise RuntimeError("onnx failure")
+
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = EmbeddingBatcher(broken, executor, max_batch_size=4, max_wait_ms=1)
+            return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
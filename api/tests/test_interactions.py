@@ -0,0 +1,106 @@
+import asyncio
+from api.interactions import InteractionBuffer
+
+class Recorder:
+    def __init__(self, fail_times=0):
+        self.calls = []
+        self.fail_times = fail_times
+
+    async def __call__(self, stars, events):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("db down")
+        self.calls.append((stars, events))
+
+def test_duplicates_coalesce_into_one_write():
+    write = Recorder()
+
+    async def scenario():
+        buffer = InteractionBuffer(write, max_batch_size=100, max_wait_ms=60_000)
+        for _ in range(3):
+            buffer.add("u1", "p1", "click")
+        buffer.add("u1", "p2", "star")
+        buffer.add("u1", "p2", "unstar")
+        buffer.add("u1", "p3", "star")
+        buffer.add("u1", "p2", "star")
+        await buffer.close()
+        return buffer.stats()
+
+    stats = asyncio.run(scenario())
+    assert write.calls == [(
+        # The last event per paper wins, in the order each was last touched
+        [{"user_id": "u1", "paper_id": "p3", "starred": True}, {"user_id": "u1", "paper_id": "p2", "starred": True}],
+        [{"user_id": "u1", "paper_id": "p1", "interaction_type": "click"}],
+    )]
+    assert stats["received"] == 7
+    assert stats["coalesced"] == 4
+    assert stats["written"] == 3
+    assert stats["pending"] == 0
+
+def test_flushes_on_size_and_on_time():
+    write = Recorder()
+
+    async def scenario():
+        buffer = InteractionBuffer(write, max_batch_size=2, max_wait_ms=20)
+        buffer.add("u1", "p1", "click")
+        buffer.add("u1", "p2", "click")
+        await asyncio.sleep(0)
+        sized = len(write.calls)
+        buffer.add("u1", "p3", "ignore")
+        await asyncio.sleep(0.1)
+        return sized, buffer.stats()
+
+    sized, stats = asyncio.run(scenario())
+    assert sized == 1
+    assert [len(events) for _, events in write.calls] == [2, 1]
+    assert stats["max_flush_size"] == 2
+    assert stats["last_flush_lag_ms"] >= 20
+
+def test_failed_flush_is_retried_and_newer_events_win():
+    write = Recorder(fail_times=1)
+
+    async def scenario():
+        buffer = InteractionBuffer(write, max_batch_size=100, max_wait_ms=60_000)
+        buffer.add("u1", "p1", "star")
+        await buffer.flush()
+        buffer.add("u1", "p1", "unstar")
+        await buffer.flush()
+        return buffer.stats()
+
+    stats = asyncio.run(scenario())
+    assert write.calls == [([{"user_id": "u1", "paper_id": "p1", "starred": False}], [])]
+    assert stats["errors"] == 1
+    assert stats["pending"] == 0
+
+def test_full_buffer_rejects_new_keys():
+    async def scenario():
+        buffer = InteractionBuffer(Recorder(), max_batch_size=100, max_wait_ms=60_000, max_pending=1)
+        return buffer.add("u1", "p1", "click"), buffer.add("u1", "p1", "click"), buffer.add("u1", "p2", "click")
+
+    assert asyncio.run(scenario()) == (True, True, False)
+
+def test_bad_row_is_isolated_and_dropped_after_max_attempts(capsys):
+    written = []
+
+    async def write(stars, events):
+        # The database rejects p_bad every time (e.g. an unknown paper id)
+        if any(row["paper_id"] == "p_bad" for row in stars + events):
+            raise RuntimeError("violates foreign key constraint")
+        written.extend(row["paper_id"] for row in stars + events)
+
+    async def scenario():
+        buffer = InteractionBuffer(write, max_batch_size=100, max_wait_ms=60_000, max_attempts=2)
+        for paper in ("p1", "p_bad", "p2", "p3"):
+            buffer.add("u1", paper, "click")
+        await buffer.flush()
+        first = buffer.stats()
+        buffer.add("u1", "p4", "click")
+        await buffer.flush()
+        await buffer.close()
+        return first, buffer.stats()
+
+    first, stats = asyncio.run(scenario())
+    assert sorted(written) == ["p1", "p2", "p3", "p4"]
+    assert first["pending"] == 1 and first["written"] == 3
+    assert stats["dropped"] == 1 and stats["pending"] == 0 and stats["errors"] == 2
+    assert "Dropping interaction ('u1', 'p_bad', 'click') after 2 failed writes" in capsys.readouterr().out
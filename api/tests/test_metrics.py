@@ -0,0 +1,66 @@
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import api.main as main
+from api.metrics import Registry, span, stage_duration, stage_errors
+
+client = TestClient(main.app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Test latency.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(5.0, "a")
+
+    text = registry.render()
+
+    assert 'latency_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{stage="a",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{stage="a"} 3' in text
+
+
+def test_registered_stats_become_gauges():
+    registry = Registry()
+    registry.register_stats("cache", lambda: {"hits": 3, "hit_rate": 0.75, "name": "ignored"})
+
+    text = registry.render()
+
+    assert "cache_hits 3" in text
+    assert "cache_hit_rate 0.75" in text
+    assert "name" not in text
+
+
+def test_span_counts_errors():
+    before = stage_errors.value("test.failing")
+    with pytest.raises(ValueError):
+        with span("test.failing"):
+            raise ValueError("boom")
+
+    assert stage_errors.value("test.failing") == before + 1
+    assert stage_duration.count("test.failing") >= 1
+
+
+@patch('api.main.supabase')
+def test_metrics_endpoint_reports_search_stages(mock_supabase):
+    main.query_cache.clear()
+    mock_response = MagicMock()
+    mock_response.data = []
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_response)
+
+    with patch.object(main.query_cache, "embed_fn", AsyncMock(return_value=[0.1, 0.2])):
+        assert client.get("/api/v1/search?q=metrics").status_code == 200
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'resurch_stage_duration_seconds_count{stage="search.embed"}' in text
+    assert 'resurch_stage_duration_seconds_count{stage="search.retrieve"}' in text
+    # Labelled by route template, not raw URL
+    assert 'resurch_http_requests_total{method="GET",route="/api/v1/search",status="200"}' in text
+    assert "resurch_query_cache_misses" in text
@@ -0,0 +1,39 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from api.model_loader import ModelLoader, ModelNotReady
+
+
+def test_load_runs_warmup_inference():
+    model = MagicMock()
+    model.embed.return_value = iter([np.zeros(2, dtype=np.float32)])
+    with patch("fastembed.TextEmbedding", return_value=model) as text_embedding:
+        loader = ModelLoader("test-model", cache_dir="/models")
+        with pytest.raises(ModelNotReady):
+            loader.get()
+        loader.load()
+
+    text_embedding.assert_called_once_with(model_name="test-model", cache_dir="/models")
+    model.embed.assert_called_once_with(["warmup"], batch_size=1)
+    assert loader.get() is model
+    assert loader.status()["ready"] is True
+
+
+def test_background_load_failure_is_reported():
+    loader = ModelLoader("test-model")
+
+    async def run():
+        with patch("fastembed.TextEmbedding", side_effect=RuntimeError("no network")), \
+             ThreadPoolExecutor(max_workers=1) as executor:
+            await loader.start(executor)
+
+    asyncio.run(run())
+
+    assert not loader.ready
+    assert loader.status()["error"] == "no network"
+    with pytest.raises(ModelNotReady, match="no network"):
+        loader.get()
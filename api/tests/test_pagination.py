@@ -0,0 +1,35 @@
+import pytest
+from api.pagination import CandidateCache, ExpiredCursor, InvalidCursor, decode_cursor
+
+def test_pages_slice_the_cached_list_until_it_runs_out():
+    cache = CandidateCache()
+    rows = list(range(7))
+
+    first, cursor = cache.start(rows, 3)
+    second, cursor = cache.page(cursor, 3)
+    third, cursor = cache.page(cursor, 3)
+
+    assert (first, second, third, cursor) == ([0, 1, 2], [3, 4, 5], [6], None)
+    assert cache.start([1, 2], 3) == ([1, 2], None)
+    assert cache.stats()["lists"] == 1 and cache.stats()["pages"] == 2
+
+def test_expired_evicted_and_foreign_cursors(monkeypatch):
+    cache = CandidateCache(max_size=1, ttl_seconds=10)
+    clock = [100.0]
+    monkeypatch.setattr("api.pagination.time.monotonic", lambda: clock[0])
+
+    _, mine = cache.start([1, 2], 1, owner="u1")
+    with pytest.raises(InvalidCursor):
+        cache.page(mine, 1, owner="u2")
+    clock[0] += 11
+    with pytest.raises(ExpiredCursor):
+        cache.page(mine, 1, owner="u1")
+
+    _, evicted = cache.start([1, 2], 1)
+    cache.start([3, 4], 1)
+    with pytest.raises(ExpiredCursor):
+        cache.page(evicted, 1)
+    assert cache.stats()["evictions"] == 1 and cache.stats()["expirations"] == 1
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor("%%%")
@@ -0,0 +1,96 @@
+import asyncio
+import time
+import pytest
+from api.query_cache import QueryEmbeddingCache, normalize_query
+
+def test_normalize_query():
+    assert normalize_query("  Diffusion   Models ") == "diffusion models"
+
+def test_hits_misses_and_eviction():
+    calls = []
+    async def embed(q):
+        calls.append(q)
+        return [float(len(q))]
+
+    async def scenario():
+        cache = QueryEmbeddingCache(embed, "dummy-model", max_size=2)
+        assert await cache.get("a") == [1.0]
+        assert await cache.get(" A ") == [1.0]  # same normalized key
+        await cache.get("bb")
+        await cache.get("ccc")  # evicts "a", the least recently used entry
+        await cache.get("a")
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert calls == ["a", "bb", "ccc", "a"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 4
+    assert stats["evictions"] == 2
+    assert stats["size"] == 2
+
+def test_ttl_expiry():
+    async def embed(q):
+        return [0.0]
+
+    async def scenario():
+        cache = QueryEmbeddingCache(embed, "dummy-model", ttl_seconds=0.01)
+        await cache.get("q")
+        time.sleep(0.02)
+        await cache.get("q")
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["expirations"] == 1
+    assert stats["misses"] == 2
+
+def test_concurrent_identical_queries_are_coalesced():
+    calls = []
+    async def slow_embed(q):
+        calls.append(q)
+        await asyncio.sleep(0.05)
+        return [1.0]
+
+    async def scenario():
+        cache = QueryEmbeddingCache(slow_embed, "dummy-model")
+        results = await asyncio.gather(*(cache.get("same query") for _ in range(5)))
+        return results, cache.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert calls == ["same query"]
+    assert results == [[1.0]] * 5
+    assert stats["coalesced"] == 4
+
+def test_errors_are_not_cached():
+    attempts = []
+    async def flaky(q):
+        attempts.append(q)
+        if len(attempts) == 1:
+            raise RuntimeError("model failed")
+        return [2.0]
+
+    async def scenario():
+        cache = QueryEmbeddingCache(flaky, "dummy-model")
+        with pytest.raises(RuntimeError):
+            await cache.get("q")
+        return await cache.get("q")
+
+    assert asyncio.run(scenario()) == [2.0]
+
+def test_get_many_embeds_misses_in_one_call():
+    batches = []
+    async def embed_many(texts):
+        batches.append(texts)
+        return [[float(len(t))] for t in texts]
+
+    async def scenario():
+        cache = QueryEmbeddingCache(None, "dummy-model", embed_many_fn=embed_many)
+        await cache.get_many(["a"])
+        vectors = await cache.get_many(["bb", "A", "ccc", "BB"])
+        return vectors, cache.stats()
+
+    vectors, stats = asyncio.run(scenario())
+    assert vectors == [[2.0], [1.0], [3.0], [2.0]]
+    # "a" came from the cache; the repeated "BB" was embedded once
+    assert batches == [["a"], ["bb", "ccc"]]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
@@ -0,0 +1,95 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+import numpy as np
+from api.retrieval import LocalBackend
+from src.export_snapshot import export_snapshot
+from src.paper_store import PaperStore
+
+PAPERS = [
+    {"id": "near", "title": "Near", "abstract": "a long abstract", "pdf_url": "http://near", "categories": ["cs.AI"], "published": "2024-03-01T00:00:00"},
+    {"id": "mid", "title": "Mid", "abstract": "mid", "pdf_url": "http://mid", "categories": ["cs.LG"], "published": "2024-01-01T00:00:00"},
+    {"id": "far", "title": "Far", "abstract": "far", "pdf_url": "http://far", "categories": ["cs.AI"], "published": "2023-01-01T00:00:00"},
+]
+
+def publish(tmp_path, papers, embeddings):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir(exist_ok=True)
+    with PaperStore(str(data_dir / "papers.db")) as store:
+        store.upsert(papers)
+    with open(data_dir / "id_mapping.json", "w") as f:
+        json.dump([p["id"] for p in papers], f)
+    np.save(data_dir / "embeddings.npy", np.asarray(embeddings, dtype=np.float32))
+    return export_snapshot(str(data_dir / "papers.db"), str(data_dir), root=str(tmp_path / "snapshots"))
+
+def make_backend(tmp_path, **kwargs):
+    publish(tmp_path, PAPERS, [[1.0, 0.0], [1.0, 1.0], [0.2, 1.0]])
+    backend = LocalBackend(str(tmp_path / "snapshots"), **kwargs)
+    assert backend.refresh()
+    return backend
+
+def test_local_backend_ranks_by_cosine_with_filters(tmp_path):
+    backend = make_backend(tmp_path)
+
+    async def scenario():
+        everything = await backend.match([2.0, 0.0], 10)
+        filtered = await backend.match([2.0, 0.0], 10, categories=["cs.AI"], published_after=datetime(2023, 6, 1))
+        projected = await backend.match([2.0, 0.0], 1, fields=["id", "abstract"], abstract_chars=6, exclude_ids=["mid"])
+        return everything, filtered, projected
+
+    everything, filtered, projected = asyncio.run(scenario())
+    assert [p["id"] for p in everything] == ["near", "mid", "far"]
+    assert everything[0] == {"id": "near", "title": "Near", "abstract": "a long abstract", "url": "http://near", "similarity": 1.0}
+    assert abs(everything[1]["similarity"] - 2 ** -0.5) < 1e-6
+    assert [p["id"] for p in filtered] == ["near"]
+    assert projected == [{"id": "near", "abstract": "a long"}]
+
+def test_local_backend_excludes_starred_papers(tmp_path):
+    async def starred(user_id):
+        return ["near"] if user_id == "u1" else []
+    backend = make_backend(tmp_path, starred_fn=starred)
+
+    rows = asyncio.run(backend.match([1.0, 0.0], 1, exclude_starred_by="u1"))
+    assert [p["id"] for p in rows] == ["mid"]
+
+def test_new_snapshot_is_swapped_in(tmp_path):
+    backend = make_backend(tmp_path)
+    old = backend.snapshot
+    assert not backend.refresh()
+
+    publish(tmp_path, PAPERS + [{"id": "new", "title": "New", "pdf_url": None}], [[1.0, 0.0], [1.0, 1.0], [0.2, 1.0], [0.0, 1.0]])
+    assert backend.refresh()
+
+    assert backend.snapshot is not old
+    assert backend.status()["papers"] == 4 and backend.status()["swaps"] == 2
+    assert asyncio.run(backend.match([0.0, 1.0], 1))[0]["id"] == "new"
+    # A request that grabbed the old snapshot can still finish on it
+    assert [p["id"] for p in old.rows(old.match([0.0, 1.0], 1))] == ["far"]
+
+def test_date_window_scans_only_matching_month_shards(tmp_path):
+    backend = make_backend(tmp_path)
+    snapshot = backend.snapshot
+    # Rows are stored oldest first, one shard per month
+    assert [shard.month for shard in snapshot.shards.shards] == ["2023-01", "2024-01", "2024-03"]
+    assert backend.status()["shards"] == 3
+
+    window = snapshot.shards.select(datetime(2024, 2, 15, tzinfo=timezone.utc).timestamp())
+    assert [shard.month for shard in window] == ["2024-03"]
+    rows = asyncio.run(backend.match([1.0, 1.0], 10, published_after=datetime(2023, 12, 15), published_before=datetime(2024, 2, 1)))
+    assert [p["id"] for p in rows] == ["mid"]
+
+def test_start_loads_the_snapshot_in_the_background(tmp_path):
+    publish(tmp_path, PAPERS, [[1.0, 0.0], [1.0, 1.0], [0.2, 1.0]])
+    backend = LocalBackend(str(tmp_path / "snapshots"), poll_seconds=60)
+
+    async def scenario():
+        await backend.start()
+        ready_at_start = backend.ready
+        for _ in range(100):
+            if backend.ready:
+                break
+            await asyncio.sleep(0.01)
+        await backend.close()
+        return ready_at_start, backend.ready
+
+    assert asyncio.run(scenario()) == (False, True)
@@ -0,0 +1 @@
+"""Offline benchmarks for the ingest, embed, index and search stages."""
@@ -0,0 +1,193 @@
+"""
+Offline benchmark runner.
+
+    python -m benchmarks.run --scale 1k --output bench/1k.json
+    python -m benchmarks.run --scale 100k --compare bench/100k-baseline.json
+
+Everything runs against a synthetic corpus in a temporary directory with the
+arXiv client and embedding models stubbed out, so no network is needed. The
+embed timings therefore measure the pipeline around the model (store
+streaming, hashing, saving), not ONNX inference itself.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+from benchmarks.synthetic import SCALES, FakeResult, StubEmbedding, generate_papers, random_embeddings
+
+# Metrics where larger is worse; used when comparing two result files
+LOWER_IS_BETTER = ("seconds", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def percentiles(samples_ms):
+    values = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def bench_ingest(data_dir, n, batch=1000):
+    """Merge/dedupe path: half of each fetched batch is already in the store."""
+    from src.ingest_arxiv import ingest_arxiv_papers
+    from src.paper_store import PaperStore
+
+    store_path = os.path.join(data_dir, "papers.db")
+    with PaperStore(store_path) as store:
+        store.upsert(generate_papers(n // 2))
+
+    fetched = [FakeResult(p) for p in generate_papers(n - n // 4, start=n // 4)]
+    start = time.perf_counter()
+    with patch("src.ingest_arxiv.arxiv.Client") as client:
+        client.return_value.results.return_value = fetched
+        ingest_arxiv_papers(categories=["cs.AI"], max_results=len(fetched), store_path=store_path, delay_seconds=0)
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 3), "papers_per_sec": round(len(fetched) / elapsed, 1)}
+
+
+def bench_embed(data_dir, n, dim):
+    from src.embed_papers import generate_embeddings
+
+    start = time.perf_counter()
+    with patch("fastembed.TextEmbedding", lambda *args, **kwargs: StubEmbedding(dim=dim)):
+        generate_embeddings(store_path=os.path.join(data_dir, "papers.db"), output_dir=data_dir, model_name="stub")
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 3), "papers_per_sec": round(n / elapsed, 1)}
+
+
+def bench_index(data_dir, n, dim, index_types):
+    from src.search import build_index
+
+    # Replace the stub vectors with well-spread random ones for realistic index shapes
+    np.save(os.path.join(data_dir, "embeddings.npy"), random_embeddings(n, dim))
+    results = {}
+    for index_type in index_types:
+        start = time.perf_counter()
+        build_index(data_dir, index_type=index_type)
+        results[index_type] = {
+            "seconds": round(time.perf_counter() - start, 3),
+            "index_mb": round(os.path.getsize(os.path.join(data_dir, "index.faiss")) / 1e6, 1),
+        }
+    return results
+
+
+def bench_search(data_dir, dim, index_type, queries, top_k=10):
+    import src.search as search
+
+    search.clear_cache()
+    search.build_index(data_dir, index_type=index_type)
+    with patch("src.search.SentenceTransformer", lambda *args, **kwargs: StubEmbedding(dim=dim)), \
+         patch("builtins.print"):
+        start = time.perf_counter()
+        searcher = search.get_searcher(data_dir, "stub")
+        searcher.search("warmup", top_k)
+        startup = time.perf_counter() - start
+
+        samples = []
+        for i in range(queries):
+            t0 = time.perf_counter()
+            searcher.search(f"synthetic query {i}", top_k)
+            samples.append((time.perf_counter() - t0) * 1000)
+    search.clear_cache()
+    return {"startup_seconds": round(startup, 3), "queries": queries, **percentiles(samples)}
+
+
+def run(scale="1k", n=None, dim=384, queries=200, index_types=("flat", "ivf", "hnsw"), work_dir=None):
+    n = n or SCALES[scale]
+    results = {
+        "scale": scale,
+        "papers": n,
+        "dimension": dim,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "stages": {},
+    }
+    with tempfile.TemporaryDirectory(dir=work_dir) as data_dir:
+        # Pipeline output is noisy at scale; keep the benchmark report readable
+        with patch("builtins.print"):
+            results["stages"]["ingest"] = bench_ingest(data_dir, n)
+            results["stages"]["embed"] = bench_embed(data_dir, n, dim)
+            results["stages"]["index_build"] = bench_index(data_dir, n, dim, index_types)
+        for index_type in index_types:
+            results["stages"][f"search_{index_type}"] = bench_search(data_dir, dim, index_type, queries)
+    # ru_maxrss only ever grows, so a per-stage reading would just repeat the
+    # largest earlier stage; report the one peak for the whole run instead
+    results["process_peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return results
+
+
+def _flatten(stages, prefix=""):
+    for name, value in stages.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{name}.")
+        else:
+            yield f"{prefix}{name}", value
+
+
+def _metrics(results):
+    """Per-stage metrics plus the run-wide memory peak."""
+    metrics = dict(results.get("stages", {}))
+    if "process_peak_rss_mb" in results:
+        metrics["process_peak_rss_mb"] = results["process_peak_rss_mb"]
+    return metrics
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Returns a list of regressions: metrics where current is worse than the
+    baseline by more than `threshold` (relative).
+    """
+    old = dict(_flatten(_metrics(baseline)))
+    regressions = []
+    for metric, value in _flatten(_metrics(current)):
+        if not metric.endswith(LOWER_IS_BETTER) or metric not in old or not old[metric]:
+            continue
+        change = (value - old[metric]) / old[metric]
+        if change > threshold:
+            regressions.append({"metric": metric, "baseline": old[metric], "current": value, "change": round(change, 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingest/embed/index/search stages on synthetic data.")
+    parser.add_argument("--scale", choices=SCALES, default="1k", help="Corpus size")
+    parser.add_argument("--papers", type=int, default=None, help="Override the number of papers")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per search benchmark")
+    parser.add_argument("--index-types", default="flat,ivf,hnsw", help="Comma-separated index types")
+    parser.add_argument("--output", type=str, default=None, help="Write results JSON here")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    results = run(args.scale, n=args.papers, dim=args.dim, queries=args.queries, index_types=tuple(args.index_types.split(",")))
+    print(json.dumps(results, indent=4))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['metric']}: {r['baseline']} -> {r['current']} (+{r['change']:.0%})")
+        if regressions:
+            exit(1)
@@ -0,0 +1,97 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+CATEGORIES = ["cs.AI", "cs.LG", "cs.CV", "cs.CL", "cs.RO", "stat.ML"]
+
+_VOCABULARY = None
+
+
+def _vocabulary(size=5000, seed=0):
+    global _VOCABULARY
+    if _VOCABULARY is None:
+        rng = np.random.default_rng(seed)
+        letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+        _VOCABULARY = ["".join(rng.choice(letters, rng.integers(3, 11))) for _ in range(size)]
+    return _VOCABULARY
+
+
+def paper_id(i):
+    return f"http://arxiv.org/abs/{2400 + i // 100000}.{i % 100000:05d}v1"
+
+
+def generate_papers(n, seed=0, start=0):
+    """
+    Yields n fake arXiv records shaped like ingest_arxiv's output. Abstract
+    lengths vary (40-250 words) like real ones, which matters for embedding.
+    """
+    rng = np.random.default_rng(seed + start)
+    words = _vocabulary()
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(start, start + n):
+        title = " ".join(words[j] for j in rng.integers(0, len(words), rng.integers(5, 15)))
+        abstract = " ".join(words[j] for j in rng.integers(0, len(words), rng.integers(40, 250)))
+        published = (base + timedelta(minutes=int(i) * 7)).isoformat()
+        yield {
+            "id": paper_id(i),
+            "title": title,
+            "abstract": abstract,
+            "authors": [f"Author {j}" for j in rng.integers(0, 50000, rng.integers(1, 6))],
+            "published": published,
+            "updated": published,
+            "categories": list(rng.choice(CATEGORIES, rng.integers(1, 3), replace=False)),
+            "pdf_url": paper_id(i).replace("/abs/", "/pdf/"),
+            "entry_id": paper_id(i),
+        }
+
+
+def random_embeddings(n, dim=384, seed=0):
+    """Normalized random vectors, in the same float32 layout the embed stage writes."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+class FakeAuthor:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeResult:
+    """Minimal stand-in for arxiv.Result built from a synthetic paper."""
+
+    def __init__(self, paper):
+        self.entry_id = paper["id"]
+        self.title = paper["title"]
+        self.summary = paper["abstract"]
+        self.authors = [FakeAuthor(a) for a in paper["authors"]]
+        self.published = datetime.fromisoformat(paper["published"])
+        self.updated = datetime.fromisoformat(paper["updated"])
+        self.categories = paper["categories"]
+        self.pdf_url = paper["pdf_url"]
+
+
+class StubEmbedding:
+    """
+    Network-free replacement for both fastembed.TextEmbedding and
+    sentence_transformers.SentenceTransformer: each text maps to a fixed
+    pseudo-random unit vector derived from its hash.
+    """
+
+    def __init__(self, *args, dim=384, **kwargs):
+        self.dim = dim
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def embed(self, texts, batch_size=32, **kwargs):
+        for text in texts:
+            yield self._vector(text)
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        return np.stack([self._vector(t) for t in texts])
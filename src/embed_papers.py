@@ -1,58 +1,286 @@
+import hashlib
 import json
+import multiprocessing
 import os
+import time
 import numpy as np
 
 from tqdm import tqdm
 
+from src.paper_store import DEFAULT_STORE_PATH, open_store
+from src.vector_store import FORMATS, META_FILE, write_vectors
+
+MANIFEST_FILE = "embedding_manifest.json"
+
+
+def paper_text(paper):
+    """Text that gets embedded for a paper: Title + Abstract."""
+    return f"{paper.get('title', '')} [SEP] {paper.get('abstract', '')}"
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _load_existing(output_dir, model_name):
+    """
+    Loads the previous embedding store (vectors, id mapping, content hashes).
+    Returns empty state if any part is missing, inconsistent, or was produced
+    by a different model, which forces a full re-embed.
+    """
+    embeddings_file = os.path.join(output_dir, "embeddings.npy")
+    mapping_file = os.path.join(output_dir, "id_mapping.json")
+    manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+    if not all(os.path.exists(p) for p in (embeddings_file, mapping_file, manifest_file)):
+        return None, [], {}
+
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(mapping_file, "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        embeddings = np.load(embeddings_file)
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"Warning: existing embedding store is unreadable ({e}). Re-embedding everything.")
+        return None, [], {}
+
+    if manifest.get("model_name") != model_name:
+        print(f"Model changed ({manifest.get('model_name')} -> {model_name}). Re-embedding everything.")
+        return None, [], {}
+    if len(ids) != len(embeddings):
+        print("Warning: id mapping and embeddings are out of sync. Re-embedding everything.")
+        return None, [], {}
+
+    return embeddings, ids, manifest.get("hashes", {})
+
+
+def _stored_format(output_dir):
+    meta_file = os.path.join(output_dir, META_FILE)
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file, "r", encoding="utf-8") as f:
+        return json.load(f).get("format")
+
+
+def save_embedding_store(output_dir, embeddings, ids, hashes, model_name, storage_format="float16"):
+    """
+    Writes embeddings.npy, id_mapping.json and, unless `storage_format` is
+    None, the compact copy for memory-mapped readers. The content-hash
+    manifest goes last, so an interrupted save is redone on the next run.
+    Returns the embeddings and mapping file paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    embeddings_file = os.path.join(output_dir, "embeddings.npy")
+    np.save(embeddings_file, embeddings)
+
+    mapping_file = os.path.join(output_dir, "id_mapping.json")
+    with open(mapping_file, "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+
+    # Compact, memory-mappable copy for readers (search, API snapshots)
+    if storage_format:
+        write_vectors(embeddings, ids, output_dir, fmt=storage_format)
+
+    manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump({"model_name": model_name, "hashes": hashes}, f)
+    return embeddings_file, mapping_file
+
+
 def generate_embeddings(
-    input_file="data/papers.json",
+    store_path=DEFAULT_STORE_PATH,
     output_dir="data",
     model_name="sentence-transformers/all-MiniLM-L6-v2", # Starting small for PoC
-    batch_size=32
+    batch_size=32,
+    storage_format="float16"
 ):
     """
-    Generates embeddings for papers in the input JSON file.
+    Generates embeddings for papers in the paper store.
+
+    Only papers that are new, or whose title/abstract changed since the last
+    run, are embedded; their rows are patched into or appended to the existing
+    embeddings.npy / id_mapping.json. A compact copy in `storage_format`
+    (see src/vector_store.py) is written alongside for memory-mapped readers.
     """
-    if not os.path.exists(input_file):
-        print(f"Error: {input_file} not found. Run ingestion first.")
-        return
+    embeddings, ids, hashes = _load_existing(output_dir, model_name)
+    row_of = {pid: row for row, pid in enumerate(ids)}
 
-    print(f"Loading papers from {input_file}...")
-    with open(input_file, "r", encoding="utf-8") as f:
-        papers = json.load(f)
+    # Stream the store and work out which papers need (re-)embedding
+    print(f"Scanning papers in {store_path}...")
+    total = 0
+    pending_ids, pending_texts, pending_hashes = [], [], []
+    with open_store(store_path) as store:
+        for p in store.iter_papers():
+            total += 1
+            pid = p.get('id')
+            text = paper_text(p)
+            digest = content_hash(text)
+            if pid in row_of and hashes.get(pid) == digest:
+                continue
+            pending_ids.append(pid)
+            pending_texts.append(text)
+            pending_hashes.append(digest)
 
-    if not papers:
-        print("No papers found.")
+    if not total:
+        print("No papers found. Run ingestion first.")
         return
 
-    # Prepare texts: Title + Abstract
-    texts = [f"{p.get('title', '')} [SEP] {p.get('abstract', '')}" for p in papers]
-    ids = [p.get('id') for p in papers]
+    print(f"{len(pending_ids)} of {total} papers are new or changed.")
+    if not pending_ids:
+        print("Embeddings are up to date.")
+        if embeddings is not None and _stored_format(output_dir) != storage_format:
+            write_vectors(embeddings, ids, output_dir, fmt=storage_format)
+        return
 
     print(f"Loading FastEmbed model: {model_name}...")
     # FastEmbed uses list of strings generator
     from fastembed import TextEmbedding
-    
+
     # We force the same model as backend
-    model = TextEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    model = TextEmbedding(model_name=model_name)
 
-    print(f"Generating embeddings for {len(texts)} papers...")
+    print(f"Generating embeddings for {len(pending_texts)} papers...")
     # model.embed returns a generator, convert to list then numpy
-    embeddings_list = list(model.embed(texts, batch_size=batch_size))
-    embeddings = np.array(embeddings_list)
+    embeddings_list = list(tqdm(model.embed(pending_texts, batch_size=batch_size), total=len(pending_texts)))
+    new_embeddings = np.array(embeddings_list, dtype=np.float32)
 
-    # Save embeddings
-    os.makedirs(output_dir, exist_ok=True)
-    embeddings_file = os.path.join(output_dir, "embeddings.npy")
-    np.save(embeddings_file, embeddings)
-    
-    # Save ID mapping
-    mapping_file = os.path.join(output_dir, "id_mapping.json")
-    with open(mapping_file, "w", encoding="utf-8") as f:
-        json.dump(ids, f, indent=4)
+    # Patch changed rows in place, append rows for unseen ids
+    appended = []
+    if embeddings is None:
+        embeddings = np.empty((0, new_embeddings.shape[1]), dtype=np.float32)
+    for pid, vector, digest in zip(pending_ids, new_embeddings, pending_hashes):
+        if pid in row_of:
+            embeddings[row_of[pid]] = vector
+        else:
+            row_of[pid] = len(ids)
+            ids.append(pid)
+            appended.append(vector)
+        hashes[pid] = digest
+    if appended:
+        embeddings = np.concatenate([embeddings, np.array(appended, dtype=np.float32)])
+
+    embeddings_file, mapping_file = save_embedding_store(output_dir, embeddings, ids, hashes, model_name, storage_format)
 
+    print(f"Embedded {len(pending_ids)} papers ({len(appended)} new, {len(pending_ids) - len(appended)} updated).")
     print(f"Saved embeddings to {embeddings_file} shape: {embeddings.shape}")
     print(f"Saved ID mapping to {mapping_file}")
 
+# Per-process model for backfill workers, loaded once by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_name, threads):
+    global _worker_model
+    from fastembed import TextEmbedding
+    _worker_model = TextEmbedding(model_name=model_name, threads=threads)
+
+
+def _embed_batch(texts):
+    return np.array(list(_worker_model.embed(texts, batch_size=len(texts))), dtype=np.float32)
+
+
+def _length_sorted_batches(texts, batch_size):
+    """
+    Orders a chunk of texts by length and cuts it into batches, so each batch
+    holds texts of similar token counts and pads as little as possible.
+    Yields (positions in the chunk, texts) per batch.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i].split()))
+    for start in range(0, len(order), batch_size):
+        positions = order[start:start + batch_size]
+        yield positions, [texts[i] for i in positions]
+
+
+def backfill_embeddings(
+    store_path=DEFAULT_STORE_PATH,
+    output_dir="data",
+    model_name="sentence-transformers/all-MiniLM-L6-v2",
+    batch_size=64,
+    workers=None,
+    chunk_size=8192,
+    storage_format="float16"
+):
+    """
+    Re-embeds the whole store, e.g. after a model change.
+
+    Texts are streamed from the store chunk by chunk, sorted by length within
+    each chunk, and embedded by a pool of worker processes (one ONNX session
+    each). Vectors are written straight into a preallocated memory-mapped
+    embeddings.npy, so memory stays bounded by one chunk.
+    """
+    workers = workers or os.cpu_count() or 1
+    with open_store(store_path) as store:
+        count = len(store)
+        if not count:
+            print("No papers found. Run ingestion first.")
+            return
+
+        # Split the machine's cores between the worker sessions
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        if workers > 1:
+            pool = multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(model_name, threads))
+            embed_many = lambda batches: pool.imap(_embed_batch, batches)
+        else:
+            pool = None
+            _init_worker(model_name, threads)
+            embed_many = lambda batches: map(_embed_batch, batches)
+
+        os.makedirs(output_dir, exist_ok=True)
+        embeddings_file = os.path.join(output_dir, "embeddings.npy")
+        tmp_file = embeddings_file + ".tmp.npy"
+        output = None
+        ids, hashes = [], {}
+        start = time.perf_counter()
+        print(f"Backfilling {count} papers with {workers} worker(s)...")
+        try:
+            with tqdm(total=count, unit="paper") as progress:
+                papers = store.iter_papers()
+                while True:
+                    # Never read past the row count the output was sized for
+                    chunk = [p for _, p in zip(range(min(chunk_size, count - len(ids))), papers)]
+                    if not chunk:
+                        break
+                    texts = [paper_text(p) for p in chunk]
+                    batches = list(_length_sorted_batches(texts, batch_size))
+                    base = len(ids)
+                    for (positions, _), vectors in zip(batches, embed_many([b for _, b in batches])):
+                        if output is None:
+                            # Preallocate once the embedding dimension is known
+                            output = np.lib.format.open_memmap(tmp_file, mode="w+", dtype=np.float32, shape=(count, vectors.shape[1]))
+                        output[[base + i for i in positions]] = vectors
+                        progress.update(len(positions))
+                    for p, text in zip(chunk, texts):
+                        ids.append(p["id"])
+                        hashes[p["id"]] = content_hash(text)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    elapsed = time.perf_counter() - start
+    output.flush()
+    del output
+    os.replace(tmp_file, embeddings_file)
+
+    with open(os.path.join(output_dir, "id_mapping.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({"model_name": model_name, "hashes": hashes}, f)
+    write_vectors(np.load(embeddings_file, mmap_mode="r"), ids, output_dir, fmt=storage_format)
+
+    print(f"Backfilled {len(ids)} papers in {elapsed:.1f}s ({len(ids) / elapsed:.1f} papers/sec)")
+    return {"papers": len(ids), "seconds": elapsed, "papers_per_sec": len(ids) / elapsed}
+
 if __name__ == "__main__":
-    generate_embeddings()
+    import argparse
+    parser = argparse.ArgumentParser(description="Embed new and changed papers.")
+    parser.add_argument("--format", choices=FORMATS, default="float16", help="Compact storage format for readers")
+    parser.add_argument("--backfill", action="store_true", help="Re-embed the whole store with a worker pool")
+    parser.add_argument("--workers", type=int, default=None, help="Backfill worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Texts per model call")
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill_embeddings(workers=args.workers, batch_size=args.batch_size or 64, storage_format=args.format)
+    else:
+        generate_embeddings(batch_size=args.batch_size or 32, storage_format=args.format)
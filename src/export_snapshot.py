@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from src.migrate_to_supabase import _load_row_index
+from src.paper_store import DEFAULT_STORE_PATH, open_store
+from src.time_shards import date_order, month_ranges, published_timestamp
+from src.vector_store import CHUNK_ROWS, write_id_table
+
+# Read-only search snapshots for the API's local retrieval backend
+# (api/retrieval.py). Each snapshot is a directory under SNAPSHOT_ROOT;
+# CURRENT names the one to serve and is swapped atomically. Rows are sorted
+# by publication date, so each month's papers form one contiguous slice
+# (see src/time_shards.py).
+SNAPSHOT_ROOT = os.path.join("data", "snapshots")
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_META = "snapshot.json"
+
+
+def current_version(root=SNAPSHOT_ROOT):
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_snapshot(path, store, embeddings, ids):
+    count, dim = embeddings.shape
+    dates = store.published_dates(ids)
+    order = date_order([published_timestamp(dates.get(pid)) for pid in ids])
+    if order is not None:
+        ids = [ids[row] for row in order]
+    # Unit rows, so the API scores cosine similarity with one matrix-vector product
+    vectors = np.lib.format.open_memmap(os.path.join(path, "vectors.npy"), mode="w+", dtype=np.float32, shape=(count, dim))
+    for start in range(0, count, CHUNK_ROWS):
+        if order is None:
+            chunk = np.asarray(embeddings[start:start + CHUNK_ROWS], dtype=np.float32)
+        else:
+            # Read the memory map in file order, then arrange the rows by date
+            wanted = order[start:start + CHUNK_ROWS]
+            rows = np.sort(wanted)
+            chunk = np.asarray(embeddings[rows], dtype=np.float32)[np.searchsorted(rows, wanted)]
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors[start:start + len(chunk)] = chunk / norms
+    vectors.flush()
+    del vectors
+    write_id_table(ids, path)
+
+    published = np.full(count, np.nan, dtype=np.float64)
+    vocabulary = {}
+    memberships = []
+    conn = sqlite3.connect(os.path.join(path, "metadata.db"))
+    conn.execute("CREATE TABLE papers (row INTEGER PRIMARY KEY, title TEXT, abstract TEXT, url TEXT)")
+    for start in range(0, count, CHUNK_ROWS):
+        chunk = ids[start:start + CHUNK_ROWS]
+        papers = store.get_many(chunk)
+        rows = []
+        for offset, pid in enumerate(chunk):
+            row = start + offset
+            paper = papers.get(pid, {})
+            published[row] = published_timestamp(paper.get("published"))
+            for category in paper.get("categories") or ():
+                memberships.append((row, vocabulary.setdefault(category, len(vocabulary))))
+            rows.append((row, paper.get("title"), paper.get("abstract"), paper.get("pdf_url")))
+        conn.executemany("INSERT INTO papers VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    np.save(os.path.join(path, "published.npy"), published)
+
+    # One bit per (paper, category), packed eight categories to a byte
+    categories = np.zeros((count, max(1, len(vocabulary))), dtype=bool)
+    if memberships:
+        rows, columns = np.array(memberships).T
+        categories[rows, columns] = True
+    np.save(os.path.join(path, "categories.npy"), np.packbits(categories, axis=1))
+    months = [month for month, _, _ in month_ranges(published)]
+    return {"count": count, "dimension": dim, "categories": list(vocabulary), "months": months}
+
+
+def export_snapshot(store_path=DEFAULT_STORE_PATH, data_dir="data", root=SNAPSHOT_ROOT, keep=3):
+    """
+    Writes a new snapshot of the embedded papers and makes it current.
+
+    The snapshot is built in a temporary directory, renamed into place and
+    then published by atomically replacing CURRENT, so a reader sees either
+    the old snapshot or the complete new one. Older snapshots beyond `keep`
+    are removed; an API process still holding one keeps its open files.
+    """
+    embeddings_file = os.path.join(data_dir, "embeddings.npy")
+    if not os.path.exists(embeddings_file):
+        print("Error: Local data not found.")
+        return None
+
+    start = time.perf_counter()
+    embeddings = np.load(embeddings_file, mmap_mode="r")
+    row_of = _load_row_index(data_dir)
+    if len(row_of) != len(embeddings):
+        # A snapshot must never ship vectors without ids (or ids pointing past the vectors)
+        print(f"Error: {len(row_of)} ids for {len(embeddings)} embeddings in {data_dir}; re-run the embedding step.")
+        return None
+    ids = sorted(row_of, key=row_of.get)
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    os.makedirs(root, exist_ok=True)
+    tmp_path = os.path.join(root, f".{version}.tmp")
+    os.makedirs(tmp_path)
+    try:
+        with open_store(store_path) as store:
+            meta = _write_snapshot(tmp_path, store, embeddings, ids)
+        meta.update({"version": version, "created_at": datetime.now(timezone.utc).isoformat()})
+        with open(os.path.join(tmp_path, SNAPSHOT_META), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.rename(tmp_path, os.path.join(root, version))
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    pointer_tmp = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+
+    versions = sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)) and not name.startswith("."))
+    for old in versions[:-keep] if keep else []:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+    print(f"Exported snapshot {version} ({meta['count']} papers) in {time.perf_counter() - start:.1f}s")
+    return meta
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export a search snapshot for the API's local retrieval backend.")
+    parser.add_argument("--root", default=SNAPSHOT_ROOT, help="Snapshot directory")
+    parser.add_argument("--keep", type=int, default=3, help="Snapshots to keep")
+    args = parser.parse_args()
+    export_snapshot(root=args.root, keep=args.keep)
@@ -1,68 +1,160 @@
+import queue
+import threading
+import time
+
 import arxiv
-import json
-import os
-from datetime import datetime, timezone
 
-def ingest_arxiv_papers(query="cat:cs.AI OR cat:cs.LG OR cat:cs.CV", max_results=100):
+from src.paper_store import DEFAULT_STORE_PATH, open_store
+
+DEFAULT_CATEGORIES = ("cs.AI", "cs.LG", "cs.CV")
+# arXiv asks API clients for at most one request every 3 seconds
+ARXIV_DELAY_SECONDS = 3.0
+# Backfill size for a category harvested for the first time. Later runs page
+# all the way down to the watermark, so no paper between two runs is skipped.
+MAX_RESULTS_PER_CATEGORY = 2000
+
+
+def paper_from_result(result):
+    return {
+        "id": result.entry_id,
+        "title": result.title,
+        "abstract": result.summary,
+        "authors": [author.name for author in result.authors],
+        "published": result.published.isoformat(),
+        "updated": result.updated.isoformat(),
+        "categories": result.categories,
+        "pdf_url": result.pdf_url,
+        "entry_id": result.entry_id
+    }
+
+
+def harvest_category(client, category, watermark=None, max_results=MAX_RESULTS_PER_CATEGORY, page_size=100):
     """
-    Fetches papers from arXiv based on the query and saves them to a JSON file.
+    Yields lists of papers in `category`, newest first, one list per page.
+
+    Stops at the watermark (last_published, last_id) from the previous run:
+    results come sorted by submission date, so everything past it is known
+    and the remaining pages are never requested. `max_results` only caps the
+    first harvest of a category; with a watermark, stopping early would let
+    the next run's watermark jump over the papers in between.
     """
-    print(f"Fetching {max_results} papers for query: {query}...")
-    
-    # Construct the default client
-    client = arxiv.Client()
-    
     search = arxiv.Search(
-        query=query,
-        max_results=max_results,
+        query=f"cat:{category}",
+        max_results=max_results if watermark is None else None,
         sort_by=arxiv.SortCriterion.SubmittedDate,
         sort_order=arxiv.SortOrder.Descending
     )
-
-    papers = []
-    # Use the client to iterate over results
+    last_published, last_id = watermark or ("", None)
+    page = []
     for result in client.results(search):
-        paper_data = {
-            "id": result.entry_id,
-            "title": result.title,
-            "abstract": result.summary,
-            "authors": [author.name for author in result.authors],
-            "published": result.published.isoformat(),
-            "updated": result.updated.isoformat(),
-            "categories": result.categories,
-            "pdf_url": result.pdf_url,
-            "entry_id": result.entry_id
-        }
-        papers.append(paper_data)
-
-    output_dir = "data"
-    os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, "papers.json")
-
-    # Load existing papers if file exists to append/update
-    existing_papers = []
-    if os.path.exists(output_file):
-        try:
-            with open(output_file, "r", encoding="utf-8") as f:
-                existing_papers = json.load(f)
-        except json.JSONDecodeError:
-            print(f"Warning: {output_file} is corrupted or empty. Overwriting.")
-            existing_papers = []
-
-    # Create a dict of existing papers for easy lookup/deduplication
-    existing_dict = {p["id"]: p for p in existing_papers}
-            
-    # Update/Add new papers
-    for p in papers:
-        existing_dict[p["id"]] = p
-        
-    final_papers = list(existing_dict.values())
-    print(f"Total papers: {len(final_papers)} (New: {len(final_papers) - len(existing_papers)})")
-    
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(final_papers, f, indent=4, ensure_ascii=False)
-
-    print(f"Saved papers to {output_file}")
+        paper = paper_from_result(result)
+        if paper["id"] == last_id or paper["published"] < last_published:
+            break
+        page.append(paper)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def harvest(categories, watermarks=None, max_results=MAX_RESULTS_PER_CATEGORY, max_workers=None,
+            delay_seconds=ARXIV_DELAY_SECONDS, page_size=100):
+    """
+    Fetches categories concurrently and yields (category, page, outcome).
+
+    Each category yields its pages (outcome None), then one final item with
+    page None and outcome set to the newest paper fetched (the category's
+    new watermark; None if nothing was new) or the exception that stopped it.
+    Categories run on worker threads, one arXiv client each; each client
+    waits `delay_seconds * workers` between its own requests, so the
+    combined request rate stays within arXiv's limit while the workers'
+    response times overlap. The page queue is bounded, so fetchers wait for
+    the consumer instead of piling pages up in memory.
+    """
+    categories = list(dict.fromkeys(categories))
+    if not categories:
+        return
+    watermarks = watermarks or {}
+    workers = max(1, min(max_workers or len(categories), len(categories)))
+    pages = queue.Queue(maxsize=workers * 2)
+    pending = queue.Queue()
+    for category in categories:
+        pending.put(category)
+
+    def worker():
+        client = arxiv.Client(page_size=page_size, delay_seconds=delay_seconds * workers)
+        while True:
+            try:
+                category = pending.get_nowait()
+            except queue.Empty:
+                return
+            newest = None
+            try:
+                for page in harvest_category(client, category, watermarks.get(category), max_results, page_size):
+                    newest = newest or page[0]
+                    pages.put((category, page, None))
+                pages.put((category, None, newest))
+            except Exception as e:
+                print(f"Fetching {category} failed: {e}")
+                pages.put((category, None, e))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    remaining = len(categories)
+    while remaining:
+        item = pages.get()
+        if item[1] is None:
+            remaining -= 1
+        yield item
+    for thread in threads:
+        thread.join()
+
+
+def ingest_arxiv_papers(
+    categories=DEFAULT_CATEGORIES,
+    max_results=MAX_RESULTS_PER_CATEGORY,
+    store_path=DEFAULT_STORE_PATH,
+    max_workers=None,
+    delay_seconds=ARXIV_DELAY_SECONDS,
+    page_size=100,
+):
+    """
+    Fetches the papers submitted to each category since the last run (see
+    `harvest`) and streams them into the paper store page by page. A
+    category's watermark only advances once it was fetched completely, so an
+    interrupted run is picked up again next time.
+    """
+    categories = list(dict.fromkeys(categories))
+    start = time.perf_counter()
+
+    with open_store(store_path) as store:
+        fetched = {category: 0 for category in categories}
+        added = updated = 0
+        pages = harvest(categories, store.watermarks(), max_results, max_workers, delay_seconds, page_size)
+        for category, page, outcome in pages:
+            if page is not None:
+                page_added, page_updated = store.upsert(page)
+                fetched[category] += len(page)
+                added += page_added
+                updated += page_updated
+            elif isinstance(outcome, dict):
+                store.set_watermark(category, outcome["published"], outcome["id"])
+        total = len(store)
+
+    for category in categories:
+        print(f"  {category}: {fetched[category]} papers since last run")
+    print(f"Total papers: {total} (New: {added}, Updated: {updated}) in {time.perf_counter() - start:.1f}s")
+    print(f"Saved papers to {store_path}")
+    return {"fetched": fetched, "added": added, "updated": updated}
+
 
 if __name__ == "__main__":
-    ingest_arxiv_papers()
+    import argparse
+    parser = argparse.ArgumentParser(description="Fetch new arXiv papers into the paper store.")
+    parser.add_argument("--categories", nargs="+", default=list(DEFAULT_CATEGORIES), help="arXiv categories to harvest")
+    parser.add_argument("--max-results", type=int, default=MAX_RESULTS_PER_CATEGORY, help="Cap for a category's first harvest")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent category fetches (default: one per category)")
+    args = parser.parse_args()
+    ingest_arxiv_papers(categories=args.categories, max_results=args.max_results, max_workers=args.workers)
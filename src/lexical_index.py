@@ -0,0 +1,142 @@
+import re
+import sqlite3
+
+# BM25 inverted index over titles, abstracts and authors, kept inside the
+# paper store as an SQLite FTS5 table. Triggers on `papers` keep it in step
+# with every upsert, so ingestion updates it incrementally for free.
+FTS_TABLE = "papers_fts"
+# bm25() column weights: title, abstract, authors
+BM25_WEIGHTS = (3.0, 1.0, 2.0)
+
+ARXIV_ID = re.compile(
+    r"^(?:arxiv:|https?://arxiv\.org/(?:abs|pdf)/)?"
+    r"(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[a-z]{2})?/\d{7})(v\d+)?(?:\.pdf)?$",
+    re.IGNORECASE,
+)
+AUTHOR_PREFIX = re.compile(r"^(?:author|au):\s*(.+)$", re.IGNORECASE)
+PHRASE = re.compile(r'"([^"]+)"')
+TERM = re.compile(r"\w+", re.UNICODE)
+
+_COLUMNS = (
+    "json_extract({row}.data, '$.title'), "
+    "json_extract({row}.data, '$.abstract'), "
+    "json_extract({row}.data, '$.authors')"
+)
+
+
+def ensure_index(conn):
+    """
+    Creates the FTS table and its triggers, backfilling it from existing
+    papers on first use. Returns False if this SQLite build lacks FTS5.
+    """
+    try:
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, abstract, authors, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+    except sqlite3.OperationalError:
+        return False
+    new_columns = _COLUMNS.format(row="new")
+    conn.executescript(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON papers BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, title, abstract, authors) VALUES (new.seq, {new_columns});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF data ON papers BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.seq;
+            INSERT INTO {FTS_TABLE} (rowid, title, abstract, authors) VALUES (new.seq, {new_columns});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON papers BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.seq;
+        END;
+    """)
+    has_papers = conn.execute("SELECT 1 FROM papers LIMIT 1").fetchone() is not None
+    has_entries = conn.execute(f"SELECT 1 FROM {FTS_TABLE} LIMIT 1").fetchone() is not None
+    if has_papers and not has_entries:
+        rebuild(conn)
+    conn.commit()
+    return True
+
+
+def rebuild(conn):
+    conn.execute(f"DELETE FROM {FTS_TABLE}")
+    conn.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, abstract, authors) "
+        f"SELECT seq, {_COLUMNS.format(row='papers')} FROM papers"
+    )
+    conn.commit()
+
+
+def parse_lookup(query):
+    """
+    Recognises queries that need no embedding: an arXiv id (optionally
+    versioned or as an abs/pdf URL) or `author:<name>`. Returns
+    ("id", (base_id, version)), ("author", name) or None.
+    """
+    query = query.strip()
+    match = ARXIV_ID.match(query)
+    if match:
+        return "id", (match.group(1), match.group(2))
+    match = AUTHOR_PREFIX.match(query)
+    if match:
+        return "author", match.group(1).strip()
+    return None
+
+
+def to_match_expression(query, column=None, operator="OR"):
+    """
+    Builds a safe FTS5 MATCH expression: quoted phrases stay phrases, every
+    other word becomes a quoted term, joined with `operator` (OR lets BM25
+    rank partial matches).
+    """
+    phrases = [" ".join(TERM.findall(p)) for p in PHRASE.findall(query)]
+    terms = TERM.findall(PHRASE.sub(" ", query))
+    parts = [f'"{part}"' for part in phrases + terms if part]
+    if not parts:
+        return None
+    expression = f" {operator} ".join(parts)
+    return f"{column} : ({expression})" if column else expression
+
+
+class LexicalIndex:
+    """BM25 keyword search and embedding-free lookups over a PaperStore."""
+
+    def __init__(self, store):
+        self.conn = store.conn
+        self.available = store.has_lexical_index
+
+    def search(self, query, limit=10, column=None, operator="OR"):
+        """Returns [(paper_id, score)] best first; higher scores are better."""
+        expression = to_match_expression(query, column, operator)
+        if not self.available or expression is None:
+            return []
+        rows = self.conn.execute(
+            f"SELECT p.id, -bm25({FTS_TABLE}, ?, ?, ?) AS score "
+            f"FROM {FTS_TABLE} JOIN papers p ON p.seq = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH ? ORDER BY score DESC LIMIT ?",
+            (*BM25_WEIGHTS, expression, limit),
+        )
+        return [(pid, float(score)) for pid, score in rows]
+
+    def find_by_arxiv_id(self, base_id, version=None, limit=10):
+        """Ids are stored as entry URLs (http://arxiv.org/abs/<id>v<n>)."""
+        if version:
+            patterns = [f"http://arxiv.org/abs/{base_id}{version}"]
+        else:
+            patterns = [f"http://arxiv.org/abs/{base_id}v[0-9]*", f"http://arxiv.org/abs/{base_id}"]
+        clauses = " OR ".join("id GLOB ?" for _ in patterns)
+        rows = self.conn.execute(
+            f"SELECT id FROM papers WHERE id = ? OR {clauses} ORDER BY id DESC LIMIT ?",
+            (base_id + (version or ""), *patterns, limit),
+        )
+        return [(pid, 1.0) for pid, in rows]
+
+    def lookup(self, query, limit=10):
+        """Answers id and author queries; returns None for anything else."""
+        parsed = parse_lookup(query)
+        if parsed is None:
+            return None
+        kind, value = parsed
+        if kind == "id":
+            return self.find_by_arxiv_id(*value, limit=limit)
+        # Every part of the name must match, but only within the authors column
+        return self.search(value, limit, column="authors", operator="AND")
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.migrate_to_supabase import PostgrestLoader, _load_row_index, load_manifest, save_manifest
+from src.paper_store import DEFAULT_STORE_PATH, open_store
+
+load_dotenv()
+
+FEED_MANIFEST_FILE = "feed_manifest.json"
+# Papers kept per stored feed; the API serves any limit up to this from the store
+FEED_SIZE = 50
+# Ids per `in.(...)` filter, keeps request URLs short
+ID_CHUNK = 200
+
+
+def parse_vector(value):
+    """pgvector columns come back from PostgREST as '[x,y,...]' strings."""
+    return np.asarray(json.loads(value) if isinstance(value, str) else value, dtype=np.float32)
+
+
+def _in_filter(ids):
+    return "in.(" + ",".join('"' + i.replace('"', '\\"') + '"' for i in ids) + ")"
+
+
+def feed_entry(paper, similarity):
+    return {
+        "id": paper["id"],
+        "title": paper.get("title"),
+        "abstract": paper.get("abstract"),
+        "url": paper.get("pdf_url"),
+        "similarity": round(float(similarity), 6),
+    }
+
+
+def merge_feed(existing, candidates, size=FEED_SIZE):
+    """Top `size` entries of both lists, best first; a paper appears once."""
+    best = {}
+    for entry in list(existing) + list(candidates):
+        current = best.get(entry["id"])
+        if current is None or entry["similarity"] > current["similarity"]:
+            best[entry["id"]] = entry
+    return sorted(best.values(), key=lambda e: e["similarity"], reverse=True)[:size]
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def materialize_feeds(
+    store_path=DEFAULT_STORE_PATH,
+    data_dir="data",
+    rest_url=None,
+    api_key=None,
+    feed_size=FEED_SIZE,
+    chunk_size=4096,
+    full=False,
+    transport=None,
+):
+    """
+    Merges papers added since the last run into every active stored feed.
+
+    Active users are those with a fresh (non-stale) row in `user_feeds`; a
+    star marks the row stale and the API recomputes it on the next visit.
+    Only the new papers are scored, against each user's profile centroid
+    (cosine, as in match_papers), so the daily cost is new papers x users.
+    data/feed_manifest.json records the store sequence number reached.
+    """
+    embeddings_file = os.path.join(data_dir, "embeddings.npy")
+    if not os.path.exists(embeddings_file):
+        print("Error: Local data not found.")
+        return None
+
+    rest_url = rest_url or f"{os.environ.get('SUPABASE_URL', '').rstrip('/')}/rest/v1"
+    api_key = api_key or os.environ.get("SUPABASE_SERVICE_KEY")
+    manifest_file = os.path.join(data_dir, FEED_MANIFEST_FILE)
+    manifest = {} if full else load_manifest(manifest_file)
+    last_seq = manifest.get("last_seq", 0)
+
+    start = time.perf_counter()
+    client = PostgrestLoader(rest_url, api_key, transport=transport)
+    store = open_store(store_path)
+    stats = {"users": 0, "new_papers": 0, "updated": 0}
+    try:
+        feeds = {row["user_id"]: row["papers"] for row in client.select("user_feeds", {"select": "user_id,papers", "stale": "eq.false"})}
+        user_ids = list(feeds)
+        profiles, starred = {}, {uid: set() for uid in user_ids}
+        for i in range(0, len(user_ids), ID_CHUNK):
+            chunk = _in_filter(user_ids[i:i + ID_CHUNK])
+            for row in client.select("user_profiles", {"select": "user_id,embedding_sum,star_count", "user_id": chunk}):
+                if row["star_count"] > 0:
+                    profiles[row["user_id"]] = parse_vector(row["embedding_sum"])
+            params = {"select": "user_id,paper_id", "interaction_type": "eq.star", "user_id": chunk}
+            for row in client.select("user_interactions", params):
+                starred[row["user_id"]].add(row["paper_id"])
+
+        users = list(profiles)
+        stats["users"] = len(users)
+        # The profile sum points the same way as the centroid, which is all cosine needs
+        centroids = _unit(np.stack([profiles[uid] for uid in users])) if users else None
+        embeddings = np.load(embeddings_file, mmap_mode="r")
+        row_of = _load_row_index(data_dir)
+        candidates = {uid: [] for uid in users}
+
+        def score(batch):
+            if not batch or centroids is None:
+                return
+            vectors = _unit(np.asarray(embeddings[[row_of[p["id"]] for p in batch]], dtype=np.float32))
+            similarities = centroids @ vectors.T
+            keep = min(feed_size, len(batch))
+            top = np.argpartition(-similarities, keep - 1, axis=1)[:, :keep]
+            for u, uid in enumerate(users):
+                fresh = [feed_entry(batch[j], similarities[u, j]) for j in top[u] if batch[j]["id"] not in starred[uid]]
+                candidates[uid] = merge_feed(candidates[uid], fresh, feed_size)
+
+        new_max = last_seq
+        batch = []
+        for seq, paper in store.iter_with_seq(after_seq=last_seq):
+            new_max = seq
+            if paper["id"] in row_of:
+                batch.append(paper)
+                stats["new_papers"] += 1
+            if len(batch) >= chunk_size:
+                score(batch)
+                batch = []
+        score(batch)
+
+        updates = [{"user_id": uid, "papers": merge_feed(feeds[uid], candidates[uid], feed_size)} for uid in users]
+        for i in range(0, len(updates), 100):
+            # Skips feeds a star marked stale while this run was scoring
+            stats["updated"] += client.rpc("store_user_feeds", {"feeds": updates[i:i + 100]}).json()
+
+        manifest["last_seq"] = new_max
+        save_manifest(manifest, manifest_file)
+    finally:
+        client.close()
+        store.close()
+
+    print(f"Merged {stats['new_papers']} new papers into {stats['updated']}/{stats['users']} feeds "
+          f"in {time.perf_counter() - start:.1f}s")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Merge newly ingested papers into the stored user feeds.")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and rescore every paper")
+    parser.add_argument("--feed-size", type=int, default=FEED_SIZE, help="Papers kept per feed")
+    args = parser.parse_args()
+
+    if not os.environ.get("SUPABASE_URL") or not os.environ.get("SUPABASE_SERVICE_KEY"):
+        print("Error: SUPABASE_URL or SUPABASE_SERVICE_KEY not found in .env")
+        exit(1)
+
+    materialize_feeds(feed_size=args.feed_size, full=args.full)
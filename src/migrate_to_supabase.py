@@ -1,77 +1,273 @@
 import os
 import json
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
 import numpy as np
-from supabase import create_client, Client
 from tqdm import tqdm
 from dotenv import load_dotenv
 
+from src.paper_store import DEFAULT_STORE_PATH, open_store
+from src.vector_store import IDS_FILE, id_table_matches, load_id_table
+
 load_dotenv()
 
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_SERVICE_KEY")
+SYNC_MANIFEST_FILE = "sync_manifest.json"
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def format_vector(vector):
+    """pgvector text literal; 9 significant digits round-trip float32 exactly."""
+    return "[" + ",".join("%.9g" % x for x in vector.tolist()) + "]"
+
+
+def paper_record(paper, vector):
+    """The `papers` table row for a stored paper and its embedding."""
+    return {
+        "id": paper["id"],
+        "title": paper.get("title"),
+        "abstract": paper.get("abstract"),
+        "url": paper.get("pdf_url"),
+        "authors": paper.get("authors", []),
+        "categories": paper.get("categories", []),
+        "published": paper.get("published"),
+        "embedding": format_vector(vector)
+    }
+
+
+def record_hash(record):
+    return hashlib.sha256(json.dumps(record, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class PostgrestLoader:
+    """
+    Upserts batches of rows into a PostgREST table (Supabase or a local
+    PostgREST in front of Postgres) over a shared, pooled HTTP client,
+    retrying transient failures with exponential backoff and jitter.
+    """
+
+    def __init__(self, rest_url, api_key, table="papers", workers=4, max_retries=5, backoff_seconds=0.5, timeout=60.0, transport=None):
+        self.table = table
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.client = httpx.Client(
+            base_url=rest_url,
+            headers={
+                "apikey": api_key,
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                "Prefer": "resolution=merge-duplicates,return=minimal",
+            },
+            limits=httpx.Limits(max_connections=workers, max_keepalive_connections=workers),
+            timeout=timeout,
+            transport=transport,
+        )
+
+    def close(self):
+        self.client.close()
+
+    def _request(self, method, path, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.request(method, path, **kwargs)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    return response
+                error = httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response)
+            except httpx.TransportError as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            time.sleep(self.backoff_seconds * (2 ** attempt) * (0.5 + random.random()))
+
+    def upsert(self, rows):
+        self._request("POST", f"/{self.table}", params={"on_conflict": "id"}, content=json.dumps(rows, ensure_ascii=False))
+
+    def select(self, table, params, page_size=1000):
+        """Yields every row of a filtered table read, one page at a time."""
+        offset = 0
+        while True:
+            page = self._request("GET", f"/{table}", params={**params, "limit": page_size, "offset": offset}).json()
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def rpc(self, name, payload):
+        return self._request("POST", f"/rpc/{name}", content=json.dumps(payload, ensure_ascii=False))
+
+
+class AdaptiveBatchSize:
+    """
+    Grows the batch size while uploads are fast and succeed, halves it on
+    failures or slow responses.
+    """
+
+    def __init__(self, initial=100, minimum=10, maximum=1000, target_seconds=2.0):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self._lock = threading.Lock()
 
-if not url or not key:
-    print("Error: SUPABASE_URL or SUPABASE_SERVICE_KEY not found in .env")
-    exit(1)
+    def record(self, ok, seconds):
+        with self._lock:
+            if ok and seconds < self.target_seconds:
+                self.size = min(self.maximum, int(self.size * 1.5) + 1)
+            elif not ok or seconds > 2 * self.target_seconds:
+                self.size = max(self.minimum, self.size // 2)
 
-supabase: Client = create_client(url, key)
 
-def migrate_data():
-    papers_file = "data/papers.json"
-    embeddings_file = "data/embeddings.npy"
-    mapping_file = "data/id_mapping.json"
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Warning: {path} is corrupted. Re-uploading everything.")
+        return {}
 
-    if not (os.path.exists(papers_file) and os.path.exists(embeddings_file)):
+
+def save_manifest(manifest, path):
+    # Write-then-rename so a crash mid-write never corrupts the checkpoint
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _load_row_index(data_dir):
+    # ids.npy is only rewritten with the compact copy, so it can lag embeddings.npy;
+    # id_mapping.json is written with every save
+    embeddings_file = os.path.join(data_dir, "embeddings.npy")
+    rows = len(np.load(embeddings_file, mmap_mode="r")) if os.path.exists(embeddings_file) else None
+    if os.path.exists(os.path.join(data_dir, IDS_FILE)) and (rows is None or id_table_matches(data_dir, rows)):
+        ids = (pid.decode("utf-8") for pid in load_id_table(data_dir))
+    else:
+        with open(os.path.join(data_dir, "id_mapping.json"), "r", encoding="utf-8") as f:
+            ids = json.load(f)
+    return {id_: row for row, id_ in enumerate(ids)}
+
+
+def migrate_data(
+    store_path=DEFAULT_STORE_PATH,
+    data_dir="data",
+    rest_url=None,
+    api_key=None,
+    workers=4,
+    full=False,
+    checkpoint_every=10,
+    backoff_seconds=0.5,
+    transport=None,
+):
+    """
+    Uploads papers whose record or embedding changed since the last sync.
+
+    data/sync_manifest.json maps paper id -> hash of the last uploaded record
+    and is checkpointed as batches succeed, so an interrupted run resumes where
+    it stopped. Failed batches are reported and retried on the next run.
+    """
+    embeddings_file = os.path.join(data_dir, "embeddings.npy")
+    if not os.path.exists(embeddings_file):
         print("Error: Local data not found.")
-        return
+        return None
+
+    rest_url = rest_url or f"{os.environ.get('SUPABASE_URL', '').rstrip('/')}/rest/v1"
+    api_key = api_key or os.environ.get("SUPABASE_SERVICE_KEY")
 
     print("Loading local data...")
-    with open(papers_file, "r", encoding="utf-8") as f:
-        papers = json.load(f)
-    
-    embeddings = np.load(embeddings_file)
-    with open(mapping_file, "r", encoding="utf-8") as f:
-        ids = json.load(f)
-        
-    # Map ID to embedding
-    id_to_emb = {id_: emb for id_, emb in zip(ids, embeddings)}
-
-    print(f"Migrating {len(papers)} papers to Supabase...")
-    
-    batch_size = 50
-    batch = []
-    
-    for paper in tqdm(papers):
-        pid = paper["id"]
-        if pid not in id_to_emb:
-            continue
-            
-        record = {
-            "id": pid,
-            "title": paper.get("title"),
-            "abstract": paper.get("abstract"),
-            "url": paper.get("pdf_url"),
-            "authors": paper.get("authors", []),
-            "categories": paper.get("categories", []),
-            "published": paper.get("published"),
-            "embedding": id_to_emb[pid].tolist()
-        }
-        batch.append(record)
-        
-        if len(batch) >= batch_size:
-            try:
-                supabase.table("papers").upsert(batch).execute()
-            except Exception as e:
-                print(f"Error upserting batch: {e}")
-            batch = []
+    # Memory-map the full-precision vectors; rows are only read as papers are
+    # streamed past. The database always gets float32, whatever compact format
+    # the embedding stage wrote for local readers.
+    embeddings = np.load(embeddings_file, mmap_mode="r")
+    row_of = _load_row_index(data_dir)
+
+    manifest_file = os.path.join(data_dir, SYNC_MANIFEST_FILE)
+    manifest = {} if full else load_manifest(manifest_file)
 
-    if batch:
+    sizer = AdaptiveBatchSize()
+    loader = PostgrestLoader(rest_url, api_key, workers=workers, backoff_seconds=backoff_seconds, transport=transport)
+    stats = {"uploaded": 0, "skipped": 0, "failed": 0, "batches": 0}
+
+    def upload(batch):
+        start = time.perf_counter()
         try:
-            supabase.table("papers").upsert(batch).execute()
+            loader.upsert([record for record, _ in batch])
         except Exception as e:
-            print(f"Error upserting final batch: {e}")
+            sizer.record(False, time.perf_counter() - start)
+            print(f"Error upserting batch of {len(batch)}: {e}")
+            return batch, False
+        sizer.record(True, time.perf_counter() - start)
+        return batch, True
+
+    def collect(done):
+        # Runs on the main thread only, so the manifest needs no locking
+        for future in done:
+            batch, ok = future.result()
+            stats["batches"] += 1
+            if not ok:
+                stats["failed"] += len(batch)
+                continue
+            stats["uploaded"] += len(batch)
+            manifest.update((record["id"], digest) for record, digest in batch)
+            if stats["batches"] % checkpoint_every == 0:
+                save_manifest(manifest, manifest_file)
+
+    store = open_store(store_path)
+    print(f"Syncing {len(store)} papers to Supabase with {workers} workers...")
+    in_flight = set()
+    batch = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for paper in tqdm(store.iter_papers(), total=len(store)):
+                pid = paper["id"]
+                if pid not in row_of:
+                    continue
+
+                record = paper_record(paper, embeddings[row_of[pid]])
+                digest = record_hash(record)
+                if manifest.get(pid) == digest:
+                    stats["skipped"] += 1
+                    continue
+                batch.append((record, digest))
 
-    print("Migration complete.")
+                if len(batch) >= sizer.size:
+                    # Bound the number of queued batches so memory stays flat
+                    if len(in_flight) >= 2 * workers:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    in_flight.add(executor.submit(upload, batch))
+                    batch = []
+
+            if batch:
+                in_flight.add(executor.submit(upload, batch))
+            done, _ = wait(in_flight)
+            collect(done)
+    finally:
+        save_manifest(manifest, manifest_file)
+        loader.close()
+        store.close()
+
+    print(f"Migration complete. Uploaded: {stats['uploaded']}, unchanged: {stats['skipped']}, failed: {stats['failed']}")
+    return stats
 
 if __name__ == "__main__":
-    migrate_data()
+    import argparse
+    parser = argparse.ArgumentParser(description="Upload new and changed papers to Supabase.")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent upload batches")
+    parser.add_argument("--full", action="store_true", help="Ignore the sync manifest and upload everything")
+    args = parser.parse_args()
+
+    if not os.environ.get("SUPABASE_URL") or not os.environ.get("SUPABASE_SERVICE_KEY"):
+        print("Error: SUPABASE_URL or SUPABASE_SERVICE_KEY not found in .env")
+        exit(1)
+
+    stats = migrate_data(workers=args.workers, full=args.full)
+    if stats and stats["failed"]:
+        exit(1)
@@ -0,0 +1,206 @@
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.migrate_to_supabase import PostgrestLoader, _load_row_index, load_manifest, record_hash, save_manifest
+
+load_dotenv()
+
+# Row-aligned with embeddings.npy: row i lists the K papers most similar to paper i
+NEIGHBORS_FILE = "neighbors.npy"
+SCORES_FILE = "neighbor_scores.npy"
+FINGERPRINTS_FILE = "neighbor_fingerprints.npy"
+META_FILE = "neighbors.json"
+NEIGHBOR_SYNC_FILE = "neighbor_sync_manifest.json"
+DEFAULT_K = 20
+# Query rows x candidate rows scored per matrix multiply (~16 MB of float32)
+BLOCK_ROWS = 1024
+CHUNK_ROWS = 4096
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def fingerprints(embeddings):
+    """
+    A hash per row that changes when the row's vector does: the float32 bit
+    patterns times fixed odd multipliers, summed with wrap-around. Integer
+    arithmetic is exact, unlike a float projection, whose result can vary
+    with the shape of the matrix multiply.
+    """
+    multipliers = np.random.default_rng(0).integers(1, 2 ** 63, embeddings.shape[1], dtype=np.uint64) | np.uint64(1)
+    prints = np.empty(len(embeddings), dtype=np.uint64)
+    for i in range(0, len(embeddings), CHUNK_ROWS):
+        words = np.ascontiguousarray(embeddings[i:i + CHUNK_ROWS], dtype=np.float32).view(np.uint32).astype(np.uint64)
+        prints[i:i + len(words)] = (words * multipliers).sum(axis=1, dtype=np.uint64)
+    return prints
+
+
+def top_k_neighbors(embeddings, rows, k, candidates=None, block_rows=BLOCK_ROWS, chunk_rows=CHUNK_ROWS):
+    """
+    For each of `rows`, the k most cosine-similar rows among `candidates`
+    (default: all rows), never itself. Returns (indices, scores) of shape
+    (len(rows), k), best first, padded with -1 / -inf when there are fewer
+    than k candidates. Rows are normalized block by block, so `embeddings`
+    can be a memory map that is never loaded whole.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    candidates = np.arange(len(embeddings)) if candidates is None else np.asarray(candidates, dtype=np.int64)
+    indices = np.full((len(rows), k), -1, dtype=np.int32)
+    scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+    for b in range(0, len(rows), block_rows):
+        block = rows[b:b + block_rows]
+        queries = _unit(embeddings[block])
+        best_idx, best_score = indices[b:b + block_rows], scores[b:b + block_rows]
+        for c in range(0, len(candidates), chunk_rows):
+            chunk = candidates[c:c + chunk_rows]
+            sims = queries @ _unit(embeddings[chunk]).T
+            sims[block[:, None] == chunk[None, :]] = -np.inf
+            keep = min(k, len(chunk))
+            top = np.argpartition(-sims, keep - 1, axis=1)[:, :keep]
+            merged_idx = np.concatenate([best_idx, chunk[top].astype(np.int32)], axis=1)
+            merged_score = np.concatenate([best_score, np.take_along_axis(sims, top, axis=1)], axis=1)
+            order = np.argsort(-merged_score, axis=1, kind="stable")[:, :k]
+            best_idx = np.take_along_axis(merged_idx, order, axis=1)
+            best_score = np.take_along_axis(merged_score, order, axis=1)
+        indices[b:b + block_rows], scores[b:b + block_rows] = best_idx, best_score
+    indices[~np.isfinite(scores)] = -1
+    return indices, scores
+
+
+def build_neighbor_graph(data_dir="data", k=DEFAULT_K, full=False):
+    """
+    Builds or incrementally updates the top-k cosine neighbour graph.
+
+    Papers appended since the last run, and papers whose embedding changed,
+    are scored against all papers, as are the papers whose lists held a
+    changed one (the list cannot be refilled from what was kept). Every other
+    paper is only scored against the new and changed papers, and the results
+    are merged into its existing list, so a daily run costs roughly new
+    papers x all papers. `full` rebuilds from scratch.
+    """
+    embeddings_file = os.path.join(data_dir, "embeddings.npy")
+    if not os.path.exists(embeddings_file):
+        print("Error: Local data not found.")
+        return None
+
+    start = time.perf_counter()
+    embeddings = np.load(embeddings_file, mmap_mode="r")
+    count = len(embeddings)
+    current = fingerprints(embeddings)
+
+    meta = load_manifest(os.path.join(data_dir, META_FILE))
+    previous = None
+    if not full and meta.get("k") == k and os.path.exists(os.path.join(data_dir, NEIGHBORS_FILE)):
+        previous = (np.load(os.path.join(data_dir, NEIGHBORS_FILE)), np.load(os.path.join(data_dir, SCORES_FILE)),
+                    np.load(os.path.join(data_dir, FINGERPRINTS_FILE)))
+        if len(previous[0]) > count:
+            previous = None
+
+    if previous is None:
+        targets = rescored = np.arange(count)
+        indices, scores = top_k_neighbors(embeddings, targets, k)
+    else:
+        old_indices, old_scores, old_prints = previous
+        old_count = len(old_indices)
+        changed = np.flatnonzero(old_prints != current[:old_count])
+        targets = np.concatenate([changed, np.arange(old_count, count)]).astype(np.int64)
+        indices = np.full((count, k), -1, dtype=np.int32)
+        scores = np.full((count, k), -np.inf, dtype=np.float32)
+        indices[:old_count], scores[:old_count] = old_indices, old_scores
+
+        rescored = targets
+        if len(targets):
+            # A list holding a changed paper loses its old score, and the
+            # (k+1)th neighbour that would replace it was never kept
+            affected = np.flatnonzero(np.isin(indices, targets).any(axis=1))
+            rescored = np.union1d(targets, affected)
+            rest = np.setdiff1d(np.arange(old_count), rescored)
+            new_idx, new_score = top_k_neighbors(embeddings, rest, k, candidates=targets)
+            merged_idx = np.concatenate([indices[rest], new_idx], axis=1)
+            merged_score = np.concatenate([scores[rest], new_score], axis=1)
+            order = np.argsort(-merged_score, axis=1, kind="stable")[:, :k]
+            indices[rest] = np.take_along_axis(merged_idx, order, axis=1)
+            scores[rest] = np.take_along_axis(merged_score, order, axis=1)
+            indices[rescored], scores[rescored] = top_k_neighbors(embeddings, rescored, k)
+
+    np.save(os.path.join(data_dir, NEIGHBORS_FILE), indices)
+    np.save(os.path.join(data_dir, SCORES_FILE), scores)
+    np.save(os.path.join(data_dir, FINGERPRINTS_FILE), current)
+    save_manifest({"k": k, "count": count}, os.path.join(data_dir, META_FILE))
+
+    elapsed = time.perf_counter() - start
+    print(f"Neighbour graph: {len(rescored)} of {count} papers scored against all "
+          f"({len(targets)} new or changed) in {elapsed:.1f}s")
+    return {"papers": count, "changed": len(targets), "rescored": len(rescored), "seconds": elapsed}
+
+
+def neighbor_rows(data_dir="data"):
+    """Yields (paper id, [{"id", "similarity"}, ...]) for every paper in the graph."""
+    row_of = _load_row_index(data_dir)
+    ids = sorted(row_of, key=row_of.get)
+    indices = np.load(os.path.join(data_dir, NEIGHBORS_FILE), mmap_mode="r")
+    scores = np.load(os.path.join(data_dir, SCORES_FILE), mmap_mode="r")
+    for row in range(min(len(ids), len(indices))):
+        yield ids[row], [{"id": ids[j], "similarity": round(float(s), 6)}
+                         for j, s in zip(indices[row], scores[row]) if j >= 0 and j < len(ids)]
+
+
+def upload_neighbor_graph(data_dir="data", rest_url=None, api_key=None, batch_size=500, transport=None):
+    """
+    Upserts the `paper_neighbors` rows whose neighbour list changed since the
+    last upload (tracked by hash in data/neighbor_sync_manifest.json).
+    """
+    rest_url = rest_url or f"{os.environ.get('SUPABASE_URL', '').rstrip('/')}/rest/v1"
+    api_key = api_key or os.environ.get("SUPABASE_SERVICE_KEY")
+    manifest_file = os.path.join(data_dir, NEIGHBOR_SYNC_FILE)
+    manifest = load_manifest(manifest_file)
+    loader = PostgrestLoader(rest_url, api_key, table="paper_neighbors", transport=transport)
+    stats = {"uploaded": 0, "skipped": 0}
+    batch = []
+
+    def flush():
+        loader.upsert([row for row, _ in batch])
+        manifest.update((row["id"], digest) for row, digest in batch)
+        stats["uploaded"] += len(batch)
+        batch.clear()
+
+    try:
+        for paper_id, neighbors in neighbor_rows(data_dir):
+            row = {"id": paper_id, "neighbors": neighbors}
+            digest = record_hash(row)
+            if manifest.get(paper_id) == digest:
+                stats["skipped"] += 1
+                continue
+            batch.append((row, digest))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        save_manifest(manifest, manifest_file)
+        loader.close()
+
+    print(f"Uploaded {stats['uploaded']} neighbour lists ({stats['skipped']} unchanged)")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the paper nearest-neighbour graph and upload changed rows.")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="Neighbours kept per paper")
+    parser.add_argument("--full", action="store_true", help="Rebuild the graph from scratch")
+    parser.add_argument("--no-upload", action="store_true", help="Only update the local graph")
+    args = parser.parse_args()
+
+    if build_neighbor_graph(k=args.k, full=args.full) and not args.no_upload:
+        if not os.environ.get("SUPABASE_URL") or not os.environ.get("SUPABASE_SERVICE_KEY"):
+            print("Error: SUPABASE_URL or SUPABASE_SERVICE_KEY not found in .env")
+            exit(1)
+        upload_neighbor_graph()
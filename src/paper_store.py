@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+
+from src.lexical_index import ensure_index
+
+STORE_FILE = "papers.db"
+DEFAULT_STORE_PATH = os.path.join("data", STORE_FILE)
+
+
+class PaperStore:
+    """
+    Append-only paper store backed by SQLite.
+
+    Papers keep the insertion sequence number (`seq`) they were first seen
+    with; re-ingesting a paper replaces its record in place. Deduplication is
+    done by the primary key, so writers never need to load existing papers,
+    and readers can stream records in insertion order with flat memory use.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS papers ("
+            " seq INTEGER PRIMARY KEY,"
+            " id TEXT NOT NULL UNIQUE,"
+            " data TEXT NOT NULL)"
+        )
+        # Per-category harvesting high-water marks, see src/ingest_arxiv.py
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS harvest_state ("
+            " category TEXT PRIMARY KEY,"
+            " last_published TEXT NOT NULL,"
+            " last_id TEXT NOT NULL)"
+        )
+        self.conn.commit()
+        # BM25 keyword index, maintained by triggers on every upsert
+        self.has_lexical_index = ensure_index(self.conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def __contains__(self, paper_id):
+        return self.conn.execute("SELECT 1 FROM papers WHERE id = ?", (paper_id,)).fetchone() is not None
+
+    def upsert(self, papers):
+        """
+        Adds new papers and replaces changed ones. Returns (added, updated).
+        """
+        before = len(self)
+        # rowcount, unlike total_changes, leaves out rows written by the FTS triggers
+        cursor = self.conn.executemany(
+            "INSERT INTO papers (id, data) VALUES (?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data WHERE papers.data != excluded.data",
+            ((p["id"], json.dumps(p, ensure_ascii=False)) for p in papers),
+        )
+        self.conn.commit()
+        added = len(self) - before
+        return added, max(cursor.rowcount, 0) - added
+
+    def get(self, paper_id):
+        row = self.conn.execute("SELECT data FROM papers WHERE id = ?", (paper_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, paper_ids, chunk_size=500):
+        """Returns {id: paper} for the ids that exist in the store."""
+        paper_ids = list(paper_ids)
+        found = {}
+        for start in range(0, len(paper_ids), chunk_size):
+            chunk = paper_ids[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            for pid, data in self.conn.execute(f"SELECT id, data FROM papers WHERE id IN ({placeholders})", chunk):
+                found[pid] = json.loads(data)
+        return found
+
+    def published_dates(self, paper_ids, chunk_size=500):
+        """Returns {id: published} without decoding whole records."""
+        paper_ids = list(paper_ids)
+        found = {}
+        for start in range(0, len(paper_ids), chunk_size):
+            chunk = paper_ids[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(self.conn.execute(
+                f"SELECT id, json_extract(data, '$.published') FROM papers WHERE id IN ({placeholders})", chunk
+            ))
+        return found
+
+    def iter_papers(self, after_seq=0, batch_size=1000):
+        """Streams papers in insertion order, optionally only those after a sequence number."""
+        for _, paper in self.iter_with_seq(after_seq, batch_size):
+            yield paper
+
+    def iter_with_seq(self, after_seq=0, batch_size=1000):
+        cursor = self.conn.execute("SELECT seq, data FROM papers WHERE seq > ? ORDER BY seq", (after_seq,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for seq, data in rows:
+                yield seq, json.loads(data)
+
+    def max_seq(self):
+        return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM papers").fetchone()[0]
+
+    def watermarks(self):
+        """Returns {category: (last_published, last_id)} for every harvested category."""
+        return {row[0]: (row[1], row[2]) for row in self.conn.execute("SELECT category, last_published, last_id FROM harvest_state")}
+
+    def set_watermark(self, category, last_published, last_id):
+        self.conn.execute(
+            "INSERT INTO harvest_state (category, last_published, last_id) VALUES (?, ?, ?) "
+            "ON CONFLICT(category) DO UPDATE SET last_published = excluded.last_published, last_id = excluded.last_id",
+            (category, last_published, last_id),
+        )
+        self.conn.commit()
+
+    def import_json(self, json_file):
+        """One-off import of a legacy papers.json file."""
+        with open(json_file, "r", encoding="utf-8") as f:
+            papers = json.load(f)
+        return self.upsert(papers)
+
+
+def open_store(path=DEFAULT_STORE_PATH, legacy_json=None):
+    """
+    Opens the store, importing the legacy papers.json on first use so
+    existing data directories keep working.
+    """
+    store = PaperStore(path)
+    legacy_json = legacy_json or os.path.join(os.path.dirname(path), "papers.json")
+    if len(store) == 0 and os.path.exists(legacy_json):
+        try:
+            added, _ = store.import_json(legacy_json)
+            print(f"Imported {added} papers from legacy {legacy_json}")
+        except json.JSONDecodeError:
+            print(f"Warning: {legacy_json} is corrupted. Skipping import.")
+    return store
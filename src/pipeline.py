@@ -0,0 +1,370 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.embed_papers import _load_existing, content_hash, paper_text, save_embedding_store
+from src.ingest_arxiv import ARXIV_DELAY_SECONDS, DEFAULT_CATEGORIES, MAX_RESULTS_PER_CATEGORY, harvest
+from src.migrate_to_supabase import SYNC_MANIFEST_FILE, PostgrestLoader, load_manifest, paper_record, record_hash, save_manifest
+from src.paper_store import DEFAULT_STORE_PATH, open_store
+from src.vector_store import FORMATS, id_table_matches
+
+load_dotenv()
+
+CHECKPOINT_FILE = "pipeline_checkpoint.json"
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# End-of-stream marker passed down the queues
+_DONE = object()
+
+
+class StageStats:
+    """Work and wait time of one stage; `blocked` is time spent on a full downstream queue."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items, seconds):
+        with self._lock:
+            self.items += items
+            self.batches += 1
+            self.busy += seconds
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "batches": self.batches,
+            "busy_seconds": round(self.busy, 3),
+            "starved_seconds": round(self.starved, 3),
+            "blocked_seconds": round(self.blocked, 3),
+            "items_per_sec": round(self.items / self.busy, 1) if self.busy else 0.0,
+        }
+
+
+class Checkpoint:
+    """
+    Ids fetched into the store whose embedding and upload are not yet
+    durable. Ids are added before they enter the pipeline and only removed
+    at `commit()`, after the embedding store and sync manifest were saved,
+    so a crashed run re-feeds exactly these papers on the next start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = set(load_manifest(path).get("pending", []))
+        self._finished = set()
+        self._lock = threading.Lock()
+
+    def add(self, ids):
+        with self._lock:
+            self.pending.update(ids)
+            self._save()
+
+    def finish(self, ids):
+        with self._lock:
+            self._finished.update(ids)
+
+    def take_finished(self):
+        with self._lock:
+            finished, self._finished = self._finished, set()
+            return finished
+
+    def commit(self, finished):
+        """Drops `finished` (from take_finished, taken before the data was saved)."""
+        with self._lock:
+            self.pending -= finished
+            self._save()
+
+    def _save(self):
+        save_manifest({"pending": sorted(self.pending)}, self.path)
+
+
+def _put(q, item, stop, stats):
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            break
+        except queue.Full:
+            continue
+    stats.blocked += time.perf_counter() - start
+
+
+def _get(q, stop, stats):
+    start = time.perf_counter()
+    try:
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+    finally:
+        stats.starved += time.perf_counter() - start
+
+
+def run_pipeline(
+    store_path=DEFAULT_STORE_PATH,
+    data_dir="data",
+    categories=DEFAULT_CATEGORIES,
+    max_results=MAX_RESULTS_PER_CATEGORY,
+    fetch_workers=None,
+    delay_seconds=ARXIV_DELAY_SECONDS,
+    model_name=DEFAULT_MODEL,
+    embed_batch_size=32,
+    storage_format="float16",
+    rest_url=None,
+    api_key=None,
+    upload_workers=4,
+    queue_size=8,
+    checkpoint_every=20,
+    backoff_seconds=0.5,
+    transport=None,
+):
+    """
+    Ingest, embed and upload in one streaming run.
+
+    Three stages run concurrently, connected by bounded queues: fetched pages
+    are written to the paper store and handed to the embedder, embedded
+    batches go straight to the uploaders. A full queue blocks the stage in
+    front of it, so memory stays bounded by `queue_size` batches per queue
+    and the run takes about as long as its slowest stage.
+
+    Only new or changed papers are embedded and only changed records are
+    uploaded, as in src/embed_papers.py and src/migrate_to_supabase.py.
+    data/pipeline_checkpoint.json lists the fetched papers not yet embedded,
+    saved and uploaded; a run starts by re-feeding them, so an interrupted
+    run resumes where it stopped. Upload failures stay in the checkpoint.
+    """
+    rest_url = rest_url or f"{os.environ.get('SUPABASE_URL', '').rstrip('/')}/rest/v1"
+    api_key = api_key or os.environ.get("SUPABASE_SERVICE_KEY")
+    os.makedirs(data_dir, exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(data_dir, CHECKPOINT_FILE))
+    sync_file = os.path.join(data_dir, SYNC_MANIFEST_FILE)
+    sync = load_manifest(sync_file)
+
+    # Embedding store: existing rows plus vectors appended during this run
+    embeddings, ids, hashes = _load_existing(data_dir, model_name)
+    # "dirty": embeddings.npy is behind; "compact_stale": the compact copy is,
+    # which only the final commit clears
+    state = {"embeddings": embeddings, "extra": [], "dirty": False,
+             "compact_stale": embeddings is not None and not id_table_matches(data_dir, len(ids))}
+    row_of = {pid: row for row, pid in enumerate(ids)}
+    state_lock = threading.Lock()
+    sync_lock = threading.Lock()
+    commit_lock = threading.Lock()
+
+    fetched = queue.Queue(maxsize=queue_size)
+    embedded = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    stages = {name: StageStats(name) for name in ("fetch", "embed", "upload")}
+    totals = {"fetched": 0, "resumed": 0, "embedded": 0, "uploaded": 0, "skipped": 0, "failed": 0}
+
+    def base_rows():
+        return len(state["embeddings"]) if state["embeddings"] is not None else 0
+
+    def vector_at(row):
+        base = base_rows()
+        return state["embeddings"][row] if row < base else state["extra"][row - base]
+
+    def store_vector(pid, vector, digest):
+        # Called with state_lock held
+        row = row_of.get(pid)
+        base = base_rows()
+        if row is None:
+            row_of[pid] = len(ids)
+            ids.append(pid)
+            state["extra"].append(vector)
+        elif row < base:
+            state["embeddings"][row] = vector
+        else:
+            state["extra"][row - base] = vector
+        hashes[pid] = digest
+        state["dirty"] = state["compact_stale"] = True
+
+    def commit(final=False):
+        """Makes finished work durable: embeddings, then the sync manifest, then the checkpoint."""
+        with commit_lock:
+            # Only ids finished before the save below are covered by it
+            finished = checkpoint.take_finished()
+            with state_lock:
+                if state["extra"]:
+                    appended = np.asarray(state["extra"], dtype=np.float32)
+                    base = state["embeddings"] if state["embeddings"] is not None else np.empty((0, appended.shape[1]), dtype=np.float32)
+                    state["embeddings"] = np.concatenate([base, appended])
+                    state["extra"] = []
+                # The compact copy for readers is only rewritten once, at the end
+                compact = final and state["compact_stale"] and state["embeddings"] is not None
+                if state["dirty"] or compact:
+                    save_embedding_store(data_dir, state["embeddings"], list(ids), dict(hashes), model_name,
+                                         storage_format if compact else None)
+                    state["dirty"] = False
+                    state["compact_stale"] = state["compact_stale"] and not compact
+            with sync_lock:
+                save_manifest(dict(sync), sync_file)
+            checkpoint.commit(finished)
+
+    def guarded(stage):
+        def run():
+            try:
+                stage()
+            except Exception as e:
+                errors.append(e)
+                print(f"Pipeline stage {stage.__name__} failed: {type(e).__name__}: {e}")
+                stop.set()
+        return run
+
+    def fetch():
+        stats = stages["fetch"]
+        with open_store(store_path) as store:
+            # Papers a previous run fetched but did not finish go first
+            resumed = sorted(checkpoint.pending)
+            for start in range(0, len(resumed), 100):
+                papers = list(store.get_many(resumed[start:start + 100]).values())
+                totals["resumed"] += len(papers)
+                if papers:
+                    _put(fetched, papers, stop, stats)
+
+            for category, page, outcome in harvest(categories, store.watermarks(), max_results, fetch_workers, delay_seconds):
+                if stop.is_set():
+                    break
+                if page is None:
+                    if isinstance(outcome, dict):
+                        store.set_watermark(category, outcome["published"], outcome["id"])
+                    continue
+                start = time.perf_counter()
+                store.upsert(page)
+                checkpoint.add(p["id"] for p in page)
+                stats.add(len(page), time.perf_counter() - start)
+                totals["fetched"] += len(page)
+                _put(fetched, page, stop, stats)
+        _put(fetched, _DONE, stop, stats)
+
+    def embed():
+        stats = stages["embed"]
+        # Load the model while the first arXiv pages are still in flight
+        from fastembed import TextEmbedding
+        model = TextEmbedding(model_name=model_name)
+        while True:
+            papers = _get(fetched, stop, stats)
+            if papers is _DONE:
+                break
+            start = time.perf_counter()
+            ready, todo = [], []
+            for paper in papers:
+                text = paper_text(paper)
+                digest = content_hash(text)
+                with state_lock:
+                    row = row_of.get(paper["id"])
+                    if row is not None and hashes.get(paper["id"]) == digest:
+                        ready.append((paper, vector_at(row)))
+                        continue
+                todo.append((paper, text, digest))
+            for i in range(0, len(todo), embed_batch_size):
+                chunk = todo[i:i + embed_batch_size]
+                vectors = np.array(list(model.embed([text for _, text, _ in chunk], batch_size=len(chunk))), dtype=np.float32)
+                with state_lock:
+                    for (paper, _, digest), vector in zip(chunk, vectors):
+                        store_vector(paper["id"], vector, digest)
+                ready.extend((paper, vector) for (paper, _, _), vector in zip(chunk, vectors))
+            totals["embedded"] += len(todo)
+            stats.add(len(todo), time.perf_counter() - start)
+            if ready:
+                _put(embedded, ready, stop, stats)
+        for _ in range(upload_workers):
+            _put(embedded, _DONE, stop, stats)
+
+    loader = PostgrestLoader(rest_url, api_key, workers=upload_workers, backoff_seconds=backoff_seconds, transport=transport)
+    uploads_done = [0]
+
+    def upload():
+        stats = stages["upload"]
+        while True:
+            batch = _get(embedded, stop, stats)
+            if batch is _DONE:
+                return
+            start = time.perf_counter()
+            records = []
+            with sync_lock:
+                for paper, vector in batch:
+                    record = paper_record(paper, vector)
+                    digest = record_hash(record)
+                    if sync.get(record["id"]) == digest:
+                        totals["skipped"] += 1
+                    else:
+                        records.append((record, digest))
+            changed = {record["id"] for record, _ in records}
+            checkpoint.finish(paper["id"] for paper, _ in batch if paper["id"] not in changed)
+            if records:
+                try:
+                    loader.upsert([record for record, _ in records])
+                except Exception as e:
+                    # Left in the checkpoint, so the next run retries them
+                    with sync_lock:
+                        totals["failed"] += len(records)
+                    print(f"Error upserting batch of {len(records)}: {e}")
+                else:
+                    with sync_lock:
+                        sync.update((record["id"], digest) for record, digest in records)
+                        totals["uploaded"] += len(records)
+                    checkpoint.finish(record["id"] for record, _ in records)
+            stats.add(len(records), time.perf_counter() - start)
+            with sync_lock:
+                uploads_done[0] += 1
+                due = uploads_done[0] % checkpoint_every == 0
+            if due:
+                commit()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=guarded(fetch), name="pipeline-fetch", daemon=True),
+               threading.Thread(target=guarded(embed), name="pipeline-embed", daemon=True)]
+    threads += [threading.Thread(target=guarded(upload), name=f"pipeline-upload-{i}", daemon=True) for i in range(upload_workers)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        stop.set()
+        loader.close()
+        # Even after a failure, so readers of the compact copy see every saved row
+        commit(final=True)
+
+    elapsed = time.perf_counter() - start
+    result = {**totals, "seconds": round(elapsed, 3), "stages": {name: s.as_dict() for name, s in stages.items()}, "errors": len(errors)}
+    print(f"Pipeline finished in {elapsed:.1f}s: fetched {totals['fetched']} (+{totals['resumed']} resumed), "
+          f"embedded {totals['embedded']}, uploaded {totals['uploaded']}, unchanged {totals['skipped']}, failed {totals['failed']}")
+    for name, s in stages.items():
+        d = s.as_dict()
+        print(f"  {name:<6} {d['items']:>7} items  busy {d['busy_seconds']:>8.2f}s  starved {d['starved_seconds']:>8.2f}s  "
+              f"blocked {d['blocked_seconds']:>8.2f}s  {d['items_per_sec']:>8.1f}/s")
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Fetch, embed and upload new papers in one streaming run.")
+    parser.add_argument("--categories", nargs="+", default=list(DEFAULT_CATEGORIES), help="arXiv categories to harvest")
+    parser.add_argument("--max-results", type=int, default=MAX_RESULTS_PER_CATEGORY, help="Cap per category and run")
+    parser.add_argument("--format", choices=FORMATS, default="float16", help="Compact storage format for readers")
+    parser.add_argument("--upload-workers", type=int, default=4, help="Concurrent upload batches")
+    args = parser.parse_args()
+
+    if not os.environ.get("SUPABASE_URL") or not os.environ.get("SUPABASE_SERVICE_KEY"):
+        print("Error: SUPABASE_URL or SUPABASE_SERVICE_KEY not found in .env")
+        exit(1)
+
+    stats = run_pipeline(categories=args.categories, max_results=args.max_results,
+                         storage_format=args.format, upload_workers=args.upload_workers)
+    if stats["errors"] or stats["failed"]:
+        exit(1)
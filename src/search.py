@@ -1,62 +1,475 @@
 import json
 import os
+import time
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
 import argparse
 
-def search_papers(query, data_dir="data", top_k=5, model_name="sentence-transformers/all-MiniLM-L6-v2"):
+from src.lexical_index import LexicalIndex, parse_lookup
+from src.paper_store import STORE_FILE, open_store
+from src.time_shards import TimeShards, empty_top_k, merge_top_k, published_timestamp, window_bounds
+from src.vector_store import META_FILE as VECTORS_META_FILE, load_vectors
+
+INDEX_FILE = "index.faiss"
+INDEX_META_FILE = "index_meta.json"
+# Bump when the on-disk index layout or metadata changes incompatibly
+INDEX_FORMAT_VERSION = 1
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+SEARCH_MODES = ("semantic", "lexical", "hybrid")
+# Reciprocal rank fusion constant; damps the weight of the very top ranks
+RRF_K = 60
+
+# Process-wide caches so repeated queries don't reload the model or the index
+_models = {}
+_searchers = {}
+
+
+def _file_signature(path):
+    """(size, mtime) of a file, used to detect when cached data went stale."""
+    stat = os.stat(path)
+    return [stat.st_size, int(stat.st_mtime_ns)]
+
+
+def build_index(data_dir="data", index_type="flat", nlist=None, hnsw_m=32, ef_construction=200):
     """
-    Searches for papers semantically similar to the query.
+    Builds a FAISS index over data/embeddings.npy and writes it next to the
+    embeddings, together with a small metadata file describing how it was built.
     """
-    # Paths
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from {INDEX_TYPES}.")
+
     embeddings_file = os.path.join(data_dir, "embeddings.npy")
-    mapping_file = os.path.join(data_dir, "id_mapping.json")
-    papers_file = os.path.join(data_dir, "papers.json")
+    if not os.path.exists(embeddings_file):
+        print("Error: Missing embeddings. Run embedding first.")
+        return None
+
+    embeddings = np.ascontiguousarray(np.load(embeddings_file, mmap_mode="r"), dtype=np.float32)
+    count, dimension = embeddings.shape
+    params = {}
+
+    print(f"Building {index_type} index over {count} vectors (dim={dimension})...")
+    start = time.perf_counter()
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "ivf":
+        # Rule of thumb: ~4*sqrt(N) lists, but never more lists than vectors
+        nlist = nlist or max(1, int(4 * np.sqrt(count)))
+        nlist = min(nlist, count)
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        index.train(embeddings)
+        # Default probe count trades a little recall for a large speedup
+        params.update({"nlist": nlist, "nprobe": max(1, nlist // 16)})
+    else:
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        params.update({"m": hnsw_m, "ef_construction": ef_construction, "ef_search": 64})
+    index.add(embeddings)
+    elapsed = time.perf_counter() - start
+
+    # Write to a temp file first so readers never see a half-written index
+    index_file = os.path.join(data_dir, INDEX_FILE)
+    tmp_file = index_file + ".tmp"
+    faiss.write_index(index, tmp_file)
+    os.replace(tmp_file, index_file)
+
+    meta = {
+        "version": INDEX_FORMAT_VERSION,
+        "index_type": index_type,
+        "params": params,
+        "count": int(count),
+        "dimension": int(dimension),
+        "embeddings_signature": _file_signature(embeddings_file),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with open(os.path.join(data_dir, INDEX_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=4)
+
+    print(f"Saved {index_type} index to {index_file} in {elapsed:.2f}s")
+    return meta
+
+
+def load_index(data_dir="data"):
+    """
+    Memory-maps the prebuilt index if it exists and matches the current
+    embeddings. Returns (index, meta) or (None, None) when it must be rebuilt.
+    """
+    index_file = os.path.join(data_dir, INDEX_FILE)
+    meta_file = os.path.join(data_dir, INDEX_META_FILE)
+    embeddings_file = os.path.join(data_dir, "embeddings.npy")
+    if not (os.path.exists(index_file) and os.path.exists(meta_file)):
+        return None, None
+
+    with open(meta_file, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != INDEX_FORMAT_VERSION:
+        print(f"Warning: {index_file} has format version {meta.get('version')}, expected {INDEX_FORMAT_VERSION}. Rebuild the index.")
+        return None, None
+    if os.path.exists(embeddings_file) and meta.get("embeddings_signature") != _file_signature(embeddings_file):
+        print(f"Warning: {index_file} is older than the embeddings. Rebuild the index.")
+        return None, None
+
+    try:
+        index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # Not every index type supports mmap; fall back to a regular read
+        index = faiss.read_index(index_file)
+    return index, meta
+
+
+def _get_model(model_name):
+    if model_name not in _models:
+        _models[model_name] = SentenceTransformer(model_name)
+    return _models[model_name]
+
+
+def clear_cache():
+    """Drops cached models and indexes (e.g. after rebuilding data in-process)."""
+    _models.clear()
+    for searcher in _searchers.values():
+        searcher.store.close()
+    _searchers.clear()
+
+
+class PaperSearcher:
+    """
+    Holds the index and id mapping in memory, plus an open handle on the paper
+    store, so that many queries can be answered without reloading anything.
+    Paper metadata is looked up per hit rather than loaded up front.
+
+    Without a prebuilt index, a compact vector store written by the embedding
+    stage is scanned straight from its memory map; only when neither exists
+    is an exact index built in memory.
+
+    The store's BM25 index backs lexical and hybrid search, and answers
+    arXiv id and `author:` queries without loading the model.
+
+    Date-windowed queries scan only the publication-month shards they
+    overlap (see src/time_shards.py), built on the first such query.
+    """
+
+    def __init__(self, data_dir="data", model_name="sentence-transformers/all-MiniLM-L6-v2", nprobe=None, ef_search=None):
+        self.data_dir = data_dir
+        self.model_name = model_name
+        embeddings_file = os.path.join(data_dir, "embeddings.npy")
+        self.signature = self._signature()
+
+        self.vectors = load_vectors(data_dir)
+        if self.vectors is not None:
+            # Binary id table, memory-mapped; decoded per hit
+            self.paper_ids = self.vectors.ids
+        else:
+            with open(os.path.join(data_dir, "id_mapping.json"), "r", encoding="utf-8") as f:
+                self.paper_ids = json.load(f)
+        self.store = open_store(os.path.join(data_dir, STORE_FILE))
+        self.lexical = LexicalIndex(self.store)
+        self._row_of = None
+        self._embeddings = None
+        self._shards = None
+
+        self.index, self.meta = load_index(data_dir)
+        if self.index is None and self.vectors is not None:
+            print(f"Note: no prebuilt index in {data_dir}; scanning {self.vectors.format} vectors.")
+        elif self.index is None:
+            # No usable prebuilt index: build an exact one in memory for this process
+            embeddings = np.ascontiguousarray(np.load(embeddings_file), dtype=np.float32)
+            self.index = faiss.IndexFlatL2(embeddings.shape[1])
+            self.index.add(embeddings)
+            print(f"Note: no prebuilt index in {data_dir}; run `python -m src.search --build-index flat` to speed up startup.")
+
+        params = (self.meta or {}).get("params", {})
+        nprobe = nprobe or params.get("nprobe")
+        ef_search = ef_search or params.get("ef_search")
+        if nprobe and (self.meta or {}).get("index_type") == "ivf":
+            faiss.extract_index_ivf(self.index).nprobe = nprobe
+        if ef_search and (self.meta or {}).get("index_type") == "hnsw":
+            faiss.downcast_index(self.index).hnsw.efSearch = ef_search
 
-    # Load Data
-    if not (os.path.exists(embeddings_file) and os.path.exists(mapping_file) and os.path.exists(papers_file)):
+    def _signature(self):
+        paths = [os.path.join(self.data_dir, name) for name in ("embeddings.npy", "id_mapping.json", VECTORS_META_FILE)]
+        return [_file_signature(p) if os.path.exists(p) else None for p in paths]
+
+    def is_stale(self):
+        return self.signature != self._signature()
+
+    def _id_at(self, row):
+        pid = self.paper_ids[row]
+        return pid.decode("utf-8") if isinstance(pid, bytes) else pid
+
+    def _encode(self, query):
+        model = _get_model(self.model_name)
+        return np.asarray(model.encode([query], convert_to_numpy=True), dtype=np.float32)
+
+    def _time_shards(self):
+        if self._shards is None:
+            ids = [self._id_at(row) for row in range(len(self.paper_ids))]
+            dates = self.store.published_dates(ids)
+            embeddings = np.load(os.path.join(self.data_dir, "embeddings.npy"), mmap_mode="r")
+            self._shards = TimeShards(embeddings, [published_timestamp(dates.get(pid)) for pid in ids])
+        return self._shards
+
+    def _window_search(self, query_vector, top_k, window):
+        """Exact squared L2 search over the month shards overlapping the (after, before) window."""
+        query = query_vector[0]
+        best = empty_top_k()
+        for rows, vectors, mask in self._time_shards().scan(*window):
+            distances = ((np.asarray(vectors, dtype=np.float32) - query) ** 2).sum(1)
+            if mask is not None:
+                rows, distances = rows[mask], distances[mask]
+            best = merge_top_k(best, rows, -distances, top_k)
+        return [(self._id_at(row), float(-score)) for row, score in zip(*best)]
+
+    def _in_window(self, found, window, top_k):
+        """Keeps the hits published inside the window (for rankings that are not sharded)."""
+        after, before = window
+        dates = self.store.published_dates(pid for pid, _ in found)
+        kept = []
+        for pid, score in found:
+            published = published_timestamp(dates.get(pid))
+            if not np.isnan(published) and (after is None or published >= after) and (before is None or published < before):
+                kept.append((pid, score))
+        return kept[:top_k]
+
+    def _vector_search(self, query_vector, top_k, window=None):
+        """Returns [(paper_id, distance)] closest first."""
+        if window is not None:
+            return self._window_search(query_vector, top_k, window)
+        if self.index is not None:
+            distances, indices = self.index.search(query_vector, top_k)
+            distances, indices = distances[0], indices[0]
+        else:
+            distances, indices = self.vectors.search(query_vector[0], top_k)
+        # FAISS pads with -1 when fewer than top_k results are available
+        return [(self._id_at(idx), float(dist)) for dist, idx in zip(distances, indices) if 0 <= idx < len(self.paper_ids)]
+
+    def _vector_search_many(self, query_vectors, top_k):
+        """One multi-query index search; returns a [(paper_id, distance)] list per query."""
+        if self.index is not None:
+            all_distances, all_indices = self.index.search(query_vectors, top_k)
+        else:
+            hits = [self.vectors.search(vector, top_k) for vector in query_vectors]
+            all_distances, all_indices = [h[0] for h in hits], [h[1] for h in hits]
+        return [
+            [(self._id_at(idx), float(dist)) for dist, idx in zip(distances, indices) if 0 <= idx < len(self.paper_ids)]
+            for distances, indices in zip(all_distances, all_indices)
+        ]
+
+    def _exact_distances(self, query_vector, paper_ids):
+        """Squared L2 distances for specific papers, read from the embeddings memory map."""
+        if self._row_of is None:
+            self._row_of = {self._id_at(row): row for row in range(len(self.paper_ids))}
+            self._embeddings = np.load(os.path.join(self.data_dir, "embeddings.npy"), mmap_mode="r")
+        known = [pid for pid in paper_ids if pid in self._row_of]
+        if not known:
+            return {}
+        vectors = np.asarray(self._embeddings[[self._row_of[pid] for pid in known]], dtype=np.float32)
+        distances = ((vectors - query_vector[0]) ** 2).sum(1)
+        return dict(zip(known, distances.tolist()))
+
+    def _hybrid_search(self, query, top_k, window=None, query_vector=None):
+        """
+        Reciprocal rank fusion of BM25 and vector rankings. The lexical
+        candidates are re-scored exactly against the query vector, so a
+        keyword match the ANN index missed still gets a fair vector rank.
+        """
+        lexical = self.lexical.search(query, max(50, top_k * 5))
+        if window is not None:
+            lexical = self._in_window(lexical, window, len(lexical))
+        if query_vector is None:
+            query_vector = self._encode(query)
+        distances = dict(self._vector_search(query_vector, top_k * 4, window))
+        distances.update(self._exact_distances(query_vector, [pid for pid, _ in lexical if pid not in distances]))
+
+        scores = {}
+        for ranking in (sorted(distances, key=distances.get), [pid for pid, _ in lexical]):
+            for rank, pid in enumerate(ranking):
+                scores[pid] = scores.get(pid, 0.0) + 1.0 / (RRF_K + rank + 1)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def search(self, query, top_k=5, mode="semantic", published_after=None, published_before=None, days=None):
+        """
+        Returns a list of (paper, score) tuples, best first. Semantic scores
+        are L2 distances (lower is better); lexical (BM25) and hybrid (fused
+        rank) scores are higher-is-better. `published_after`/`published_before`
+        (datetimes) and `days` (the last N days) restrict results by
+        publication date.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'. Choose from {SEARCH_MODES}.")
+        window = window_bounds(published_after, published_before, days)
+        if window is None:
+            found = self.lexical.lookup(query, top_k)
+        else:
+            # Lookups go through the same date window as the other modes
+            found = self.lexical.lookup(query, max(50, top_k * 5))
+            if found is not None:
+                found = self._in_window(found, window, top_k)
+        if found is None:
+            if mode == "lexical" and window is not None:
+                found = self._in_window(self.lexical.search(query, max(50, top_k * 5)), window, top_k)
+            elif mode == "lexical":
+                found = self.lexical.search(query, top_k)
+            elif mode == "hybrid":
+                found = self._hybrid_search(query, top_k, window)
+            else:
+                found = self._vector_search(self._encode(query), top_k, window)
+
+        papers = self.store.get_many(pid for pid, _ in found)
+        return [(papers[pid], score) for pid, score in found if pid in papers]
+
+    def search_many(self, queries, top_k=5, mode="semantic", days=None):
+        """
+        Answers many queries at once: one model call for all of them and, for
+        semantic search without a date window, one multi-query index search.
+        Hybrid and windowed queries reuse the batch's vectors for their
+        per-query ranking. Returns {query: [(paper, score), ...]}. Lookups and
+        lexical queries need no model and run one by one.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'. Choose from {SEARCH_MODES}.")
+        queries = list(dict.fromkeys(queries))
+        window = window_bounds(days=days)
+        results = {}
+        batched = []
+        for query in queries:
+            if mode == "lexical" or parse_lookup(query) is not None:
+                results[query] = self.search(query, top_k, mode=mode, days=days)
+            else:
+                batched.append(query)
+        if batched:
+            model = _get_model(self.model_name)
+            query_vectors = np.asarray(model.encode(batched, convert_to_numpy=True), dtype=np.float32)
+            if mode == "hybrid":
+                found = {query: self._hybrid_search(query, top_k, window, vector[None, :]) for query, vector in zip(batched, query_vectors)}
+            elif window is not None:
+                found = {query: self._vector_search(vector[None, :], top_k, window) for query, vector in zip(batched, query_vectors)}
+            else:
+                found = dict(zip(batched, self._vector_search_many(query_vectors, top_k)))
+            # One store round trip for every hit of every query
+            papers = self.store.get_many({pid for hits in found.values() for pid, _ in hits})
+            for query, hits in found.items():
+                results[query] = [(papers[pid], dist) for pid, dist in hits if pid in papers]
+        return {query: results[query] for query in queries}
+
+
+def get_searcher(data_dir="data", model_name="sentence-transformers/all-MiniLM-L6-v2"):
+    """Returns a cached PaperSearcher for data_dir, reloading it if the files changed."""
+    key = (os.path.abspath(data_dir), model_name)
+    searcher = _searchers.get(key)
+    if searcher is None or searcher.is_stale():
+        if searcher is not None:
+            searcher.store.close()
+        searcher = PaperSearcher(data_dir, model_name)
+        _searchers[key] = searcher
+    return searcher
+
+
+def search_papers(query, data_dir="data", top_k=5, model_name="sentence-transformers/all-MiniLM-L6-v2", mode="semantic",
+                  published_after=None, published_before=None, days=None):
+    """
+    Searches for papers matching the query (see SEARCH_MODES), optionally
+    only those published in a date window or the last `days` days.
+    """
+    if not _has_data_files(data_dir):
         print("Error: Missing data files. Run ingestion and embedding first.")
         return []
 
-    embeddings = np.load(embeddings_file)
-    with open(mapping_file, "r", encoding="utf-8") as f:
-        paper_ids = json.load(f)
-    with open(papers_file, "r", encoding="utf-8") as f:
-        papers_list = json.load(f)
-        papers_dict = {p["id"]: p for p in papers_list}
+    searcher = get_searcher(data_dir, model_name)
+    return _print_results(query, searcher.search(query, top_k, mode=mode, published_after=published_after,
+                                                 published_before=published_before, days=days))
 
-    # Initialize Index
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
 
-    # Encode Query
-    model = SentenceTransformer(model_name)
-    query_vector = model.encode([query], convert_to_numpy=True)
+def search_papers_batch(queries, data_dir="data", top_k=5, model_name="sentence-transformers/all-MiniLM-L6-v2", mode="semantic", verbose=True,
+                        days=None):
+    """
+    Searches many queries with one model call and one index search.
+    Returns {query: [paper, ...]}.
+    """
+    if not _has_data_files(data_dir):
+        print("Error: Missing data files. Run ingestion and embedding first.")
+        return {}
+
+    searcher = get_searcher(data_dir, model_name)
+    start = time.perf_counter()
+    hits = searcher.search_many(queries, top_k, mode=mode, days=days)
+    elapsed = time.perf_counter() - start
+    if verbose:
+        results = {query: _print_results(query, query_hits) for query, query_hits in hits.items()}
+    else:
+        results = {query: [paper for paper, _ in query_hits] for query, query_hits in hits.items()}
+    print(f"Answered {len(hits)} queries in {elapsed:.2f}s ({elapsed * 1000 / max(len(hits), 1):.1f} ms/query)")
+    return results
+
+
+def _has_data_files(data_dir):
+    embeddings_file = os.path.join(data_dir, "embeddings.npy")
+    mapping_file = os.path.join(data_dir, "id_mapping.json")
+    store_file = os.path.join(data_dir, STORE_FILE)
+    legacy_file = os.path.join(data_dir, "papers.json")
+    return os.path.exists(embeddings_file) and os.path.exists(mapping_file) and (os.path.exists(store_file) or os.path.exists(legacy_file))
 
-    # Search
-    distances, indices = index.search(query_vector, top_k)
 
+def _print_results(query, hits):
     results = []
     print(f"\nResults for '{query}':\n" + "-"*40)
-    for i, idx in enumerate(indices[0]):
-        if idx < len(paper_ids):
-            pid = paper_ids[idx]
-            paper = papers_dict.get(pid)
-            if paper:
-                results.append(paper)
-                print(f"{i+1}. [{distances[0][i]:.4f}] {paper['title']}")
-                print(f"   {paper['pdf_url']}")
-                print(f"   Categories: {', '.join(paper.get('categories', []))}")
-                print()
-    
+    for i, (paper, score) in enumerate(hits):
+        results.append(paper)
+        print(f"{i+1}. [{score:.4f}] {paper['title']}")
+        print(f"   {paper['pdf_url']}")
+        print(f"   Categories: {', '.join(paper.get('categories', []))}")
+        print()
     return results
 
+
+def interactive_search(data_dir="data", top_k=5, model_name="sentence-transformers/all-MiniLM-L6-v2", mode="semantic", days=None):
+    """
+    Simple REPL: loads the model and index once, then answers queries until EOF
+    or an empty line.
+    """
+    print("Loading index and model...")
+    get_searcher(data_dir, model_name)
+    _get_model(model_name)
+    print("Ready. Enter a query (empty line to quit).")
+    while True:
+        try:
+            query = input("query> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if not query:
+            break
+        start = time.perf_counter()
+        search_papers(query, data_dir=data_dir, top_k=top_k, model_name=model_name, mode=mode, days=days)
+        print(f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Search papers semantically.")
-    parser.add_argument("query", type=str, help="Search query")
+    parser.add_argument("query", type=str, nargs="?", help="Search query")
     parser.add_argument("--top_k", type=int, default=5, help="Number of results")
+    parser.add_argument("--data_dir", type=str, default="data", help="Directory holding embeddings and papers")
+    parser.add_argument("--build-index", choices=INDEX_TYPES, help="Build and save an index of the given type")
+    parser.add_argument("--nlist", type=int, default=None, help="Number of IVF lists (ivf only)")
+    parser.add_argument("--interactive", action="store_true", help="Answer many queries with one loaded model")
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="semantic", help="Ranking: vector (default), BM25 keyword, or both fused")
+    parser.add_argument("--queries-file", type=str, default=None, help="Answer every query in this file (one per line) in one batch")
+    parser.add_argument("--days", type=int, default=None, help="Only papers published in the last N days")
+    parser.add_argument("--output", type=str, default=None, help="With --queries-file, write {query: [paper ids]} JSON here")
     args = parser.parse_args()
-    
-    search_papers(args.query, top_k=args.top_k)
+
+    if args.build_index:
+        build_index(args.data_dir, index_type=args.build_index, nlist=args.nlist)
+    if args.interactive:
+        interactive_search(args.data_dir, top_k=args.top_k, mode=args.mode, days=args.days)
+    elif args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+        results = search_papers_batch(queries, data_dir=args.data_dir, top_k=args.top_k, mode=args.mode, verbose=not args.output, days=args.days)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({query: [p["id"] for p in papers] for query, papers in results.items()}, f, indent=4)
+    elif args.query:
+        search_papers(args.query, data_dir=args.data_dir, top_k=args.top_k, mode=args.mode, days=args.days)
+    elif not args.build_index:
+        parser.error("a query is required unless --build-index, --interactive or --queries-file is given")
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# Vector rows grouped into shards by publication month. Most queries ask for
+# recent papers, so a date-windowed query only scans the months it overlaps.
+# The newest HOT_MONTHS shards are kept in memory; older ones stay
+# memory-mapped and are paged in only when a window reaches back to them.
+HOT_MONTHS = 3
+UNDATED = "undated"
+
+
+def published_timestamp(value):
+    """Epoch seconds of an ISO date (naive dates are UTC, as in Postgres); NaN if missing."""
+    if not value:
+        return np.nan
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return np.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _seconds(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def window_bounds(published_after=None, published_before=None, days=None, now=None):
+    """
+    (after, before) in epoch seconds for a publication date filter, or None
+    without one. `days` keeps papers from the last N days (and narrows
+    `published_after` if that is earlier).
+    """
+    after, before = _seconds(published_after), _seconds(published_before)
+    if days is not None:
+        recent = (now or datetime.now(timezone.utc)).timestamp() - timedelta(days=days).total_seconds()
+        after = recent if after is None else max(after, recent)
+    if after is None and before is None:
+        return None
+    return after, before
+
+
+def date_order(published):
+    """Row order by publication date, undated rows last; None if already in that order."""
+    published = np.asarray(published, dtype=np.float64)
+    order = np.argsort(published, kind="stable")
+    return None if np.array_equal(order, np.arange(len(published))) else order
+
+
+def month_ranges(published):
+    """
+    Splits date-sorted timestamps (NaN last) into months.
+    Returns [(month, start, stop)], e.g. ("2024-01", 0, 120), with the
+    undated rows as a final UNDATED range.
+    """
+    published = np.asarray(published, dtype=np.float64)
+    dated = int(np.count_nonzero(~np.isnan(published)))
+    months = np.floor(published[:dated]).astype(np.int64).astype("datetime64[s]").astype("datetime64[M]")
+    starts = np.concatenate([[0], np.flatnonzero(months[1:] != months[:-1]) + 1]) if dated else np.empty(0, dtype=np.int64)
+    stops = np.append(starts[1:], dated)
+    ranges = [(str(months[start]), int(start), int(stop)) for start, stop in zip(starts, stops)]
+    if dated < len(published):
+        ranges.append((UNDATED, dated, len(published)))
+    return ranges
+
+
+def _month_bounds(month):
+    start = np.datetime64(month, "M")
+    return float(start.astype("datetime64[s]").astype(np.int64)), float((start + 1).astype("datetime64[s]").astype(np.int64))
+
+
+class Shard:
+    """One month of rows: where they sit in the matrix and their dates."""
+
+    def __init__(self, month, index, rows, published):
+        self.month = month
+        self.index = index
+        self.rows = rows
+        self.published = published
+        self.lower, self.upper = _month_bounds(month) if month != UNDATED else (np.nan, np.nan)
+        self.resident = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def vectors(self, matrix):
+        return self.resident if self.resident is not None else matrix[self.index]
+
+    def window_mask(self, after=None, before=None):
+        """Rows in [after, before), or None when the whole shard is inside the window."""
+        mask = None
+        if after is not None and self.lower < after:
+            mask = self.published >= after
+        if before is not None and self.upper > before:
+            inside = self.published < before
+            mask = inside if mask is None else mask & inside
+        return mask
+
+
+class TimeShards:
+    """
+    Publication-month shards over a vector matrix (usually a memory map).
+
+    `published` holds each row's epoch seconds, NaN when unknown. When the
+    rows are already sorted by date (as in an exported snapshot) every shard
+    is a slice of `matrix`; otherwise shards gather their rows through the
+    date order. The newest `hot_months` shards are copied into memory.
+    """
+
+    def __init__(self, matrix, published, hot_months=HOT_MONTHS):
+        self.matrix = matrix
+        published = np.asarray(published, dtype=np.float64)
+        order = date_order(published)
+        by_date = published if order is None else published[order]
+        self.shards = []
+        for month, start, stop in month_ranges(by_date):
+            if order is None:
+                # Slice when the rows are contiguous, so a cold shard is a view of the memory map
+                index, rows = slice(start, stop), np.arange(start, stop)
+            else:
+                index = rows = order[start:stop]
+            self.shards.append(Shard(month, index, rows, by_date[start:stop]))
+        dated = [shard for shard in self.shards if shard.month != UNDATED]
+        for shard in dated[max(0, len(dated) - hot_months):]:
+            shard.resident = np.ascontiguousarray(matrix[shard.index], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.shards)
+
+    def select(self, after=None, before=None):
+        """Shards that can hold rows published in [after, before) (epoch seconds)."""
+        if after is None and before is None:
+            return list(self.shards)
+        return [shard for shard in self.shards if shard.month != UNDATED
+                and (after is None or shard.upper > after) and (before is None or shard.lower < before)]
+
+    def scan(self, after=None, before=None):
+        """Yields (rows, vectors, mask) per selected shard; mask is None when every row is in the window."""
+        for shard in self.select(after, before):
+            yield shard.rows, shard.vectors(self.matrix), shard.window_mask(after, before)
+
+    def status(self):
+        resident = [shard for shard in self.shards if shard.resident is not None]
+        return {
+            "shards": len(self.shards),
+            "resident_shards": len(resident),
+            "resident_bytes": int(sum(shard.resident.nbytes for shard in resident)),
+            "newest_month": next((shard.month for shard in reversed(self.shards) if shard.month != UNDATED), None),
+        }
+
+
+def merge_top_k(best, rows, scores, k):
+    """Merges candidate (rows, scores) into `best`, keeping the k highest scores, best first."""
+    rows = np.concatenate([best[0], rows])
+    scores = np.concatenate([best[1], scores])
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        rows, scores = rows[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+
+def empty_top_k():
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
@@ -0,0 +1,231 @@
+import json
+import os
+import time
+import numpy as np
+
+# Compact on-disk layouts for paper embeddings. Every file is a plain .npy
+# array so readers can np.load(..., mmap_mode="r") them without copying.
+FORMATS = ("float32", "float16", "int8", "pq")
+META_FILE = "vectors.json"
+IDS_FILE = "ids.npy"
+
+# Rows scored per step when scanning, keeps temporary float32 buffers small
+CHUNK_ROWS = 16384
+
+
+def _path(data_dir, name):
+    return os.path.join(data_dir, name)
+
+
+def _save(path, array):
+    """np.save through a temp file, so `array` may be a memory map of `path` itself."""
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def write_id_table(ids, data_dir):
+    """Stores ids as a fixed-width byte array, so row -> id needs no JSON parse."""
+    encoded = [pid.encode("utf-8") for pid in ids]
+    width = max((len(e) for e in encoded), default=1)
+    np.save(_path(data_dir, IDS_FILE), np.array(encoded, dtype=f"S{width}"))
+
+
+def load_id_table(data_dir):
+    return np.load(_path(data_dir, IDS_FILE), mmap_mode="r")
+
+
+def id_table_matches(data_dir, count):
+    """Whether ids.npy exists and has `count` rows; it lags embeddings.npy until the next compact write."""
+    path = _path(data_dir, IDS_FILE)
+    return os.path.exists(path) and len(np.load(path, mmap_mode="r")) == count
+
+
+def _kmeans(points, k, iterations=15, seed=0):
+    """Plain Lloyd's k-means, enough to train small PQ codebooks."""
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        distances = (points ** 2).sum(1)[:, None] - 2 * points @ centroids.T + (centroids ** 2).sum(1)[None, :]
+        assignment = distances.argmin(1)
+        for c in range(k):
+            members = points[assignment == c]
+            if len(members):
+                centroids[c] = members.mean(0)
+    return centroids
+
+
+def train_pq(embeddings, n_subvectors, n_centroids=256, sample_size=20000, seed=0):
+    """Returns codebooks of shape (n_subvectors, n_centroids, dim // n_subvectors)."""
+    count, dim = embeddings.shape
+    if dim % n_subvectors:
+        raise ValueError(f"Embedding dimension {dim} is not divisible by {n_subvectors} subvectors.")
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(embeddings[np.sort(rng.choice(count, size=min(count, sample_size), replace=False))], dtype=np.float32)
+    n_centroids = min(n_centroids, len(sample))
+    sub = dim // n_subvectors
+    return np.stack([_kmeans(sample[:, j * sub:(j + 1) * sub], n_centroids, seed=seed) for j in range(n_subvectors)])
+
+
+def pq_encode(embeddings, codebooks):
+    n_subvectors, _, sub = codebooks.shape
+    codes = np.empty((len(embeddings), n_subvectors), dtype=np.uint8)
+    for start in range(0, len(embeddings), CHUNK_ROWS):
+        chunk = np.asarray(embeddings[start:start + CHUNK_ROWS], dtype=np.float32)
+        for j in range(n_subvectors):
+            part = chunk[:, j * sub:(j + 1) * sub]
+            centroids = codebooks[j]
+            distances = -2 * part @ centroids.T + (centroids ** 2).sum(1)[None, :]
+            codes[start:start + len(chunk), j] = distances.argmin(1)
+    return codes
+
+
+class CompactVectors:
+    """
+    Read-only, memory-mapped view of embeddings in one of FORMATS.
+    Distances are squared L2, matching the FAISS indexes in search.py.
+    """
+
+    def __init__(self, data_dir="data"):
+        with open(_path(data_dir, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.format = self.meta["format"]
+        self.ids = load_id_table(data_dir)
+        load = lambda name: np.load(_path(data_dir, name), mmap_mode="r")
+        if self.format == "float32":
+            self.data = load("embeddings.npy")
+        elif self.format == "float16":
+            self.data = load("embeddings.f16.npy")
+        elif self.format == "int8":
+            self.data = load("embeddings.int8.npy")
+            self.scale = np.load(_path(data_dir, "embeddings.int8.scale.npy"))
+        else:
+            self.data = load("embeddings.pq.codes.npy")
+            self.codebooks = np.load(_path(data_dir, "embeddings.pq.codebooks.npy"))
+        self.dimension = self.meta["dimension"]
+
+    def __len__(self):
+        return len(self.data)
+
+    def id_at(self, row):
+        return self.ids[row].decode("utf-8")
+
+    def reconstruct(self, start, stop):
+        """Approximate float32 vectors for rows [start, stop)."""
+        chunk = self.data[start:stop]
+        if self.format == "int8":
+            return chunk.astype(np.float32) * self.scale
+        if self.format == "pq":
+            n_subvectors = self.codebooks.shape[0]
+            return np.concatenate([self.codebooks[j][chunk[:, j]] for j in range(n_subvectors)], axis=1)
+        return np.asarray(chunk, dtype=np.float32)
+
+    def _chunk_distances(self, query, start, stop):
+        if self.format == "pq":
+            # Asymmetric distance: per-subvector lookup tables against the codebooks
+            n_subvectors, _, sub = self.codebooks.shape
+            parts = query.reshape(n_subvectors, 1, sub)
+            tables = ((self.codebooks - parts) ** 2).sum(-1)  # (n_subvectors, n_centroids)
+            codes = self.data[start:stop]
+            return tables[np.arange(n_subvectors), codes].sum(1)
+        vectors = self.reconstruct(start, stop)
+        return (vectors ** 2).sum(1) - 2 * vectors @ query + (query ** 2).sum()
+
+    def search(self, query, top_k=5):
+        """Returns (distances, rows) of the top_k closest vectors to one query."""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        best_dist = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        for start in range(0, len(self), CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, len(self))
+            distances = self._chunk_distances(query, start, stop)
+            keep = min(top_k, len(distances))
+            candidates = np.argpartition(distances, keep - 1)[:keep]
+            best_dist = np.concatenate([best_dist, distances[candidates]])
+            best_rows = np.concatenate([best_rows, candidates + start])
+            if len(best_dist) > top_k:
+                top = np.argpartition(best_dist, top_k - 1)[:top_k]
+                best_dist, best_rows = best_dist[top], best_rows[top]
+        order = np.argsort(best_dist, kind="stable")
+        return best_dist[order], best_rows[order]
+
+
+def measure_recall(embeddings, vectors, n_queries=100, top_k=10, seed=0):
+    """Recall@k of the compact store against exact float32 search, using stored rows as queries."""
+    count = len(embeddings)
+    if count == 0:
+        return 1.0
+    top_k = min(top_k, count)
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(count, size=min(n_queries, count), replace=False)
+    full = np.asarray(embeddings, dtype=np.float32)
+    norms = (full ** 2).sum(1)
+    recalls = []
+    for row in rows:
+        query = full[row]
+        exact = np.argpartition(norms - 2 * full @ query, top_k - 1)[:top_k]
+        _, approx = vectors.search(query, top_k)
+        recalls.append(len(set(exact.tolist()) & set(approx.tolist())) / top_k)
+    return float(np.mean(recalls))
+
+
+def write_vectors(embeddings, ids, data_dir="data", fmt="float16", pq_subvectors=48, measure=True):
+    """
+    Writes embeddings in the given compact format plus the binary id table and
+    a vectors.json describing them (including measured recall@10 vs float32).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown vector format '{fmt}'. Choose from {FORMATS}.")
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    count, dimension = embeddings.shape
+    os.makedirs(data_dir, exist_ok=True)
+    write_id_table(ids, data_dir)
+
+    start = time.perf_counter()
+    params = {}
+    if fmt == "float32":
+        files = ["embeddings.npy"]
+        _save(_path(data_dir, files[0]), embeddings)
+    elif fmt == "float16":
+        files = ["embeddings.f16.npy"]
+        _save(_path(data_dir, files[0]), embeddings.astype(np.float16))
+    elif fmt == "int8":
+        # Symmetric per-dimension scale so each dimension uses the full int8 range
+        scale = np.abs(embeddings).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        files = ["embeddings.int8.npy", "embeddings.int8.scale.npy"]
+        _save(_path(data_dir, files[0]), np.clip(np.rint(embeddings / scale), -127, 127).astype(np.int8))
+        _save(_path(data_dir, files[1]), scale.astype(np.float32))
+    else:
+        codebooks = train_pq(embeddings, pq_subvectors)
+        files = ["embeddings.pq.codes.npy", "embeddings.pq.codebooks.npy"]
+        _save(_path(data_dir, files[0]), pq_encode(embeddings, codebooks))
+        _save(_path(data_dir, files[1]), codebooks.astype(np.float32))
+        params["subvectors"] = pq_subvectors
+
+    meta = {
+        "format": fmt,
+        "count": int(count),
+        "dimension": int(dimension),
+        "params": params,
+        "bytes": int(sum(os.path.getsize(_path(data_dir, name)) for name in files + [IDS_FILE])),
+        "float32_bytes": int(embeddings.nbytes),
+        "encode_seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(_path(data_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=4)
+
+    if measure:
+        meta["recall_at_10"] = round(measure_recall(embeddings, CompactVectors(data_dir)), 4)
+        with open(_path(data_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=4)
+        print(f"Stored {count} vectors as {fmt}: {meta['bytes'] / 1e6:.1f} MB "
+              f"(float32: {meta['float32_bytes'] / 1e6:.1f} MB), recall@10 = {meta['recall_at_10']:.3f}")
+    return meta
+
+
+def load_vectors(data_dir="data"):
+    """Returns a CompactVectors view if a compact store was written, else None."""
+    if not (os.path.exists(_path(data_dir, META_FILE)) and os.path.exists(_path(data_dir, IDS_FILE))):
+        return None
+    return CompactVectors(data_dir)
@@ -18,15 +18,293 @@ create table if not exists user_interactions (
   id uuid default gen_random_uuid() primary key,
   user_id text not null,
   paper_id text references papers(id),
-  interaction_type text not null, -- 'star', 'ignore', 'click'
+  interaction_type text not null, -- 'star', 'unstar', 'ignore', 'click'
   created_at timestamp with time zone default timezone('utc'::text, now())
 );
 
+-- Approximate nearest-neighbour index for cosine distance. Filters apply
+-- after the index scan, so match_papers widens hnsw.ef_search and enables
+-- hnsw.iterative_scan (pgvector >= 0.8) for its own transaction.
+create index if not exists papers_embedding_hnsw on papers using hnsw (embedding vector_cosine_ops);
+
+-- Indexes backing the metadata filters in match_papers
+create index if not exists papers_categories_gin on papers using gin (categories);
+create index if not exists papers_published_idx on papers (published);
+create index if not exists user_interactions_user_type_idx on user_interactions (user_id, interaction_type, paper_id);
+
+-- New arguments change the signature, so drop the older versions
+drop function if exists match_papers(vector, float, int);
+drop function if exists match_papers(vector, float, int, text[], text, text[], timestamp, timestamp);
+
 -- Create a function to search for documents
+-- Optional filters (null = no filter):
+--   exclude_ids         papers to leave out
+--   exclude_starred_by  leave out papers this user has starred
+--   filter_categories   keep papers in any of these categories
+--   published_after / published_before  publication date range [after, before)
+--   abstract_chars      truncate returned abstracts to this many characters
 create or replace function match_papers (
   query_embedding vector(384),
   match_threshold float,
-  match_count int
+  match_count int,
+  exclude_ids text[] default null,
+  exclude_starred_by text default null,
+  filter_categories text[] default null,
+  published_after timestamp default null,
+  published_before timestamp default null,
+  abstract_chars int default null
+)
+returns table (
+  id text,
+  title text,
+  abstract text,
+  url text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  -- Recent windows (the common case) read only their months' rows through
+  -- papers_published_idx and score them exactly, instead of walking the HNSW
+  -- graph over the whole archive and discarding everything older
+  if published_after is not null and published_after >= (now() at time zone 'utc') - interval '3 months' then
+    return query
+    with recent as materialized (
+      select p.id, p.title, p.abstract, p.url, p.embedding
+      from papers p
+      where p.published >= published_after
+        and (published_before is null or p.published < published_before)
+        and (filter_categories is null or p.categories && filter_categories)
+        and (exclude_ids is null or p.id <> all(exclude_ids))
+    )
+    select
+      r.id,
+      r.title,
+      case when abstract_chars is null then r.abstract else left(r.abstract, abstract_chars) end as abstract,
+      r.url,
+      1 - (r.embedding <=> query_embedding) as similarity
+    from recent r
+    where 1 - (r.embedding <=> query_embedding) > match_threshold
+      and (exclude_starred_by is null or not exists (
+        select 1 from user_interactions ui
+        where ui.user_id = exclude_starred_by
+          and ui.interaction_type = 'star'
+          and ui.paper_id = r.id
+      ))
+    order by r.embedding <=> query_embedding
+    limit match_count;
+    return;
+  end if;
+
+  -- The filters below run on the rows the HNSW scan returns, and a scan
+  -- returns at most ef_search rows (default 40). Widen it, and on pgvector
+  -- >= 0.8 let the scan continue until match_count rows pass the filters.
+  -- Both settings are local to the current transaction.
+  perform set_config('hnsw.ef_search', least(1000, greatest(100, match_count * 4))::text, true);
+  begin
+    perform set_config('hnsw.iterative_scan', 'relaxed_order', true);
+  exception when others then
+    null; -- older pgvector: the wider ef_search is all there is
+  end;
+
+  return query
+  -- relaxed_order may return rows slightly out of order; sort them again
+  with candidates as materialized (
+    select
+      papers.id,
+      papers.title,
+      papers.abstract,
+      papers.url,
+      papers.embedding <=> query_embedding as distance
+    from papers
+    where 1 - (papers.embedding <=> query_embedding) > match_threshold
+      and (exclude_ids is null or papers.id <> all(exclude_ids))
+      and (exclude_starred_by is null or not exists (
+        select 1 from user_interactions ui
+        where ui.user_id = exclude_starred_by
+          and ui.interaction_type = 'star'
+          and ui.paper_id = papers.id
+      ))
+      and (filter_categories is null or papers.categories && filter_categories)
+      and (published_after is null or papers.published >= published_after)
+      and (published_before is null or papers.published < published_before)
+    order by papers.embedding <=> query_embedding
+    limit match_count
+  )
+  select
+    c.id,
+    c.title,
+    case when abstract_chars is null then c.abstract else left(c.abstract, abstract_chars) end as abstract,
+    c.url,
+    1 - c.distance as similarity
+  from candidates c
+  order by c.distance;
+end;
+$$;
+
+-- Materialized user profiles: running sum of each user's starred paper
+-- embeddings, so the feed centroid is one row read instead of one per star
+create table if not exists user_profiles (
+  user_id text primary key,
+  embedding_sum vector(384) not null,
+  star_count int not null default 0,
+  updated_at timestamp with time zone default timezone('utc'::text, now())
+);
+
+-- Backfill profiles for stars recorded before user_profiles existed
+insert into user_profiles (user_id, embedding_sum, star_count)
+select s.user_id, sum(papers.embedding), count(*)
+from (
+  select distinct user_id, paper_id
+  from user_interactions
+  where interaction_type = 'star'
+) s
+join papers on papers.id = s.paper_id
+where papers.embedding is not null
+group by s.user_id
+on conflict (user_id) do nothing;
+
+-- Precomputed feeds: the top papers for each user's profile, best first.
+-- Written on read by the API and refreshed after each ingestion run by
+-- src/materialize_feeds.py, which merges in only the newly added papers.
+create table if not exists user_feeds (
+  user_id text primary key,
+  papers jsonb not null,
+  stale boolean not null default false,
+  computed_at timestamp with time zone not null default timezone('utc'::text, now())
+);
+
+-- Bulk refresh from the materializer. Feeds marked stale by a star since the
+-- materializer read them are left alone. Returns the number of feeds written.
+create or replace function store_user_feeds (feeds jsonb)
+returns int
+language sql
+as $$
+  with updated as (
+    update user_feeds uf
+    set papers = f.value -> 'papers',
+        computed_at = timezone('utc'::text, now())
+    from jsonb_array_elements(feeds) f
+    where uf.user_id = f.value ->> 'user_id'
+      and not uf.stale
+    returning 1
+  )
+  select count(*)::int from updated;
+$$;
+
+-- Star or un-star a paper and update the user's profile in one transaction.
+-- Starring an already starred paper (or un-starring one that isn't) is a no-op
+-- and returns no rows; otherwise the recorded interaction row is returned.
+create or replace function record_star (
+  p_user_id text,
+  p_paper_id text,
+  p_starred boolean
+)
+returns setof user_interactions
+language plpgsql
+as $$
+declare
+  paper_embedding vector(384);
+  already_starred boolean;
+begin
+  -- Serialize star/unstar per user so the running sum never double counts
+  perform pg_advisory_xact_lock(hashtext(p_user_id));
+  -- The stored feed no longer matches the profile; the API recomputes it on read
+  update user_feeds set stale = true where user_feeds.user_id = p_user_id;
+
+  select exists (
+    select 1 from user_interactions ui
+    where ui.user_id = p_user_id and ui.paper_id = p_paper_id and ui.interaction_type = 'star'
+  ) into already_starred;
+  select papers.embedding into paper_embedding from papers where papers.id = p_paper_id;
+
+  if p_starred and not already_starred then
+    if paper_embedding is not null then
+      insert into user_profiles as up (user_id, embedding_sum, star_count)
+      values (p_user_id, paper_embedding, 1)
+      on conflict (user_id) do update
+        set embedding_sum = up.embedding_sum + excluded.embedding_sum,
+            star_count = up.star_count + 1,
+            updated_at = timezone('utc'::text, now());
+    end if;
+    return query
+      insert into user_interactions (user_id, paper_id, interaction_type)
+      values (p_user_id, p_paper_id, 'star')
+      returning *;
+  elsif not p_starred and already_starred then
+    delete from user_interactions ui
+    where ui.user_id = p_user_id and ui.paper_id = p_paper_id and ui.interaction_type = 'star';
+    if paper_embedding is not null then
+      update user_profiles up
+        set embedding_sum = up.embedding_sum - paper_embedding,
+            star_count = up.star_count - 1,
+            updated_at = timezone('utc'::text, now())
+      where up.user_id = p_user_id;
+    end if;
+    return query
+      insert into user_interactions (user_id, paper_id, interaction_type)
+      values (p_user_id, p_paper_id, 'unstar')
+      returning *;
+  end if;
+end;
+$$;
+
+-- Bulk star/unstar from the API's interaction buffer: `events` is a JSON array
+-- of {"user_id", "paper_id", "starred"}, applied in order through record_star.
+-- Returns the number of events that changed something.
+create or replace function record_stars (events jsonb)
+returns int
+language plpgsql
+as $$
+declare
+  e jsonb;
+  applied int := 0;
+begin
+  for e in select value from jsonb_array_elements(events) loop
+    if exists (select 1 from record_star(e->>'user_id', e->>'paper_id', (e->>'starred')::boolean)) then
+      applied := applied + 1;
+    end if;
+  end loop;
+  return applied;
+end;
+$$;
+
+-- Keyword search: weighted tsvector over title (A), authors (B) and abstract
+-- (C), maintained by a trigger so ingestion keeps it current incrementally
+alter table papers add column if not exists search_tsv tsvector;
+
+create or replace function papers_search_tsv_update() returns trigger
+language plpgsql
+as $$
+begin
+  new.search_tsv :=
+    setweight(to_tsvector('english', coalesce(new.title, '')), 'A') ||
+    setweight(to_tsvector('simple', array_to_string(coalesce(new.authors, '{}'), ' ')), 'B') ||
+    setweight(to_tsvector('english', coalesce(new.abstract, '')), 'C');
+  return new;
+end;
+$$;
+
+drop trigger if exists papers_search_tsv on papers;
+create trigger papers_search_tsv before insert or update of title, abstract, authors on papers
+  for each row execute function papers_search_tsv_update();
+
+-- Backfill rows written before the trigger existed
+update papers set title = title where search_tsv is null;
+
+create index if not exists papers_search_tsv_gin on papers using gin (search_tsv);
+
+-- BM25-style keyword ranking (ts_rank_cd). With authors_only, every word of
+-- query_text must match an author name. Filters work as in match_papers.
+create or replace function search_papers_lexical (
+  query_text text,
+  match_count int,
+  exclude_ids text[] default null,
+  filter_categories text[] default null,
+  published_after timestamp default null,
+  published_before timestamp default null,
+  abstract_chars int default null,
+  authors_only boolean default false
 )
 returns table (
   id text,
@@ -37,17 +315,167 @@ returns table (
 )
 language plpgsql
 as $$
+declare
+  q tsquery;
 begin
-  return query;
+  if authors_only then
+    select to_tsquery('simple', string_agg(quote_literal(w) || ':B', ' & '))
+      into q
+      from regexp_split_to_table(lower(query_text), '\W+') as w
+      where w <> '';
+  else
+    -- Author names are indexed unstemmed, so match both configurations
+    q := websearch_to_tsquery('english', query_text) || websearch_to_tsquery('simple', query_text);
+  end if;
+
+  return query
   select
-    papers.id,
-    papers.title,
-    papers.abstract,
-    papers.url,
-    1 - (papers.embedding <=> query_embedding) as similarity
-  from papers
-  where 1 - (papers.embedding <=> query_embedding) > match_threshold
-  order by papers.embedding <=> query_embedding
+    p.id,
+    p.title,
+    case when abstract_chars is null then p.abstract else left(p.abstract, abstract_chars) end as abstract,
+    p.url,
+    ts_rank_cd(p.search_tsv, q)::float as similarity
+  from papers p
+  where p.search_tsv @@ q
+    and (exclude_ids is null or p.id <> all(exclude_ids))
+    and (filter_categories is null or p.categories && filter_categories)
+    and (published_after is null or p.published >= published_after)
+    and (published_before is null or p.published < published_before)
+  order by ts_rank_cd(p.search_tsv, q) desc
   limit match_count;
 end;
 $$;
+
+-- Hybrid search: reciprocal rank fusion of the top candidate_count keyword
+-- and vector matches. `similarity` is the fused score.
+create or replace function hybrid_search_papers (
+  query_text text,
+  query_embedding vector(384),
+  match_count int,
+  exclude_ids text[] default null,
+  filter_categories text[] default null,
+  published_after timestamp default null,
+  published_before timestamp default null,
+  abstract_chars int default null,
+  candidate_count int default 50,
+  rrf_k int default 60
+)
+returns table (
+  id text,
+  title text,
+  abstract text,
+  url text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  return query
+  -- Candidates only need their ids, so their abstracts are cut to one character
+  with semantic as (
+    select m.id, m.rank
+    from match_papers(query_embedding, 0.1, candidate_count, exclude_ids, null, filter_categories,
+                      published_after, published_before, 1)
+      with ordinality as m(id, title, abstract, url, similarity, rank)
+  ),
+  lexical as (
+    select l.id, l.rank
+    from search_papers_lexical(query_text, candidate_count, exclude_ids, filter_categories,
+                               published_after, published_before, 1)
+      with ordinality as l(id, title, abstract, url, similarity, rank)
+  ),
+  fused as (
+    select
+      coalesce(s.id, l.id) as paper_id,
+      coalesce(1.0 / (rrf_k + s.rank), 0) + coalesce(1.0 / (rrf_k + l.rank), 0) as score
+    from semantic s
+    full outer join lexical l on s.id = l.id
+  )
+  select
+    p.id,
+    p.title,
+    case when abstract_chars is null then p.abstract else left(p.abstract, abstract_chars) end as abstract,
+    p.url,
+    f.score::float as similarity
+  from fused f
+  join papers p on p.id = f.paper_id
+  order by f.score desc
+  limit match_count;
+end;
+$$;
+
+-- Many vector searches in one round trip. `queries` is a JSON array of
+-- {"embedding": [...], "match_count": n}; rows come back tagged with the
+-- zero-based index of the query they answer. Filters apply to every query.
+create or replace function match_papers_batch (
+  queries jsonb,
+  match_threshold float default 0.1,
+  exclude_ids text[] default null,
+  filter_categories text[] default null,
+  published_after timestamp default null,
+  published_before timestamp default null,
+  abstract_chars int default null
+)
+returns table (
+  query_index int,
+  id text,
+  title text,
+  abstract text,
+  url text,
+  similarity float
+)
+language sql stable
+as $$
+  select (q.ordinality - 1)::int, m.id, m.title, m.abstract, m.url, m.similarity
+  from jsonb_array_elements(queries) with ordinality as q(query, ordinality)
+  cross join lateral match_papers(
+    (q.query->>'embedding')::vector(384),
+    match_threshold,
+    (q.query->>'match_count')::int,
+    exclude_ids,
+    null,
+    filter_categories,
+    published_after,
+    published_before,
+    abstract_chars
+  ) as m
+  order by q.ordinality, m.similarity desc;
+$$;
+
+-- Precomputed nearest neighbours: for each paper, its most similar papers as
+-- a JSON array of {"id", "similarity"}, best first. Built and updated
+-- incrementally by src/neighbor_graph.py.
+create table if not exists paper_neighbors (
+  id text primary key,
+  neighbors jsonb not null
+);
+
+-- Similar papers from the precomputed graph: one primary-key read plus a
+-- join for the paper columns, no vector search.
+create or replace function similar_papers (
+  p_paper_id text,
+  match_count int default 10,
+  abstract_chars int default null
+)
+returns table (
+  id text,
+  title text,
+  abstract text,
+  url text,
+  similarity float
+)
+language sql stable
+as $$
+  select
+    p.id,
+    p.title,
+    case when abstract_chars is null then p.abstract else left(p.abstract, abstract_chars) end as abstract,
+    p.url,
+    (n.value ->> 'similarity')::float as similarity
+  from paper_neighbors pn
+  cross join lateral jsonb_array_elements(pn.neighbors) with ordinality as n(value, rank)
+  join papers p on p.id = n.value ->> 'id'
+  where pn.id = p_paper_id
+  order by n.rank
+  limit match_count;
+$$;
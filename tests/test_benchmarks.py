@@ -0,0 +1,31 @@
+from benchmarks.run import compare, run
+from benchmarks.synthetic import generate_papers
+
+def test_synthetic_papers_are_deterministic_and_unique():
+    first = list(generate_papers(50))
+    assert first == list(generate_papers(50))
+    assert len({p["id"] for p in first}) == 50
+    # Continuing from an offset yields new ids, not repeats
+    assert not {p["id"] for p in first} & {p["id"] for p in generate_papers(50, start=50)}
+
+def test_small_run_reports_every_stage(tmp_path):
+    results = run(n=200, dim=16, queries=5, index_types=("flat",), work_dir=str(tmp_path))
+
+    stages = results["stages"]
+    assert set(stages) == {"ingest", "embed", "index_build", "search_flat"}
+    assert stages["embed"]["papers_per_sec"] > 0
+    assert stages["search_flat"]["p50_ms"] <= stages["search_flat"]["p99_ms"]
+    # Memory is one process-wide peak, not a misleading per-stage figure
+    assert results["process_peak_rss_mb"] > 0
+    assert not any("peak_rss_mb" in stage for stage in stages.values())
+
+def test_compare_flags_slowdowns_only():
+    baseline = {"stages": {"embed": {"seconds": 1.0, "papers_per_sec": 100}, "search_flat": {"p99_ms": 2.0}}}
+    current = {"stages": {"embed": {"seconds": 1.5, "papers_per_sec": 60}, "search_flat": {"p99_ms": 1.0}}}
+
+    regressions = compare(baseline, current, threshold=0.2)
+    assert [r["metric"] for r in regressions] == ["embed.seconds"]
+
+def test_compare_flags_memory_growth():
+    regressions = compare({"stages": {}, "process_peak_rss_mb": 100.0}, {"stages": {}, "process_peak_rss_mb": 150.0})
+    assert [r["metric"] for r in regressions] == ["process_peak_rss_mb"]
@@ -4,48 +4,125 @@ import os
 import json
 from unittest.mock import MagicMock, patch
 from src.embed_papers import generate_embeddings
+from src.paper_store import PaperStore
 
 @pytest.fixture
-def mock_sentence_transformer():
-    with patch('src.embed_papers.SentenceTransformer') as MockClass:
+def mock_text_embedding():
+    # generate_embeddings imports fastembed lazily, so patch it at the source
+    with patch('fastembed.TextEmbedding') as MockClass:
+        # Return one random vector per input text
+        MockClass.return_value.embed.side_effect = lambda texts, batch_size=32: iter(
+            np.random.rand(len(texts), 384).astype(np.float32)
+        )
         yield MockClass
 
-def test_embedding_generation(mock_sentence_transformer, tmp_path):
+def test_embedding_generation(mock_text_embedding, tmp_path):
     # Setup Data
     data_dir = tmp_path / "data"
     data_dir.mkdir()
-    papers_file = data_dir / "papers.json"
-    
+    store_path = str(data_dir / "papers.db")
+
     papers = [
         {"id": "1", "title": "T1", "abstract": "A1"},
         {"id": "2", "title": "T2", "abstract": "A2"}
     ]
-    with open(papers_file, "w") as f:
-        json.dump(papers, f)
-        
-    # Mock Model
-    mock_model = mock_sentence_transformer.return_value
-    # Mock encode to return random numpy array of shape (2, 384)
-    mock_model.encode.return_value = np.random.rand(2, 384).astype(np.float32)
-    
+    with PaperStore(store_path) as store:
+        store.upsert(papers)
+
     # Run
     generate_embeddings(
-        input_file=str(papers_file),
+        store_path=store_path,
         output_dir=str(data_dir),
         model_name="dummy-model"
     )
-    
+
     # Verify outputs
     embeddings_file = data_dir / "embeddings.npy"
     mapping_file = data_dir / "id_mapping.json"
-    
+
     assert embeddings_file.exists()
     assert mapping_file.exists()
-    
+
     # Check content
     emb = np.load(embeddings_file)
     assert emb.shape == (2, 384)
-    
+
     with open(mapping_file) as f:
         ids = json.load(f)
     assert ids == ["1", "2"]
+
+def test_incremental_embedding(mock_text_embedding, tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    store_path = str(data_dir / "papers.db")
+
+    papers = [
+        {"id": "1", "title": "T1", "abstract": "A1"},
+        {"id": "2", "title": "T2", "abstract": "A2"}
+    ]
+    with PaperStore(store_path) as store:
+        store.upsert(papers)
+    generate_embeddings(store_path=store_path, output_dir=str(data_dir), model_name="dummy-model")
+    first = np.load(data_dir / "embeddings.npy")
+
+    # Nothing changed: the model must not be asked to embed anything
+    mock_text_embedding.return_value.embed.reset_mock()
+    generate_embeddings(store_path=store_path, output_dir=str(data_dir), model_name="dummy-model")
+    mock_text_embedding.return_value.embed.assert_not_called()
+
+    # Paper 2 is revised and paper 3 is new: only those two get embedded
+    papers[1]["abstract"] = "A2 (revised)"
+    papers.append({"id": "3", "title": "T3", "abstract": "A3"})
+    with PaperStore(store_path) as store:
+        store.upsert(papers)
+    generate_embeddings(store_path=store_path, output_dir=str(data_dir), model_name="dummy-model")
+
+    args, _ = mock_text_embedding.return_value.embed.call_args
+    assert len(args[0]) == 2
+
+    second = np.load(data_dir / "embeddings.npy")
+    with open(data_dir / "id_mapping.json") as f:
+        assert json.load(f) == ["1", "2", "3"]
+    assert second.shape == (3, 384)
+    np.testing.assert_array_equal(second[0], first[0])
+    assert not np.array_equal(second[1], first[1])
+
+    # Switching models invalidates every stored vector
+    mock_text_embedding.return_value.embed.reset_mock()
+    generate_embeddings(store_path=store_path, output_dir=str(data_dir), model_name="other-model")
+    args, _ = mock_text_embedding.return_value.embed.call_args
+    assert len(args[0]) == 3
+
+@pytest.mark.parametrize("storage_format", ["float32", "float16", "int8", "pq"])
+def test_backfill_matches_store_order(mock_text_embedding, tmp_path, storage_format):
+    from src.embed_papers import backfill_embeddings
+    from src.vector_store import load_vectors
+
+    data_dir = tmp_path / "data"
+    store_path = str(tmp_path / "papers.db")
+    # Abstract lengths vary so length bucketing reorders texts within chunks
+    papers = [{"id": str(i), "title": f"T{i}", "abstract": " ".join(["w"] * ((i * 7) % 11))} for i in range(23)]
+    with PaperStore(store_path) as store:
+        store.upsert(papers)
+
+    # Each vector encodes its own text length, so misplaced rows are detectable
+    mock_text_embedding.return_value.embed.side_effect = lambda texts, batch_size=32: iter(
+        np.full(384, float(len(t)), dtype=np.float32) for t in texts
+    )
+
+    stats = backfill_embeddings(store_path=store_path, output_dir=str(data_dir), model_name="dummy-model",
+                                batch_size=4, workers=1, chunk_size=10, storage_format=storage_format)
+
+    assert stats["papers"] == 23
+    emb = np.load(data_dir / "embeddings.npy")
+    with open(data_dir / "id_mapping.json") as f:
+        assert json.load(f) == [p["id"] for p in papers]
+    for row, p in enumerate(papers):
+        assert emb[row, 0] == len(f"{p['title']} [SEP] {p['abstract']}")
+    # Writing the compact copy must leave embeddings.npy intact, float32 included
+    assert load_vectors(str(data_dir)).format == storage_format and len(load_vectors(str(data_dir))) == 23
+
+    # The manifest is complete, so a follow-up incremental run has nothing to do
+    mock_text_embedding.return_value.embed.reset_mock()
+    generate_embeddings(store_path=store_path, output_dir=str(data_dir), model_name="dummy-model")
+    mock_text_embedding.return_value.embed.assert_not_called()
@@ -0,0 +1,62 @@
+import json
+import os
+import numpy as np
+from src.export_snapshot import current_version, export_snapshot
+from src.paper_store import PaperStore
+
+def write_corpus(tmp_path, papers, embeddings):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir(exist_ok=True)
+    with PaperStore(str(data_dir / "papers.db")) as store:
+        store.upsert(papers)
+    with open(data_dir / "id_mapping.json", "w") as f:
+        json.dump([p["id"] for p in papers], f)
+    np.save(data_dir / "embeddings.npy", np.asarray(embeddings, dtype=np.float32))
+    return data_dir
+
+def test_export_writes_snapshot_and_moves_current(tmp_path):
+    papers = [
+        {"id": "a", "title": "A", "abstract": "aa", "pdf_url": "http://a", "categories": ["cs.AI", "cs.LG"], "published": "2024-01-02T00:00:00+00:00"},
+        {"id": "b", "title": "B", "abstract": "bb", "pdf_url": "http://b", "categories": ["cs.CV"], "published": None},
+    ]
+    data_dir = write_corpus(tmp_path, papers, [[3.0, 4.0], [0.0, 2.0]])
+    root = str(tmp_path / "snapshots")
+
+    meta = export_snapshot(str(data_dir / "papers.db"), str(data_dir), root=root, keep=1)
+    path = os.path.join(root, meta["version"])
+
+    assert current_version(root) == meta["version"]
+    assert meta["count"] == 2 and meta["categories"] == ["cs.AI", "cs.LG", "cs.CV"]
+    np.testing.assert_allclose(np.load(os.path.join(path, "vectors.npy")), [[0.6, 0.8], [0.0, 1.0]])
+    published = np.load(os.path.join(path, "published.npy"))
+    assert published[0] == 1704153600.0 and np.isnan(published[1])
+    assert np.unpackbits(np.load(os.path.join(path, "categories.npy")), axis=1)[:, :3].tolist() == [[1, 1, 0], [0, 0, 1]]
+
+    # A second export replaces the pointer; keep=1 prunes the first snapshot
+    second = export_snapshot(str(data_dir / "papers.db"), str(data_dir), root=root, keep=1)
+    assert current_version(root) == second["version"]
+    assert not os.path.exists(path)
+
+def test_export_orders_rows_by_publication_date(tmp_path):
+    papers = [
+        {"id": "new", "title": "New", "published": "2024-03-05T00:00:00"},
+        {"id": "undated", "title": "Undated", "published": None},
+        {"id": "old", "title": "Old", "published": "2023-11-20T00:00:00"},
+    ]
+    data_dir = write_corpus(tmp_path, papers, [[1.0, 0.0], [0.0, 1.0], [0.0, 2.0]])
+
+    meta = export_snapshot(str(data_dir / "papers.db"), str(data_dir), root=str(tmp_path / "snapshots"))
+    path = os.path.join(str(tmp_path / "snapshots"), meta["version"])
+
+    assert [pid.decode() for pid in np.load(os.path.join(path, "ids.npy"))] == ["old", "new", "undated"]
+    np.testing.assert_allclose(np.load(os.path.join(path, "vectors.npy")), [[0.0, 1.0], [1.0, 0.0], [0.0, 1.0]])
+    assert meta["months"] == ["2023-11", "2024-03", "undated"]
+
+def test_export_refuses_ids_that_do_not_cover_the_vectors(tmp_path):
+    papers = [{"id": "a", "title": "A"}, {"id": "b", "title": "B"}]
+    data_dir = write_corpus(tmp_path, papers, [[1.0, 0.0], [0.0, 1.0]])
+    np.save(data_dir / "embeddings.npy", np.eye(3, 2, dtype=np.float32))
+    root = str(tmp_path / "snapshots")
+
+    assert export_snapshot(str(data_dir / "papers.db"), str(data_dir), root=root) is None
+    assert current_version(root) is None
@@ -1,84 +1,162 @@
 import pytest
-import shutil
-import os
 import json
 from unittest.mock import MagicMock, patch
 from src.ingest_arxiv import ingest_arxiv_papers
+from src.paper_store import PaperStore, open_store
 
 @pytest.fixture
 def mock_arxiv_client():
     with patch('src.ingest_arxiv.arxiv.Client') as MockClient:
         yield MockClient
 
+def make_result(entry_id, title, summary="Abstract", published="2021-01-01"):
+    result = MagicMock()
+    result.entry_id = entry_id
+    result.title = title
+    result.summary = summary
+    author = MagicMock()
+    author.name = "Author"
+    result.authors = [author]
+    result.published.isoformat.return_value = published
+    result.updated.isoformat.return_value = published
+    result.categories = ["cs.AI"]
+    result.pdf_url = "http://pdf"
+    return result
+
 def test_fetched_structure(mock_arxiv_client, tmp_path):
     # Setup mock
-    mock_result = MagicMock()
-    mock_result.entry_id = "http://arxiv.org/abs/2101.00001v1"
-    mock_result.title = "Test Paper"
-    mock_result.summary = "Abstract"
-    mock_result.authors = [MagicMock(name="Author")]
-    mock_result.published.isoformat.return_value = "2021-01-01"
-    mock_result.updated.isoformat.return_value = "2021-01-01"
-    mock_result.categories = ["cs.AI"]
-    mock_result.pdf_url = "http://pdf"
-    
     client_instance = mock_arxiv_client.return_value
-    client_instance.results.return_value = [mock_result]
-    
+    client_instance.results.return_value = [make_result("http://arxiv.org/abs/2101.00001v1", "Test Paper")]
+
     # Run ingestion
-    with patch('src.ingest_arxiv.os.makedirs') as mock_dirs, \
-         patch('builtins.open', new_callable=MagicMock) as mock_open, \
-         patch('json.dump') as mock_json_dump, \
-         patch('src.ingest_arxiv.os.path.exists', return_value=False):
-         
-        ingest_arxiv_papers(max_results=1)
-        
-        # Verify
-        args, _ = mock_json_dump.call_args
-        saved_data = args[0]
-        assert len(saved_data) == 1
-        assert saved_data[0]["title"] == "Test Paper"
-        assert saved_data[0]["id"] == "http://arxiv.org/abs/2101.00001v1"
+    store_path = str(tmp_path / "papers.db")
+    ingest_arxiv_papers(max_results=1, store_path=store_path)
+
+    # Verify
+    with PaperStore(store_path) as store:
+        saved_data = list(store.iter_papers())
+    assert len(saved_data) == 1
+    assert saved_data[0]["title"] == "Test Paper"
+    assert saved_data[0]["id"] == "http://arxiv.org/abs/2101.00001v1"
+    assert saved_data[0]["authors"] == ["Author"]
 
 def test_deduplication(mock_arxiv_client, tmp_path):
     # Existing paper
-    existing = [{
-        "id": "existing_id", 
-        "title": "Old Paper",
-        "entry_id": "existing_id"
-    }]
-    
-    # Mock return same paper + new one
-    mock_res1 = MagicMock()
-    mock_res1.entry_id = "existing_id"
-    mock_res1.title = "Old Paper"
-    mock_res1.authors = []
-    mock_res1.published.isoformat.return_value = ""
-    mock_res1.updated.isoformat.return_value = ""
-
-    mock_res2 = MagicMock()
-    mock_res2.entry_id = "new_id"
-    mock_res2.title = "New Paper"
-    mock_res2.authors = []
-    mock_res2.published.isoformat.return_value = ""
-    mock_res2.updated.isoformat.return_value = ""
+    store_path = str(tmp_path / "papers.db")
+    with PaperStore(store_path) as store:
+        store.upsert([{"id": "existing_id", "title": "Old Paper", "entry_id": "existing_id"}])
 
+    # Mock return same paper + new one
     client_instance = mock_arxiv_client.return_value
-    client_instance.results.return_value = [mock_res1, mock_res2]
+    client_instance.results.return_value = [make_result("existing_id", "Old Paper"), make_result("new_id", "New Paper")]
 
     # Run
-    with patch('src.ingest_arxiv.os.makedirs'), \
-         patch('src.ingest_arxiv.os.path.exists', return_value=True), \
-         patch('builtins.open', new_callable=MagicMock) as mock_open, \
-         patch('json.load', return_value=existing), \
-         patch('json.dump') as mock_dump:
-         
-        ingest_arxiv_papers(max_results=2)
-        
-        args, _ = mock_dump.call_args
-        final_list = args[0]
-        # Should have 2 unique papers, not 3 (existing + existing + new)
-        assert len(final_list) == 2
-        ids = [p["id"] for p in final_list]
-        assert "existing_id" in ids
-        assert "new_id" in ids
+    ingest_arxiv_papers(max_results=2, store_path=store_path)
+
+    with PaperStore(store_path) as store:
+        final_list = list(store.iter_papers())
+    # Should have 2 unique papers, not 3 (existing + existing + new)
+    assert len(final_list) == 2
+    ids = [p["id"] for p in final_list]
+    # Re-ingested papers keep their original position
+    assert ids == ["existing_id", "new_id"]
+    assert final_list[0]["abstract"] == "Abstract"
+
+def test_store_upsert_counts_and_lookups(tmp_path):
+    with PaperStore(str(tmp_path / "papers.db")) as store:
+        assert store.upsert([{"id": "a", "title": "A"}, {"id": "b", "title": "B"}]) == (2, 0)
+        # Unchanged records are not rewritten
+        assert store.upsert([{"id": "a", "title": "A"}]) == (0, 0)
+        assert store.upsert([{"id": "b", "title": "B2"}, {"id": "c", "title": "C"}]) == (1, 1)
+
+        assert len(store) == 3
+        assert "b" in store and "z" not in store
+        assert store.get("b")["title"] == "B2"
+        assert set(store.get_many(["a", "c", "z"])) == {"a", "c"}
+        assert [p["id"] for p in store.iter_papers(after_seq=1, batch_size=1)] == ["b", "c"]
+
+def test_legacy_json_is_imported(tmp_path):
+    with open(tmp_path / "papers.json", "w") as f:
+        json.dump([{"id": "old", "title": "Legacy"}], f)
+
+    with open_store(str(tmp_path / "papers.db")) as store:
+        assert store.get("old")["title"] == "Legacy"
+
+def results_by_category(results):
+    """client.results side effect answering each `cat:<name>` search from a dict."""
+    consumed = {}
+    def fake_results(search):
+        category = search.query.split(":", 1)[1]
+        for result in results.get(category, []):
+            consumed[category] = consumed.get(category, 0) + 1
+            yield result
+    return fake_results, consumed
+
+def test_harvest_stops_at_category_watermark(mock_arxiv_client, tmp_path):
+    store_path = str(tmp_path / "papers.db")
+    fake_results, consumed = results_by_category({
+        "cs.AI": [make_result("ai2", "AI 2", published="2021-01-03"), make_result("ai1", "AI 1", published="2021-01-02")],
+        "cs.LG": [make_result("lg1", "LG 1", published="2021-01-02")],
+    })
+    mock_arxiv_client.return_value.results.side_effect = fake_results
+
+    ingest_arxiv_papers(categories=["cs.AI", "cs.LG"], store_path=store_path, delay_seconds=0)
+    with PaperStore(store_path) as store:
+        assert store.watermarks() == {"cs.AI": ("2021-01-03", "ai2"), "cs.LG": ("2021-01-02", "lg1")}
+
+    # Next run: only the papers above each watermark are fetched
+    fake_results, consumed = results_by_category({
+        "cs.AI": [make_result("ai3", "AI 3", published="2021-01-04"), make_result("ai2", "AI 2", published="2021-01-03"),
+                  make_result("ai1", "AI 1", published="2021-01-02")],
+        "cs.LG": [make_result("lg1", "LG 1", published="2021-01-02"), make_result("lg0", "LG 0", published="2021-01-01")],
+    })
+    mock_arxiv_client.return_value.results.side_effect = fake_results
+    stats = ingest_arxiv_papers(categories=["cs.AI", "cs.LG"], store_path=store_path, delay_seconds=0)
+
+    assert stats["fetched"] == {"cs.AI": 1, "cs.LG": 0}
+    assert stats["added"] == 1
+    # Iteration (and with it paging) stops at the first known paper
+    assert consumed == {"cs.AI": 2, "cs.LG": 1}
+    with PaperStore(store_path) as store:
+        assert [p["id"] for p in store.iter_papers()] == ["ai2", "ai1", "lg1", "ai3"]
+        assert store.watermarks()["cs.AI"] == ("2021-01-04", "ai3")
+
+def test_failed_category_keeps_its_watermark(mock_arxiv_client, tmp_path):
+    store_path = str(tmp_path / "papers.db")
+    def fake_results(search):
+        yield make_result("ai1", "AI 1", published="2021-01-02")
+        raise ConnectionError("arXiv unavailable")
+    mock_arxiv_client.return_value.results.side_effect = fake_results
+
+    stats = ingest_arxiv_papers(categories=["cs.AI"], store_path=store_path, delay_seconds=0, page_size=1)
+
+    # The page that arrived is kept, but the category is refetched next run
+    assert stats["added"] == 1
+    with PaperStore(store_path) as store:
+        assert store.watermarks() == {}
+
+def test_clients_share_the_rate_limit(mock_arxiv_client, tmp_path):
+    mock_arxiv_client.return_value.results.return_value = []
+
+    ingest_arxiv_papers(categories=["cs.AI", "cs.LG", "cs.CV"], store_path=str(tmp_path / "papers.db"), max_workers=2)
+
+    assert mock_arxiv_client.call_count == 2
+    assert all(c.kwargs["delay_seconds"] == 6.0 for c in mock_arxiv_client.call_args_list)
+
+def test_busy_category_pages_down_to_its_watermark(mock_arxiv_client, tmp_path):
+    store_path = str(tmp_path / "papers.db")
+    with open_store(store_path) as store:
+        store.set_watermark("cs.AI", "2021-01-01", "ai0")
+    newer = [make_result(f"ai{i}", f"AI {i}", published=f"2021-01-0{i + 1}") for i in range(5, 0, -1)]
+
+    def fake_results(search):
+        # Honour the search's cap, as the arXiv client does
+        return iter((newer + [make_result("ai0", "AI 0")])[:search.max_results])
+    mock_arxiv_client.return_value.results.side_effect = fake_results
+
+    stats = ingest_arxiv_papers(categories=["cs.AI"], max_results=2, store_path=store_path, delay_seconds=0)
+
+    # More new papers than max_results: all of them are fetched before the watermark moves
+    assert stats["fetched"] == {"cs.AI": 5}
+    with PaperStore(store_path) as store:
+        assert store.watermarks() == {"cs.AI": ("2021-01-06", "ai5")}
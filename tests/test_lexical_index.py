@@ -0,0 +1,69 @@
+import pytest
+
+from src.lexical_index import LexicalIndex, parse_lookup, to_match_expression
+from src.paper_store import PaperStore
+
+PAPERS = [
+    {"id": "http://arxiv.org/abs/2401.00001v1", "title": "Graph Neural Networks for Molecules",
+     "abstract": "Message passing on molecular graphs.", "authors": ["Ada Lovelace", "Alan Turing"]},
+    {"id": "http://arxiv.org/abs/2401.00002v2", "title": "Attention Is Enough",
+     "abstract": "Transformers without recurrence, compared with graph models.", "authors": ["Grace Hopper"]},
+    {"id": "http://arxiv.org/abs/2401.00003v1", "title": "Diffusion Models",
+     "abstract": "Denoising score matching.", "authors": ["Alan Kay"]},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    with PaperStore(str(tmp_path / "papers.db")) as store:
+        store.upsert(PAPERS)
+        yield store
+
+
+def test_bm25_ranks_title_matches_first(store):
+    lexical = LexicalIndex(store)
+
+    hits = lexical.search("graph networks")
+
+    assert [pid for pid, _ in hits] == ["http://arxiv.org/abs/2401.00001v1", "http://arxiv.org/abs/2401.00002v2"]
+    assert hits[0][1] > hits[1][1]
+
+
+def test_index_follows_upserts(store):
+    lexical = LexicalIndex(store)
+    store.upsert([{"id": "http://arxiv.org/abs/2401.00003v1", "title": "Consistency Models", "abstract": "", "authors": []}])
+
+    assert lexical.search("diffusion") == []
+    assert [pid for pid, _ in lexical.search("consistency")] == ["http://arxiv.org/abs/2401.00003v1"]
+
+
+def test_existing_store_is_backfilled(tmp_path):
+    path = str(tmp_path / "papers.db")
+    with PaperStore(path) as store:
+        store.upsert(PAPERS)
+        store.conn.execute("DELETE FROM papers_fts")
+        store.conn.commit()
+
+    with PaperStore(path) as store:
+        assert len(LexicalIndex(store).search("diffusion")) == 1
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("2401.00002", ["http://arxiv.org/abs/2401.00002v2"]),
+    ("arXiv:2401.00002v2", ["http://arxiv.org/abs/2401.00002v2"]),
+    ("https://arxiv.org/abs/2401.00001v1", ["http://arxiv.org/abs/2401.00001v1"]),
+    ("2401.00002v1", []),
+    ("author: alan turing", ["http://arxiv.org/abs/2401.00001v1"]),
+    ("au:Hopper", ["http://arxiv.org/abs/2401.00002v2"]),
+])
+def test_lookups(store, query, expected):
+    assert [pid for pid, _ in LexicalIndex(store).lookup(query)] == expected
+
+
+def test_free_text_is_not_a_lookup():
+    assert parse_lookup("graph neural networks") is None
+
+
+def test_match_expression_is_escaped():
+    assert to_match_expression('"graph networks" NEAR(x*') == '"graph networks" OR "NEAR" OR "x"'
+    assert to_match_expression('"" ***') is None
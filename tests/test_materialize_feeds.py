@@ -0,0 +1,83 @@
+import json
+import httpx
+import numpy as np
+import pytest
+from src.materialize_feeds import materialize_feeds, merge_feed
+from src.paper_store import PaperStore
+
+DIM = 4
+
+class FakeFeedsServer:
+    """Stand-in for PostgREST serving user_feeds / user_profiles / user_interactions."""
+
+    def __init__(self):
+        self.feeds = {"u1": [{"id": "old", "title": "Old", "abstract": "", "url": None, "similarity": 0.5}]}
+        self.profiles = [
+            {"user_id": "u1", "embedding_sum": "[2,0,0,0]", "star_count": 2},
+        ]
+        self.stars = [{"user_id": "u1", "paper_id": "p1"}]
+        self.stored = []
+
+    def __call__(self, request):
+        path = request.url.path.rsplit("/", 1)[-1]
+        if request.method == "POST" and path == "store_user_feeds":
+            feeds = json.loads(request.content)["feeds"]
+            self.stored.append(feeds)
+            return httpx.Response(200, json=len(feeds))
+        rows = {"user_feeds": [{"user_id": u, "papers": p} for u, p in self.feeds.items()],
+                "user_profiles": self.profiles,
+                "user_interactions": self.stars}[path]
+        return httpx.Response(200, json=rows if request.url.params["offset"] == "0" else [])
+
+@pytest.fixture
+def data_dir(tmp_path):
+    # p0 and p1 point along the user's profile, p2 is orthogonal to it
+    papers = [{"id": f"p{i}", "title": f"T{i}", "abstract": "A", "pdf_url": f"http://{i}"} for i in range(3)]
+    with PaperStore(str(tmp_path / "papers.db")) as store:
+        store.upsert(papers)
+    embeddings = np.array([[1, 0.1, 0, 0], [1, 0, 0, 0], [0, 1, 0, 0]], dtype=np.float32)
+    np.save(tmp_path / "embeddings.npy", embeddings)
+    with open(tmp_path / "id_mapping.json", "w") as f:
+        json.dump([p["id"] for p in papers], f)
+    return tmp_path
+
+def run(data_dir, server, **kwargs):
+    return materialize_feeds(
+        store_path=str(data_dir / "papers.db"),
+        data_dir=str(data_dir),
+        rest_url="http://postgrest.local/rest/v1",
+        api_key="test-key",
+        transport=httpx.MockTransport(server),
+        **kwargs,
+    )
+
+def test_new_papers_are_merged_into_active_feeds(data_dir):
+    server = FakeFeedsServer()
+
+    stats = run(data_dir, server, feed_size=3)
+
+    assert stats == {"users": 1, "new_papers": 3, "updated": 1}
+    [[feed]] = server.stored
+    assert feed["user_id"] == "u1"
+    # Starred p1 is left out; the existing entry is kept in similarity order
+    assert [p["id"] for p in feed["papers"]] == ["p0", "old", "p2"]
+    assert feed["papers"][0]["url"] == "http://0"
+
+def test_only_papers_since_the_last_run_are_scored(data_dir):
+    server = FakeFeedsServer()
+    run(data_dir, server)
+    with PaperStore(str(data_dir / "papers.db")) as store:
+        store.upsert([{"id": "p3", "title": "T3", "abstract": "A", "pdf_url": "http://3"}])
+    np.save(data_dir / "embeddings.npy", np.array([[1, 0.1, 0, 0], [1, 0, 0, 0], [0, 1, 0, 0], [1, 0, 0, 0]], dtype=np.float32))
+    with open(data_dir / "id_mapping.json", "w") as f:
+        json.dump(["p0", "p1", "p2", "p3"], f)
+
+    stats = run(data_dir, server)
+
+    assert stats["new_papers"] == 1
+    assert [p["id"] for p in server.stored[-1][0]["papers"]] == ["p3", "old"]
+
+def test_merge_feed_keeps_best_copy_of_each_paper():
+    existing = [{"id": "a", "similarity": 0.2}, {"id": "b", "similarity": 0.9}]
+    candidates = [{"id": "a", "similarity": 0.5}, {"id": "c", "similarity": 0.1}]
+    assert merge_feed(existing, candidates, size=2) == [{"id": "b", "similarity": 0.9}, {"id": "a", "similarity": 0.5}]
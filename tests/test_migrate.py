@@ -0,0 +1,110 @@
+import json
+import httpx
+import numpy as np
+import pytest
+from src.migrate_to_supabase import PostgrestLoader, _load_row_index, format_vector, migrate_data
+from src.paper_store import PaperStore
+
+class FakePostgrest:
+    """Stand-in for PostgREST: records upserted rows, can fail the first N calls."""
+
+    def __init__(self, fail_first=0):
+        self.rows = {}
+        self.calls = 0
+        self.fail_first = fail_first
+
+    def __call__(self, request):
+        self.calls += 1
+        if self.calls <= self.fail_first:
+            return httpx.Response(503)
+        assert request.url.path == "/rest/v1/papers"
+        assert request.url.params["on_conflict"] == "id"
+        for row in json.loads(request.content):
+            self.rows[row["id"]] = row
+        return httpx.Response(201)
+
+@pytest.fixture
+def data_dir(tmp_path):
+    papers = [{"id": str(i), "title": f"T{i}", "abstract": "A", "pdf_url": "http://pdf"} for i in range(25)]
+    with PaperStore(str(tmp_path / "papers.db")) as store:
+        store.upsert(papers)
+    np.save(tmp_path / "embeddings.npy", np.random.rand(25, 4).astype(np.float32))
+    with open(tmp_path / "id_mapping.json", "w") as f:
+        json.dump([p["id"] for p in papers], f)
+    return tmp_path
+
+def run(data_dir, server, **kwargs):
+    return migrate_data(
+        store_path=str(data_dir / "papers.db"),
+        data_dir=str(data_dir),
+        rest_url="http://postgrest.local/rest/v1",
+        api_key="test-key",
+        transport=httpx.MockTransport(server),
+        backoff_seconds=0,
+        **kwargs,
+    )
+
+def test_only_changed_rows_are_resent(data_dir):
+    server = FakePostgrest()
+    stats = run(data_dir, server, workers=3)
+    assert stats["uploaded"] == 25
+    assert len(server.rows) == 25
+    assert server.rows["7"]["embedding"].startswith("[")
+
+    # Nothing changed: nothing is uploaded
+    server.rows.clear()
+    stats = run(data_dir, server)
+    assert stats == {"uploaded": 0, "skipped": 25, "failed": 0, "batches": 0}
+
+    # One paper edited: only that one goes over the wire
+    with PaperStore(str(data_dir / "papers.db")) as store:
+        store.upsert([{"id": "3", "title": "T3 v2", "abstract": "A", "pdf_url": "http://pdf"}])
+    stats = run(data_dir, server)
+    assert stats["uploaded"] == 1
+    assert list(server.rows) == ["3"]
+
+def test_transient_failures_are_retried(data_dir):
+    server = FakePostgrest(fail_first=2)
+    stats = run(data_dir, server, workers=1)
+    assert stats["failed"] == 0
+    assert len(server.rows) == 25
+
+def test_failed_batches_are_resent_next_run(data_dir):
+    always_down = lambda request: httpx.Response(500)
+    stats = run(data_dir, always_down, workers=2)
+    assert stats["failed"] == 25
+
+    server = FakePostgrest()
+    stats = run(data_dir, server)
+    assert stats["uploaded"] == 25
+
+def test_client_errors_are_not_retried():
+    calls = []
+    def bad_request(request):
+        calls.append(request)
+        return httpx.Response(400)
+
+    loader = PostgrestLoader("http://postgrest.local/rest/v1", "key", backoff_seconds=0, transport=httpx.MockTransport(bad_request))
+    with pytest.raises(httpx.HTTPStatusError):
+        loader.upsert([{"id": "1"}])
+    assert len(calls) == 1
+
+def test_vector_literal_round_trips_float32():
+    vector = np.random.default_rng(0).normal(size=384).astype(np.float32)
+    parsed = np.array(format_vector(vector)[1:-1].split(","), dtype=np.float32)
+    assert np.array_equal(parsed, vector)
+
+def test_stale_id_table_falls_back_to_the_mapping(tmp_path):
+    from src.vector_store import write_id_table
+
+    np.save(tmp_path / "embeddings.npy", np.zeros((3, 4), dtype=np.float32))
+    with open(tmp_path / "id_mapping.json", "w") as f:
+        json.dump(["a", "b", "c"], f)
+    write_id_table(["a", "b", "c"], str(tmp_path))
+    assert _load_row_index(str(tmp_path)) == {"a": 0, "b": 1, "c": 2}
+
+    # New rows were saved but the compact copy was not rewritten
+    np.save(tmp_path / "embeddings.npy", np.zeros((4, 4), dtype=np.float32))
+    with open(tmp_path / "id_mapping.json", "w") as f:
+        json.dump(["a", "b", "c", "d"], f)
+    assert _load_row_index(str(tmp_path)) == {"a": 0, "b": 1, "c": 2, "d": 3}
@@ -0,0 +1,77 @@
+import json
+import httpx
+import numpy as np
+from src.neighbor_graph import NEIGHBORS_FILE, SCORES_FILE, build_neighbor_graph, top_k_neighbors, upload_neighbor_graph
+
+def write_embeddings(data_dir, embeddings):
+    np.save(data_dir / "embeddings.npy", np.asarray(embeddings, dtype=np.float32))
+    with open(data_dir / "id_mapping.json", "w") as f:
+        json.dump([f"p{i}" for i in range(len(embeddings))], f)
+
+def brute_force(embeddings, k):
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    sims = unit @ unit.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1, kind="stable")[:, :k]
+
+def test_blocked_top_k_matches_brute_force():
+    embeddings = np.random.default_rng(1).standard_normal((50, 8)).astype(np.float32)
+    # Rows are normalized block by block, so raw vectors go in
+    indices, scores = top_k_neighbors(embeddings, np.arange(50), 5, block_rows=7, chunk_rows=11)
+    np.testing.assert_array_equal(indices, brute_force(embeddings, 5))
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+    # Fewer candidates than k are padded
+    indices, scores = top_k_neighbors(embeddings[:3], np.arange(3), 5)
+    assert (indices[:, 2:] == -1).all() and np.isneginf(scores[:, 2:]).all()
+
+def test_incremental_update_matches_full_rebuild(tmp_path):
+    rng = np.random.default_rng(2)
+    embeddings = rng.standard_normal((40, 8)).astype(np.float32)
+    write_embeddings(tmp_path, embeddings[:30])
+    build_neighbor_graph(str(tmp_path), k=4)
+
+    # Ten new papers and one changed embedding: only those are scored against all
+    embeddings[5] = rng.standard_normal(8)
+    write_embeddings(tmp_path, embeddings)
+    stats = build_neighbor_graph(str(tmp_path), k=4)
+
+    assert stats["changed"] == 11 and stats["rescored"] >= 11
+    np.testing.assert_array_equal(np.load(tmp_path / NEIGHBORS_FILE), brute_force(embeddings, 4))
+
+def test_lists_that_lose_a_changed_paper_are_refilled(tmp_path):
+    rng = np.random.default_rng(4)
+    embeddings = rng.standard_normal((30, 8)).astype(np.float32)
+    write_embeddings(tmp_path, embeddings)
+    build_neighbor_graph(str(tmp_path), k=4)
+    holders = np.flatnonzero((np.load(tmp_path / NEIGHBORS_FILE) == 7).any(axis=1))
+
+    # Paper 7 moves away from everything that listed it, over several runs
+    for _ in range(3):
+        embeddings[7] = -embeddings[holders].sum(axis=0)
+        write_embeddings(tmp_path, embeddings)
+        build_neighbor_graph(str(tmp_path), k=4)
+        holders = np.flatnonzero((np.load(tmp_path / NEIGHBORS_FILE) == 7).any(axis=1))
+
+    indices = np.load(tmp_path / NEIGHBORS_FILE)
+    assert (indices >= 0).all()
+    np.testing.assert_array_equal(indices, brute_force(embeddings, 4))
+
+def test_upload_sends_only_changed_lists(tmp_path):
+    write_embeddings(tmp_path, np.random.default_rng(3).standard_normal((6, 4)))
+    build_neighbor_graph(str(tmp_path), k=2)
+    received = {}
+    def server(request):
+        assert request.url.path == "/rest/v1/paper_neighbors"
+        for row in json.loads(request.content):
+            received[row["id"]] = row["neighbors"]
+        return httpx.Response(201)
+
+    def upload():
+        return upload_neighbor_graph(str(tmp_path), "http://postgrest.local/rest/v1", "key", transport=httpx.MockTransport(server))
+
+    assert upload()["uploaded"] == 6
+    row = np.load(tmp_path / NEIGHBORS_FILE)[0]
+    assert [n["id"] for n in received["p0"]] == [f"p{j}" for j in row]
+    assert received["p0"][0]["similarity"] == round(float(np.load(tmp_path / SCORES_FILE)[0, 0]), 6)
+    assert upload() == {"uploaded": 0, "skipped": 6}
@@ -0,0 +1,110 @@
+import json
+import httpx
+import numpy as np
+import pytest
+from unittest.mock import patch
+from src.pipeline import CHECKPOINT_FILE, run_pipeline
+from src.paper_store import PaperStore
+from tests.test_ingest import make_result, results_by_category
+from tests.test_migrate import FakePostgrest
+
+class StubModel:
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+
+    def embed(self, texts, batch_size=32):
+        self.calls.append(list(texts))
+        return [np.full(4, float(len(t)), dtype=np.float32) for t in texts]
+
+@pytest.fixture
+def stub_model():
+    models = []
+    def make(*args, **kwargs):
+        models.append(StubModel())
+        return models[-1]
+    with patch('fastembed.TextEmbedding', side_effect=make):
+        yield models
+
+@pytest.fixture
+def mock_arxiv_client():
+    with patch('src.ingest_arxiv.arxiv.Client') as MockClient:
+        yield MockClient
+
+def run(tmp_path, server, **kwargs):
+    return run_pipeline(
+        store_path=str(tmp_path / "papers.db"),
+        data_dir=str(tmp_path),
+        categories=["cs.AI", "cs.LG"],
+        delay_seconds=0,
+        rest_url="http://postgrest.local/rest/v1",
+        api_key="test-key",
+        transport=httpx.MockTransport(server),
+        backoff_seconds=0,
+        embed_batch_size=2,
+        upload_workers=2,
+        **kwargs,
+    )
+
+def test_papers_stream_from_arxiv_to_postgrest(mock_arxiv_client, stub_model, tmp_path):
+    fake_results, _ = results_by_category({
+        "cs.AI": [make_result(f"ai{i}", f"AI {i}", published=f"2021-01-0{9 - i}") for i in range(5)],
+        "cs.LG": [make_result("lg0", "LG 0", published="2021-01-09"), make_result("ai1", "AI 1", published="2021-01-08")],
+    })
+    mock_arxiv_client.return_value.results.side_effect = fake_results
+    server = FakePostgrest()
+
+    stats = run(tmp_path, server)
+
+    assert stats["fetched"] == 7
+    # The cross-listed paper is embedded once
+    assert stats["embedded"] == 6 and stats["uploaded"] + stats["skipped"] == 7
+    assert set(server.rows) == {"ai0", "ai1", "ai2", "ai3", "ai4", "lg0"}
+    # The stub vector is the text length: "LG 0 [SEP] Abstract"
+    assert server.rows["lg0"]["embedding"] == "[" + ",".join(["19"] * 4) + "]"
+    assert set(stats["stages"]) == {"fetch", "embed", "upload"}
+    assert stats["stages"]["embed"]["items"] == 6
+
+    ids = json.load(open(tmp_path / "id_mapping.json"))
+    assert sorted(ids) == sorted(server.rows)
+    assert np.load(tmp_path / "embeddings.npy").shape == (6, 4)
+    assert json.load(open(tmp_path / CHECKPOINT_FILE)) == {"pending": []}
+    with PaperStore(str(tmp_path / "papers.db")) as store:
+        assert len(store) == 6
+        assert store.watermarks()["cs.AI"] == ("2021-01-09", "ai0")
+
+def test_failed_uploads_resume_on_the_next_run(mock_arxiv_client, stub_model, tmp_path):
+    fake_results, _ = results_by_category({"cs.AI": [make_result("ai0", "AI 0", published="2021-01-09")]})
+    mock_arxiv_client.return_value.results.side_effect = fake_results
+    # Every attempt of the first run fails
+    stats = run(tmp_path, FakePostgrest(fail_first=100))
+    assert stats["failed"] == 1
+    assert json.load(open(tmp_path / CHECKPOINT_FILE)) == {"pending": ["ai0"]}
+
+    # Nothing new on arXiv; the checkpointed paper is fed again without re-embedding
+    fake_results, _ = results_by_category({"cs.AI": [make_result("ai0", "AI 0", published="2021-01-09")]})
+    mock_arxiv_client.return_value.results.side_effect = fake_results
+    server = FakePostgrest()
+    stats = run(tmp_path, server)
+
+    assert stats["resumed"] == 1 and stats["fetched"] == 0
+    assert stats["embedded"] == 0 and stats["uploaded"] == 1
+    assert set(server.rows) == {"ai0"}
+    assert json.load(open(tmp_path / CHECKPOINT_FILE)) == {"pending": []}
+
+def test_checkpoints_keep_the_compact_copy_current(mock_arxiv_client, stub_model, tmp_path):
+    from src.vector_store import load_id_table
+
+    def compact_ids():
+        return [pid.decode("utf-8") for pid in load_id_table(str(tmp_path))]
+
+    fake_results, _ = results_by_category({"cs.AI": [make_result(f"ai{i}", f"AI {i}", published=f"2021-01-0{9 - i}") for i in range(3)]})
+    mock_arxiv_client.return_value.results.side_effect = fake_results
+    run(tmp_path, FakePostgrest(), checkpoint_every=1)
+    assert compact_ids() == json.load(open(tmp_path / "id_mapping.json"))
+
+    # Every upload batch commits; the final commit still rewrites the compact copy
+    fake_results, _ = results_by_category({"cs.LG": [make_result(f"lg{i}", f"LG {i}", published=f"2021-01-0{9 - i}") for i in range(4)]})
+    mock_arxiv_client.return_value.results.side_effect = fake_results
+    run(tmp_path, FakePostgrest(), checkpoint_every=1)
+    ids = json.load(open(tmp_path / "id_mapping.json"))
+    assert len(ids) == 7 and compact_ids() == ids
@@ -4,12 +4,15 @@ import json
 import os
 import faiss
 from unittest.mock import MagicMock, patch
-from src.search import search_papers
+from src.search import search_papers, clear_cache
 
 @pytest.fixture
 def mock_model():
+    # The search module caches models across calls; start every test clean
+    clear_cache()
     with patch('src.search.SentenceTransformer') as MockModel:
         yield MockModel
+    clear_cache()
 
 def test_search_integration(mock_model, tmp_path):
     # Setup Data
@@ -51,3 +54,155 @@ def test_search_integration(mock_model, tmp_path):
     assert results[1]["title"] == "Paper B"
     
     # Check printed output logic (optional, but function returns list so checking list is enough)
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw"])
+def test_search_with_prebuilt_index(mock_model, tmp_path, index_type):
+    from src.search import build_index, load_index
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+
+    papers = [{"id": str(i), "title": f"Paper {i}", "pdf_url": f"http://{i}", "categories": []} for i in range(20)]
+    with open(data_dir / "papers.json", "w") as f:
+        json.dump(papers, f)
+    with open(data_dir / "id_mapping.json", "w") as f:
+        json.dump([p["id"] for p in papers], f)
+
+    # Paper 7 sits exactly on the query vector, the rest are far away
+    embeddings = np.random.rand(20, 384).astype(np.float32) + 5
+    embeddings[7] = np.ones(384, dtype=np.float32)
+    np.save(data_dir / "embeddings.npy", embeddings)
+
+    meta = build_index(str(data_dir), index_type=index_type, nlist=2)
+    assert meta["index_type"] == index_type
+    assert meta["count"] == 20
+    assert (data_dir / "index.faiss").exists()
+
+    index, _ = load_index(str(data_dir))
+    assert index.ntotal == 20
+
+    mock_model.return_value.encode.return_value = np.ones((1, 384), dtype=np.float32)
+    results = search_papers("query", data_dir=str(data_dir), top_k=1)
+    assert results[0]["title"] == "Paper 7"
+
+    # Re-saving the embeddings invalidates the prebuilt index
+    np.save(data_dir / "embeddings.npy", embeddings[:10])
+    assert load_index(str(data_dir)) == (None, None)
+
+def test_search_scans_compact_vectors_without_index(mock_model, tmp_path):
+    from src.vector_store import write_vectors
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    papers = [{"id": str(i), "title": f"Paper {i}", "pdf_url": f"http://{i}", "categories": []} for i in range(5)]
+    with open(data_dir / "papers.json", "w") as f:
+        json.dump(papers, f)
+    with open(data_dir / "id_mapping.json", "w") as f:
+        json.dump([p["id"] for p in papers], f)
+
+    embeddings = np.full((5, 384), 3.0, dtype=np.float32)
+    embeddings[3] = np.ones(384, dtype=np.float32)
+    np.save(data_dir / "embeddings.npy", embeddings)
+    write_vectors(embeddings, [p["id"] for p in papers], str(data_dir), fmt="int8", measure=False)
+
+    mock_model.return_value.encode.return_value = np.ones((1, 384), dtype=np.float32)
+    results = search_papers("query", data_dir=str(data_dir), top_k=2)
+    assert len(results) == 2
+    assert results[0]["title"] == "Paper 3"
+
+def _write_keyword_corpus(data_dir):
+    papers = [
+        {"id": f"http://arxiv.org/abs/2401.0000{i}v1", "title": title, "abstract": "", "authors": [author],
+         "pdf_url": f"http://{i}", "categories": []}
+        for i, (title, author) in enumerate([("Vision Models", "Ada Lovelace"), ("Mamba State Spaces", "Alan Turing"), ("Audio Models", "Grace Hopper")])
+    ]
+    with open(data_dir / "papers.json", "w") as f:
+        json.dump(papers, f)
+    with open(data_dir / "id_mapping.json", "w") as f:
+        json.dump([p["id"] for p in papers], f)
+    # Paper 0 is nearest the query vector; paper 1 is the keyword match
+    embeddings = np.stack([np.ones(384), np.full(384, 3.0), np.full(384, 2.0)]).astype(np.float32)
+    np.save(data_dir / "embeddings.npy", embeddings)
+
+def test_hybrid_search_fuses_keyword_and_vector_ranks(mock_model, tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    _write_keyword_corpus(data_dir)
+    mock_model.return_value.encode.return_value = np.ones((1, 384), dtype=np.float32)
+
+    semantic = search_papers("mamba", data_dir=str(data_dir), top_k=3)
+    hybrid = search_papers("mamba", data_dir=str(data_dir), top_k=3, mode="hybrid")
+    lexical = search_papers("mamba", data_dir=str(data_dir), top_k=3, mode="lexical")
+
+    assert semantic[0]["title"] == "Vision Models"
+    assert hybrid[0]["title"] == "Mamba State Spaces"
+    assert [p["title"] for p in lexical] == ["Mamba State Spaces"]
+
+def test_id_and_author_lookups_skip_the_model(mock_model, tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    _write_keyword_corpus(data_dir)
+
+    by_id = search_papers("2401.00002", data_dir=str(data_dir), mode="hybrid")
+    by_author = search_papers("author:Turing", data_dir=str(data_dir))
+
+    assert [p["title"] for p in by_id] == ["Audio Models"]
+    assert [p["title"] for p in by_author] == ["Mamba State Spaces"]
+    mock_model.return_value.encode.assert_not_called()
+
+def test_batch_search_embeds_all_queries_in_one_call(mock_model, tmp_path):
+    from src.search import search_papers_batch
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    _write_keyword_corpus(data_dir)
+    # Query vectors land on paper 0 and paper 2 respectively
+    mock_model.return_value.encode.return_value = np.stack([np.ones(384), np.full(384, 2.0)]).astype(np.float32)
+
+    results = search_papers_batch(["first", "second", "2401.00001", "first"], data_dir=str(data_dir), top_k=1)
+
+    assert list(results) == ["first", "second", "2401.00001"]
+    assert results["first"][0]["title"] == "Vision Models"
+    assert results["second"][0]["title"] == "Audio Models"
+    assert results["2401.00001"][0]["title"] == "Mamba State Spaces"
+    mock_model.return_value.encode.assert_called_once()
+    assert mock_model.return_value.encode.call_args[0][0] == ["first", "second"]
+
+def test_date_window_only_returns_papers_published_inside_it(mock_model, tmp_path):
+    from datetime import datetime
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    _write_keyword_corpus(data_dir)
+    with open(data_dir / "papers.json") as f:
+        papers = json.load(f)
+    for paper, published in zip(papers, ["2023-05-01T00:00:00", "2024-02-10T00:00:00", None]):
+        paper["published"] = published
+    with open(data_dir / "papers.json", "w") as f:
+        json.dump(papers, f)
+    mock_model.return_value.encode.return_value = np.ones((1, 384), dtype=np.float32)
+
+    recent = search_papers("vision", data_dir=str(data_dir), top_k=3, published_after=datetime(2024, 1, 1))
+    older = search_papers("models", data_dir=str(data_dir), top_k=3, mode="lexical", published_before=datetime(2024, 1, 1))
+
+    assert [p["title"] for p in recent] == ["Mamba State Spaces"]
+    assert [p["title"] for p in older] == ["Vision Models"]
+    # Lookups are windowed too
+    assert search_papers("author:Turing", data_dir=str(data_dir), published_before=datetime(2024, 1, 1)) == []
+    assert [p["title"] for p in search_papers("2401.00001", data_dir=str(data_dir), published_after=datetime(2024, 1, 1))] == ["Mamba State Spaces"]
+    mock_model.return_value.encode.assert_called_once()
+
+def test_hybrid_batch_embeds_all_queries_in_one_call(mock_model, tmp_path):
+    from src.search import search_papers_batch
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    _write_keyword_corpus(data_dir)
+    mock_model.return_value.encode.return_value = np.stack([np.ones(384), np.full(384, 2.0)]).astype(np.float32)
+
+    results = search_papers_batch(["mamba", "audio"], data_dir=str(data_dir), top_k=1, mode="hybrid")
+
+    assert results["mamba"][0]["title"] == "Mamba State Spaces"
+    assert results["audio"][0]["title"] == "Audio Models"
+    mock_model.return_value.encode.assert_called_once()
+    assert mock_model.return_value.encode.call_args[0][0] == ["mamba", "audio"]
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+import numpy as np
+from src.time_shards import TimeShards, empty_top_k, merge_top_k, month_ranges, window_bounds
+
+def ts(*date):
+    return datetime(*date, tzinfo=timezone.utc).timestamp()
+
+def test_month_ranges_put_undated_rows_last():
+    published = [ts(2024, 1, 3), ts(2024, 1, 31, 23), ts(2024, 2, 1), np.nan]
+    assert month_ranges(published) == [("2024-01", 0, 2), ("2024-02", 2, 3), ("undated", 3, 4)]
+    assert month_ranges([]) == []
+
+def test_windowed_scan_matches_brute_force_and_skips_old_months():
+    rng = np.random.default_rng(0)
+    count = 400
+    vectors = rng.normal(size=(count, 8)).astype(np.float32)
+    # Unsorted dates over two years, some missing
+    published = rng.uniform(ts(2023, 1, 1), ts(2025, 1, 1), count)
+    published[::37] = np.nan
+    shards = TimeShards(vectors, published, hot_months=2)
+
+    assert len(shards) == 25
+    assert shards.status()["resident_shards"] == 2 and shards.status()["newest_month"] == "2024-12"
+
+    after, before = ts(2024, 10, 10), ts(2024, 12, 20)
+    assert [shard.month for shard in shards.select(after, before)] == ["2024-10", "2024-11", "2024-12"]
+
+    query = rng.normal(size=8).astype(np.float32)
+    best = empty_top_k()
+    for rows, block, mask in shards.scan(after, before):
+        scores = block @ query
+        if mask is not None:
+            rows, scores = rows[mask], scores[mask]
+        best = merge_top_k(best, rows, scores, 5)
+
+    inside = np.flatnonzero((published >= after) & (published < before))
+    expected = inside[np.argsort(-(vectors[inside] @ query))[:5]]
+    assert best[0].tolist() == expected.tolist()
+
+def test_window_bounds_from_days():
+    now = datetime(2024, 3, 31, tzinfo=timezone.utc)
+    assert window_bounds() is None
+    assert window_bounds(days=30, now=now) == (ts(2024, 3, 1), None)
+    assert window_bounds(datetime(2024, 3, 15), days=30, now=now) == (ts(2024, 3, 15), None)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from src.vector_store import load_vectors, write_vectors
+
+def clustered_embeddings(n=600, dim=32, seed=0):
+    # Clustered, normalized data behaves like real sentence embeddings
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((20, dim))
+    points = centers[rng.integers(0, 20, n)] + 0.3 * rng.standard_normal((n, dim))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+@pytest.mark.parametrize("fmt,min_recall", [("float32", 1.0), ("float16", 0.95), ("int8", 0.9), ("pq", 0.4)])
+def test_formats_round_trip_and_report_recall(tmp_path, fmt, min_recall):
+    embeddings = clustered_embeddings()
+    ids = [f"http://arxiv.org/abs/{i:04d}" for i in range(len(embeddings))]
+
+    meta = write_vectors(embeddings, ids, str(tmp_path), fmt=fmt, pq_subvectors=8)
+
+    assert meta["format"] == fmt
+    assert meta["recall_at_10"] >= min_recall
+    if fmt != "float32":
+        assert meta["bytes"] < meta["float32_bytes"]
+
+    vectors = load_vectors(str(tmp_path))
+    assert len(vectors) == len(embeddings)
+    assert vectors.id_at(123) == ids[123]
+    # Data is memory-mapped, not copied into RAM
+    assert isinstance(vectors.data, np.memmap)
+
+    distances, rows = vectors.search(embeddings[42], top_k=5)
+    assert rows[0] == 42 or fmt == "pq"
+    assert list(distances) == sorted(distances)
+
+def test_search_spans_chunks(tmp_path, monkeypatch):
+    import src.vector_store as vector_store
+    monkeypatch.setattr(vector_store, "CHUNK_ROWS", 64)
+    embeddings = clustered_embeddings(n=300)
+    write_vectors(embeddings, [str(i) for i in range(300)], str(tmp_path), fmt="float16", measure=False)
+
+    _, rows = load_vectors(str(tmp_path)).search(embeddings[250], top_k=3)
+    assert rows[0] == 250